@@ -0,0 +1,262 @@
+"""
+Ingest pipeline for the sensor data exported by the MQTT sensor microservice.
+
+In "sync" ingest mode the callback route runs process_sensor_data before answering. In
+"async" mode the route only validates and enqueues the payload; ingest_queue workers run
+the pipeline in the background. In both modes a reading is first admitted or shed on the raw
+request (see app/core/admission.py), before its readings array is validated.
+"""
+
+import random
+import time
+from fastapi import Request, status, HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from app.core.config import (
+    LATENCY_BENCHMARK,
+    LATENCY_BENCHMARK_SAMPLE_RATE,
+    ADAPTIVE_INFERENCE,
+    GATEWAY_NAME,
+    INGEST_QUEUE_SIZE,
+    INGEST_WORKERS,
+    INGEST_BACKPRESSURE_STATUS,
+    INGEST_ADMISSION,
+    INGEST_SENSOR_RATE,
+    INGEST_SENSOR_BURST,
+    INGEST_MAX_LOAD,
+    GATEWAY_WORKERS,
+    INGEST_SHED_POLICY,
+    INGEST_DEADLINE_MS,
+    READING_STORE_ENABLED,
+    READING_STORE_MAX_SENSORS,
+    READING_STORE_CAPACITY,
+    READING_STORE_CHANNELS,
+    READING_STORE_PATH,
+)
+from app.core.pipeline import StageTimer, WorkQueue
+from app.core.clients import registry as clients, Upstream
+from app.core.metrics import metrics
+from app.core.resilience import UpstreamUnavailable, deadline
+from app.core.admission import ADMIT, SHED_RATE, AdmissionController, peek_sensor_name
+from app.core.readings import ReadingStore
+from app.core import codec
+from app.api import utils
+from app.api.schemas.sensor import command as s_cmd
+from app.api.schemas.sensor import export as s_export
+
+stage_timer = StageTimer()
+
+# --- Payload decoding ---
+
+# /export/sensor-data reads its body itself so that it can accept both encodings.
+SENSOR_DATA_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "object", "description": "SensorDataExport"}},
+            codec.MSGPACK_CONTENT_TYPE: {
+                "schema": {
+                    "type": "string",
+                    "format": "binary",
+                    "description": "SensorDataExport as msgpack, reading values as {dtype, shape, data}",
+                }
+            },
+        },
+    }
+}
+
+def parse_sensor_data(request: Request, body: bytes) -> s_export.SensorDataExport:
+    try:
+        if codec.is_msgpack(request.headers.get("content-type")):
+            return s_export.SensorDataExport.model_validate(codec.unpackb(body))
+        return s_export.SensorDataExport.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+# Readings currently inside process_sensor_data, part of the gateway load seen by the policy engine.
+_in_progress = 0
+
+def gateway_load() -> int:
+    return ingest_queue.depth + _in_progress
+
+async def process_sensor_data(sensor_data: s_export.SensorDataExport, received_at_ms: float | None = None):
+    global _in_progress
+    if received_at_ms is None:
+        received_at_ms = time.time() * 1000
+    _in_progress += 1
+    try:
+        # every upstream call below is bounded by the time left until the deadline
+        with deadline((received_at_ms + INGEST_DEADLINE_MS) / 1000):
+            await _process_sensor_data(sensor_data, received_at_ms)
+    finally:
+        _in_progress -= 1
+
+def fall_back_to_cloud(sensor_data: s_export.SensorDataExport) -> s_export.InferenceLayer:
+    # cloud-only export: the cloud runs the inference the gateway skips
+    sensor_data.export_value.inference_descriptor.inference_layer = s_export.InferenceLayer.CLOUD
+    metrics.inc("gateway_ingest_cloud_fallbacks_total", "Gateway-layer readings exported to the cloud for inference")
+    return s_export.InferenceLayer.CLOUD
+
+async def _process_sensor_data(sensor_data: s_export.SensorDataExport, received_at_ms: float):
+    t0 = received_at_ms # in milliseconds
+    sensor_name = sensor_data.metadata.sensor_name
+    send_timestamp = sensor_data.export_value.inference_descriptor.send_timestamp
+    print(f"Received sensor data from {sensor_name}")
+    if send_timestamp is not None:
+        print(f"Receiving from MQTT took {t0-send_timestamp} ms")
+        stage_timer.record("transit", t0 - send_timestamp)
+
+    # Step 1: verify if sender is registered in the metadata microservice
+    with stage_timer.stage("verify"):
+        await utils.verify_target_sensors([sensor_name])
+
+    # Step 1.1: keep the reading for gateway-side analytics
+    if READING_STORE_ENABLED:
+        reading_store.append(sensor_name, sensor_data.export_value.reading.values, t0)
+
+    # Step 2 (Case 1): perform inference if needed
+    _inference_descriptor: s_export.InferenceDescriptor = sensor_data.export_value.inference_descriptor
+    _inference_layer = _inference_descriptor.inference_layer
+    if _inference_layer == s_export.InferenceLayer.GATEWAY and clients.is_open(Upstream.INFERENCE):
+        # Step 2.0: gateway-inference-ms is failing, export for cloud inference instead
+        _inference_layer = fall_back_to_cloud(sensor_data)
+
+    if _inference_layer == s_export.InferenceLayer.GATEWAY:
+        # Step 2.1: send prediction request to gateway-inference-ms
+        # (possibly batched with readings from other sensors)
+        inference_t0 = time.perf_counter()
+        try:
+            with stage_timer.stage("inference_submit"):
+                task_id, index = await utils.submit_prediction(sensor_data)
+        except UpstreamUnavailable:
+            _inference_layer = fall_back_to_cloud(sensor_data)
+
+    if _inference_layer == s_export.InferenceLayer.GATEWAY:
+        # Step 2.2: wait for prediction result (pushed by gateway-inference-ms or polled)
+        with stage_timer.stage("inference_result"):
+            result = await utils.await_prediction_result(task_id, index)
+
+        # Step 2.3: Update sensor data with prediction result
+        sensor_data.export_value.inference_descriptor.prediction = result.prediction_result
+
+        # Step 2.4: Export inference latency benchmark if enabled
+        if LATENCY_BENCHMARK and random.random() < LATENCY_BENCHMARK_SAMPLE_RATE:
+            with stage_timer.stage("benchmark_command"):
+                cmd = s_cmd.InferenceLatencyBenchmark(
+                    sensor_name=sensor_name,
+                    inference_layer=s_cmd.InferenceLayer.GATEWAY,
+                    send_timestamp=_inference_descriptor.send_timestamp,
+                )
+                await utils.send_inference_latency_benchmark_command(GATEWAY_NAME, sensor_name, cmd)
+
+        # Step 2.5: Handle heuristic result if adaptive inference is enabled.
+        if ADAPTIVE_INFERENCE:
+            if utils.GATEWAY_POLICY_ENABLED:
+                utils.policy_engine.observe(
+                    sensor_name,
+                    load=gateway_load(),
+                    latency_ms=(time.perf_counter() - inference_t0) * 1000,
+                    low_battery=sensor_data.export_value.low_battery,
+                    confidence=result.confidence,
+                )
+            with stage_timer.stage("heuristic_command"):
+                await utils.handle_heuristic_result(GATEWAY_NAME, sensor_name, result.heuristic_result)
+
+    # Step 2 (Case 2): export sensor data to the cloud api
+    if _inference_layer == s_export.InferenceLayer.CLOUD:
+        with stage_timer.stage("cloud_export"):
+            response = await utils.export_sensor_data(sensor_data)
+            if response.status_code != status.HTTP_201_CREATED:
+                raise HTTPException(status_code=response.status_code, detail=response.json())
+
+# --- Admission control ---
+
+admission = AdmissionController(
+    rate_per_s=INGEST_SENSOR_RATE,
+    burst=INGEST_SENSOR_BURST,
+    # the readings are spread over the workers, each admits its share of the load
+    max_load=max(1, INGEST_MAX_LOAD // GATEWAY_WORKERS) if utils.MULTI_WORKER else INGEST_MAX_LOAD,
+    load=gateway_load,
+)
+
+def admit(request: Request, body: bytes) -> bool:
+    """
+    Decides on the raw request whether its reading enters the pipeline. Returns False when
+    it is shed with the "drop" or "cloud" policy; with "reject" a shed reading raises 429.
+    """
+    decision = admission.admit(peek_sensor_name(request.headers, body))
+    if decision == ADMIT:
+        return True
+    if INGEST_SHED_POLICY == "reject":
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Sensor rate limit exceeded." if decision == SHED_RATE else "Gateway overloaded, retry later.",
+            headers={"Retry-After": "1"},
+        )
+    return False
+
+async def shed_sensor_data(request: Request, body: bytes) -> dict:
+    if INGEST_SHED_POLICY == "cloud":
+        sensor_data = parse_sensor_data(request, body)
+        inference_layer = sensor_data.export_value.inference_descriptor.inference_layer
+        # sensor-layer readings are never exported; cloud-layer ones go out as usual, gateway-layer
+        # ones for cloud inference instead
+        if inference_layer == s_export.InferenceLayer.SENSOR:
+            return {"message": "Gateway overloaded, sensor data dropped"}
+        await utils.verify_target_sensors([sensor_data.metadata.sensor_name])
+        if inference_layer == s_export.InferenceLayer.GATEWAY:
+            fall_back_to_cloud(sensor_data)
+        with stage_timer.stage("cloud_export"):
+            response = await utils.export_sensor_data(sensor_data)
+        if response.status_code != status.HTTP_201_CREATED:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        return {"message": "Gateway overloaded, sensor data exported to the cloud"}
+    return {"message": "Gateway overloaded, sensor data dropped"}
+
+# --- Reading store ---
+
+reading_store = ReadingStore(
+    max_sensors=READING_STORE_MAX_SENSORS,
+    capacity=READING_STORE_CAPACITY,
+    channels=READING_STORE_CHANNELS,
+    path=READING_STORE_PATH,
+)
+
+# --- Async ingest ---
+
+async def _process_queued(item: tuple[s_export.SensorDataExport, float]):
+    sensor_data, received_at_ms = item
+    with stage_timer.stage("pipeline"):
+        await process_sensor_data(sensor_data, received_at_ms)
+
+ingest_queue: WorkQueue[tuple[s_export.SensorDataExport, float]] = WorkQueue(
+    handler=_process_queued,
+    maxsize=INGEST_QUEUE_SIZE,
+    workers=INGEST_WORKERS,
+)
+
+def enqueue_sensor_data(sensor_data: s_export.SensorDataExport, received_at_ms: float):
+    if not ingest_queue.put_nowait((sensor_data, received_at_ms)):
+        raise HTTPException(
+            status_code=INGEST_BACKPRESSURE_STATUS,
+            detail="Ingest queue is full, retry later.",
+            headers={"Retry-After": "1"},
+        )
+
+def start():
+    ingest_queue.start(stage_timer)
+
+async def stop():
+    await ingest_queue.stop()
+    reading_store.close()
+
+def stats() -> dict:
+    return {
+        "admission": admission.stats() if INGEST_ADMISSION else None,
+        "queue": ingest_queue.stats(),
+        "stages": stage_timer.stats(),
+        "reading_store": reading_store.stats() if READING_STORE_ENABLED else None,
+    }
@@ -2,14 +2,16 @@
 Routes for the commands sent by the cloud layer.
 """
 
-from fastapi import APIRouter, status, HTTPException
+from fastapi import APIRouter, Depends, Query, Response, status, HTTPException
 
+from app.core.config import TRACE_ENABLED, COMMAND_WAIT_MAX_MS
 from app.api.schemas.gateway import command as gw_cmd
 from app.api.schemas.sensor import command as s_cmd
 from app.api.schemas import metadata
 from app.api import utils
 
-command_router = APIRouter(tags=["Command Routes"])
+# every request is captured for replay when TRACE_ENABLED
+command_router = APIRouter(tags=["Command Routes"], dependencies=[Depends(utils.record_trace)] if TRACE_ENABLED else [])
 
 # --- Gateway Command Routes ---
 @command_router.post("/gateway/command/get/available-sensors", status_code=status.HTTP_200_OK)
@@ -31,29 +33,46 @@ async def get_provisioned_sensors(_: gw_cmd.GetProvisionedSensors) -> list[gw_cm
     ]
 
 @command_router.post("/gateway/command/add/provisioned-sensors", status_code=status.HTTP_200_OK)
-async def add_provisioned_sensor(command: gw_cmd.AddProvisionedSensors):
+async def add_provisioned_sensor(command: gw_cmd.AddProvisionedSensors, http_response: Response):
     response = await utils.ble_provision_sensors(command.property_value)
     if response.status_code != status.HTTP_200_OK:
         raise HTTPException(status_code=response.status_code, detail=response.json())
     
     prov_sensors = [metadata.SensorDescriptor(**device) for device in response.json()]
-    await utils.add_provisioned_sensors(prov_sensors)
+    results = await utils.add_provisioned_sensors(prov_sensors)
+
+    if not all(result.success for result in results):
+        http_response.status_code = status.HTTP_207_MULTI_STATUS
+        return {
+            "message": "Some devices could not be provisioned",
+            "results": results,
+        }
 
     return {
         "message": "Devices provisioned successfully",
+        "results": results,
     }
 
 @command_router.post("/gateway/command/add/registered-sensors", status_code=status.HTTP_200_OK)
-async def add_registered_sensors(command: gw_cmd.AddRegisteredSensors):
-    await utils.metadata_create_sensors(command.property_value)
-    
+async def add_registered_sensors(command: gw_cmd.AddRegisteredSensors, http_response: Response):
+    results = await utils.metadata_create_sensors(command.property_value)
+
+    if not all(result.success for result in results):
+        http_response.status_code = status.HTTP_207_MULTI_STATUS
+        return {
+            "message": "Some devices could not be registered",
+            "results": results,
+        }
+
     return {
         "message": "Devices registered successfully",
+        "results": results,
     }
 
 @command_router.post("/gateway/command/set/gateway-model", status_code=status.HTTP_202_ACCEPTED)
-async def set_gateway_model(command: gw_cmd.SetGatewayModel):
-    response = await utils.set_gateway_model(command.property_value)
+async def set_gateway_model(command: gw_cmd.SetGatewayModel, force: bool = False):
+    # force resends a model the inference microservice already accepted
+    response = await utils.set_gateway_model(command.property_value, force)
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
     
@@ -62,6 +81,35 @@ async def set_gateway_model(command: gw_cmd.SetGatewayModel):
     }
 
 # --- Sensor Command Routes ---
+async def _get_sensor_property(command: s_cmd.BaseCommand, send_get, http_response: Response, max_age_ms: int | None, wait_ms: int | None):
+    """
+    Sends a GET sensor command. With `max_age_ms`, the sensors with a value at most that old in
+    the property cache are answered from it under "cached". With `wait_ms`, waits up to that
+    long for the sensors to respond and returns their values under "responses", along with the
+    command_uuids still pending. Answers 200 when nothing is left pending.
+    """
+    await utils.verify_target_sensors(command.target.target_sensors)
+
+    command_uuids, cached = await utils.get_sensor_property(command, send_get, max_age_ms)
+    body = {
+        "message": f"GET {command.property_name} Command sent to Sensor Microservice",
+        "command_uuids": command_uuids,
+    }
+    if max_age_ms is not None:
+        body["cached"] = cached
+        if not command_uuids:
+            http_response.status_code = status.HTTP_200_OK
+            body["message"] = f"GET {command.property_name} Command answered from the property cache"
+
+    if wait_ms is not None:
+        responses, pending = await utils.wait_for_sensor_responses(command_uuids, wait_ms)
+        body["responses"] = responses
+        body["pending_command_uuids"] = pending
+        if not pending:
+            http_response.status_code = status.HTTP_200_OK
+
+    return body
+
 @command_router.post("/sensor/command/set/sensor-state", status_code=status.HTTP_202_ACCEPTED)
 async def set_sensor_state(command: s_cmd.SetSensorState):
     await utils.verify_target_sensors(command.target.target_sensors)
@@ -70,24 +118,22 @@ async def set_sensor_state(command: s_cmd.SetSensorState):
     response = await utils.set_sensor_state(command)
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
+    # the cloud overrode the heuristic, forget what it last commanded to these sensors
+    await utils.forget_heuristic_state(command.target.target_sensors)
     
     return {
         "message": "SET sensor-state Command sent to Sensor Microservice",
     }
 
 @command_router.post("/sensor/command/get/sensor-state", status_code=status.HTTP_202_ACCEPTED)
-async def get_sensor_state(command: s_cmd.GetSensorState):
-    await utils.verify_target_sensors(command.target.target_sensors)
-
+async def get_sensor_state(
+    command: s_cmd.GetSensorState,
+    http_response: Response,
+    max_age_ms: int | None = Query(None, ge=0),
+    wait_ms: int | None = Query(None, ge=0, le=COMMAND_WAIT_MAX_MS),
+):
     # get the sensor state
-    response = await utils.get_sensor_state(command)
-    if response.status_code != status.HTTP_202_ACCEPTED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return {
-        "message": "GET sensor-state Command sent to Sensor Microservice",
-        "command_uuids": response.json().get("command_uuids"),
-    }
+    return await _get_sensor_property(command, utils.get_sensor_state, http_response, max_age_ms, wait_ms)
 
 @command_router.post("/sensor/command/set/inference-layer", status_code=status.HTTP_202_ACCEPTED)
 async def set_inference_layer(command: s_cmd.SetInferenceLayer):
@@ -97,24 +143,22 @@ async def set_inference_layer(command: s_cmd.SetInferenceLayer):
     response = await utils.set_inference_layer(command)
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
+    # the cloud overrode the heuristic, forget what it last commanded to these sensors
+    await utils.forget_heuristic_state(command.target.target_sensors)
     
     return {
         "message": "SET inference-layer Command sent to Sensor Microservice",
     }
 
 @command_router.post("/sensor/command/get/inference-layer", status_code=status.HTTP_202_ACCEPTED)
-async def get_inference_layer(command: s_cmd.GetInferenceLayer):
-    await utils.verify_target_sensors(command.target.target_sensors)
-
+async def get_inference_layer(
+    command: s_cmd.GetInferenceLayer,
+    http_response: Response,
+    max_age_ms: int | None = Query(None, ge=0),
+    wait_ms: int | None = Query(None, ge=0, le=COMMAND_WAIT_MAX_MS),
+):
     # get the inference layer
-    response = await utils.get_inference_layer(command)
-    if response.status_code != status.HTTP_202_ACCEPTED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return {
-        "message": "GET inference-layer Command sent to Sensor Microservice",
-        "command_uuids": response.json().get("command_uuids"),
-    }
+    return await _get_sensor_property(command, utils.get_inference_layer, http_response, max_age_ms, wait_ms)
 
 
 @command_router.post("/sensor/command/set/sensor-config", status_code=status.HTTP_202_ACCEPTED)
@@ -131,25 +175,21 @@ async def set_sensor_config(command: s_cmd.SetSensorConfig):
     }
 
 @command_router.post("/sensor/command/get/sensor-config", status_code=status.HTTP_202_ACCEPTED)
-async def get_sensor_config(command: s_cmd.GetSensorConfig):
-    await utils.verify_target_sensors(command.target.target_sensors)
-
+async def get_sensor_config(
+    command: s_cmd.GetSensorConfig,
+    http_response: Response,
+    max_age_ms: int | None = Query(None, ge=0),
+    wait_ms: int | None = Query(None, ge=0, le=COMMAND_WAIT_MAX_MS),
+):
     # get the sensor config
-    response = await utils.get_sensor_config(command)
-    if response.status_code != status.HTTP_202_ACCEPTED:
-        raise HTTPException(status_code=response.status_code, detail=response.json())
-    
-    return {
-        "message": "GET sensor-config Command sent to Sensor Microservice",
-        "command_uuids": response.json().get("command_uuids"),    
-    }
+    return await _get_sensor_property(command, utils.get_sensor_config, http_response, max_age_ms, wait_ms)
 
 @command_router.post("/sensor/command/set/sensor-model", status_code=status.HTTP_202_ACCEPTED)
-async def set_sensor_model(command: s_cmd.SetSensorModel):
+async def set_sensor_model(command: s_cmd.SetSensorModel, force: bool = False):
     await utils.verify_target_sensors(command.target.target_sensors)
     
-    # set the sensor model
-    response = await utils.set_sensor_model(command)
+    # set the sensor model (force resends it to sensors which already accepted it)
+    response = await utils.set_sensor_model(command, force)
     if response.status_code != status.HTTP_202_ACCEPTED:
         raise HTTPException(status_code=response.status_code, detail=response.json())
     
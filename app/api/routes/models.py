@@ -0,0 +1,41 @@
+"""
+Routes for the model artifacts stored on the gateway.
+The cloud uploads a model once and then references it by digest in
+SET sensor-model and SET gateway-model commands.
+"""
+
+from fastapi import APIRouter, Path, Request, Response, status, HTTPException
+
+from app.core.artifacts import DIGEST_PATTERN, ArtifactTooLarge, DigestMismatch
+from app.api import utils
+
+models_router = APIRouter(tags=["Model Routes"])
+
+MODEL_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+    }
+}
+
+@models_router.put("/gateway/models/{digest}", status_code=status.HTTP_201_CREATED, openapi_extra=MODEL_REQUEST_BODY)
+async def upload_model(request: Request, response: Response, digest: str = Path(pattern=DIGEST_PATTERN)):
+    # a model the gateway already has is not transferred again
+    if utils.model_store.has(digest):
+        response.status_code = status.HTTP_200_OK
+        return {"digest": digest, "size": utils.model_store.size(digest), "stored": False}
+
+    try:
+        _, size = await utils.model_store.put(request.stream(), expected_digest=digest)
+    except DigestMismatch as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except ArtifactTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+    return {"digest": digest, "size": size, "stored": True}
+
+@models_router.get("/gateway/models/{digest}", status_code=status.HTTP_200_OK)
+async def get_model(digest: str = Path(pattern=DIGEST_PATTERN)):
+    if not utils.model_store.has(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown model {digest}")
+    return {"digest": digest, "size": utils.model_store.size(digest)}
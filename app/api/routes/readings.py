@@ -0,0 +1,63 @@
+"""
+Routes querying the recent sensor readings kept by the gateway (READING_STORE_ENABLED).
+Samples are selected with `last` (the last N samples) and/or a `start_ms`/`end_ms` range
+of receive times, oldest first.
+"""
+
+from fastapi import APIRouter, Query, status, HTTPException
+
+from app.core.config import READING_STORE_ENABLED
+from app.core.readings import used_channels
+from app.api import ingest
+
+readings_router = APIRouter(tags=["Reading Routes"])
+
+def _check_enabled():
+    if not READING_STORE_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="The reading store is disabled")
+
+@readings_router.get("/gateway/readings", status_code=status.HTTP_200_OK)
+async def get_reading_sensors() -> list[str]:
+    _check_enabled()
+    return ingest.reading_store.sensors()
+
+@readings_router.get("/gateway/readings/{sensor_name}", status_code=status.HTTP_200_OK)
+async def get_readings(
+    sensor_name: str,
+    last: int | None = Query(None, ge=1),
+    start_ms: float | None = None,
+    end_ms: float | None = None,
+):
+    _check_enabled()
+    selected = ingest.reading_store.samples(sensor_name, last, start_ms, end_ms)
+    if selected is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No readings of {sensor_name}")
+
+    times, values = selected
+    return {
+        "sensor_name": sensor_name,
+        "times_ms": times.tolist(),
+        "values": values[:, :used_channels(values)].tolist(),
+    }
+
+@readings_router.get("/gateway/readings/{sensor_name}/aggregate", status_code=status.HTTP_200_OK)
+async def get_reading_aggregates(
+    sensor_name: str,
+    last: int | None = Query(None, ge=1),
+    start_ms: float | None = None,
+    end_ms: float | None = None,
+    window_ms: float | None = Query(None, gt=0),
+    percentiles: list[float] = Query([50, 90, 99]),
+):
+    _check_enabled()
+    if not all(0 <= q <= 100 for q in percentiles):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="percentiles must be within [0, 100]")
+    windows = ingest.reading_store.aggregate(sensor_name, last, start_ms, end_ms, window_ms, tuple(percentiles))
+    if windows is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No readings of {sensor_name}")
+
+    return {
+        "sensor_name": sensor_name,
+        "window_ms": window_ms,
+        "windows": windows,
+    }
@@ -0,0 +1,106 @@
+"""
+Routes exposing the internal state of the Gateway API (pools, caches, queues).
+These routes are meant for operators and monitoring.
+"""
+
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.clients import registry as clients
+from app.core.metrics import metrics
+from app.api import utils, ingest
+
+stats_router = APIRouter(tags=["Stats Routes"])
+metrics_router = APIRouter(tags=["Stats Routes"])
+
+def _collect_gauges():
+    for upstream, pool in clients.stats().items():
+        yield "gateway_upstream_in_flight", "Requests in flight per upstream pool", {"upstream": upstream}, pool["in_flight"]
+        yield "gateway_upstream_pool_saturation", "In-flight requests / pool size", {"upstream": upstream}, pool["saturation"]
+    queue = ingest.ingest_queue.stats()
+    yield "gateway_ingest_queue_depth", "Sensor data waiting in the ingest queue", {}, queue["depth"]
+    yield "gateway_predictions_waiting", "Requests waiting for a prediction result", {}, utils.prediction_tracker.stats()["waiting"]
+    if utils.CLOUD_SPOOL_ENABLED:
+        spool = utils.cloud_spool.stats()
+        yield "gateway_cloud_spool_rows", "Payloads waiting in the cloud spool", {}, spool["rows"]
+        yield "gateway_cloud_spool_bytes", "Bytes waiting in the cloud spool", {}, spool["bytes"]
+
+def _collect_counters():
+    queue = ingest.ingest_queue.stats()
+    yield "gateway_ingest_rejected_total", "Sensor data rejected because the ingest queue was full", {}, queue["rejected"]
+    registry = utils.sensor_registry.stats()
+    for result in ("hits", "negative_hits", "misses"):
+        yield "gateway_sensor_registry_lookups_total", "Registered sensor cache lookups", {"result": result}, registry[result]
+
+metrics.register_collector(_collect_gauges)
+metrics.register_collector(_collect_counters, kind="counter")
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@stats_router.get("/gateway/stats/http-pools", status_code=status.HTTP_200_OK)
+async def get_http_pool_stats():
+    return clients.stats()
+
+@stats_router.get("/gateway/stats/sensor-registry", status_code=status.HTTP_200_OK)
+async def get_sensor_registry_stats():
+    return utils.sensor_registry.stats()
+
+@stats_router.get("/gateway/stats/predictions", status_code=status.HTTP_200_OK)
+async def get_prediction_stats():
+    return {
+        **utils.prediction_tracker.stats(),
+        "poller": utils.prediction_poller.stats(),
+        "batcher": {
+            **utils.prediction_batcher.stats(),
+            "batch_endpoint_supported": utils.batch_prediction_supported(),
+        },
+    }
+
+@stats_router.get("/gateway/stats/latency-benchmark", status_code=status.HTTP_200_OK)
+async def get_latency_benchmark_stats():
+    return utils.latency_aggregator.stats()
+
+@stats_router.get("/gateway/stats/sensor-commands", status_code=status.HTTP_200_OK)
+async def get_sensor_command_stats():
+    return utils.command_dispatcher.stats()
+
+@stats_router.get("/gateway/stats/models", status_code=status.HTTP_200_OK)
+async def get_model_stats():
+    return utils.model_delivery_stats()
+
+@stats_router.get("/gateway/stats/heuristic", status_code=status.HTTP_200_OK)
+async def get_heuristic_stats():
+    return {
+        **utils.heuristic_tracker.stats(),
+        "policy": utils.policy_engine.stats() if utils.GATEWAY_POLICY_ENABLED else None,
+    }
+
+@stats_router.get("/gateway/stats/ingest", status_code=status.HTTP_200_OK)
+async def get_ingest_stats():
+    return ingest.stats()
+
+@stats_router.get("/gateway/stats/sensor-properties", status_code=status.HTTP_200_OK)
+async def get_sensor_property_stats():
+    return utils.sensor_properties.stats()
+
+@stats_router.get("/gateway/stats/command-responses", status_code=status.HTTP_200_OK)
+async def get_command_response_stats():
+    return utils.command_responses.stats()
+
+@stats_router.get("/gateway/stats/shared-state", status_code=status.HTTP_200_OK)
+async def get_shared_state_stats():
+    return utils.shared_state.stats() if utils.MULTI_WORKER else None
+
+@stats_router.get("/gateway/stats/trace", status_code=status.HTTP_200_OK)
+async def get_trace_stats():
+    return utils.trace_recorder.stats()
+
+@stats_router.get("/gateway/stats/cloud-export", status_code=status.HTTP_200_OK)
+async def get_cloud_export_stats():
+    return {
+        "bulk_unsupported": utils.cloud_bulk_unsupported_paths(),
+        "batchers": {path: batcher.stats() for path, batcher in utils.cloud_batchers.items()},
+        "spool": utils.cloud_spool.stats() if utils.CLOUD_SPOOL_ENABLED else None,
+    }
@@ -1,7 +1,7 @@
 """ Edge Gateway Commands """
 
 import enum
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
 
 class Method(str, enum.Enum):
@@ -26,11 +26,21 @@ class BaseCommand(BaseModel):
 # --- Property: Gateway Model ---
 class GatewayModel(BaseModel):
     """
-    Schema for the Gateway Model
+    Schema for the Gateway Model, sent inline as base64 or referenced by the SHA-256
+    digest of a model uploaded to the gateway (PUT /gateway/models/{digest})
     """
 
-    tf_model_bytesize: int
-    tf_model_b64: str
+    tf_model_bytesize: Optional[int] = None
+    tf_model_b64: Optional[str] = None
+    tf_model_digest: Optional[str] = Field(default=None, pattern=r"^[0-9a-f]{64}$")
+
+    @model_validator(mode="after")
+    def _inline_or_digest(self):
+        if (self.tf_model_b64 is None) == (self.tf_model_digest is None):
+            raise ValueError("exactly one of tf_model_b64 and tf_model_digest is required")
+        if self.tf_model_b64 is not None and self.tf_model_bytesize is None:
+            raise ValueError("tf_model_bytesize is required with tf_model_b64")
+        return self
 
 class GatewayModelCommand(BaseCommand):
     property_name: str = "gateway-model"
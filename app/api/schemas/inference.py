@@ -0,0 +1,25 @@
+""" Inference Microservice Schemas """
+
+import enum
+from pydantic import BaseModel
+from typing import Optional
+
+class PredictionStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    SUCCESS = "SUCCESS"
+    FAILURE = "FAILURE"
+
+class PredictionResult(BaseModel):
+    prediction_result: Optional[int] = None
+    heuristic_result: Optional[int] = None
+    confidence: Optional[float] = None
+
+class PredictionTask(BaseModel):
+    """
+    Schema for a prediction task as reported by the inference microservice
+    """
+
+    task_id: str
+    status: PredictionStatus
+    # batched prediction requests yield one result per submitted reading, in order
+    result: Optional[PredictionResult | list[PredictionResult]] = None
@@ -2,4 +2,14 @@ from pydantic import BaseModel
 
 class SensorDescriptor(BaseModel):
     device_name: str
-    device_address: str
\ No newline at end of file
+    device_address: str
+
+class SensorWriteResult(BaseModel):
+    """
+    Outcome of creating/updating one sensor in the metadata microservice
+    """
+
+    device_name: str
+    success: bool
+    status_code: int
+    detail: object = None
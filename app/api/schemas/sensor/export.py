@@ -1,7 +1,10 @@
 import uuid
 import enum
-from pydantic import BaseModel
-from typing import Optional
+import numpy as np
+from pydantic import BaseModel, BeforeValidator, PlainSerializer, WithJsonSchema
+from typing import Annotated, Optional
+
+from app.core import codec
 
 class Metadata(BaseModel):
     gateway_name: str
@@ -27,10 +30,51 @@ class InferenceLatencyBenchmark(BaseModel):
 class InferenceLatencyBenchmarkExport(BaseExport):
     export_value: InferenceLatencyBenchmark
 
+class InferenceLatencySummary(BaseModel):
+    inference_layer: InferenceLayer
+    window_start: int   # ms since epoch
+    window_end: int
+    count: int
+    sampled: int
+    min: float
+    max: float
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    histogram_bounds: list[float]   # bucket upper bounds in ms
+    histogram_counts: list[int]     # one more than bounds, the last bucket is +Inf
+
+class InferenceLatencySummaryExport(BaseExport):
+    export_value: InferenceLatencySummary
+
 # --- Export: SensorData ---
+def _to_values_array(values: object) -> np.ndarray:
+    if isinstance(values, dict):    # binary encoding, see app.core.codec
+        array = codec.decode_array(values)
+    elif isinstance(values, np.ndarray):
+        array = values
+    else:
+        array = np.asarray(values, dtype=np.float64)
+    if array.size == 0 and array.ndim == 1:    # "values": [] is a reading without samples
+        array = array.reshape(0, 0)
+    if array.ndim != 2 or array.dtype.kind != "f":
+        raise ValueError("values must be a 2-D array of floats")
+    return array
+
+# Held as a NumPy array; JSON payloads still see a list of lists of floats.
+SensorValues = Annotated[
+    np.ndarray,
+    BeforeValidator(_to_values_array),
+    PlainSerializer(lambda array: array.tolist(), return_type=list[list[float]]),
+    WithJsonSchema({"type": "array", "items": {"type": "array", "items": {"type": "number"}}}),
+]
+
 class SensorReading(BaseModel):
+    model_config = {"arbitrary_types_allowed": True}
+
     uuid: str = str(uuid.uuid4())
-    values: list[list[float]]
+    values: SensorValues
 
 
 class InferenceDescriptor(BaseModel):
@@ -45,4 +89,12 @@ class SensorData(BaseModel):
     inference_descriptor: InferenceDescriptor
 
 class SensorDataExport(BaseExport):
-    export_value: SensorData
\ No newline at end of file
+    export_value: SensorData
+
+def dump_binary(sensor_data: SensorDataExport) -> dict:
+    """
+    Dumps `sensor_data` for msgpack encoding, with the reading values as a raw buffer.
+    """
+    payload = sensor_data.model_dump(exclude={"export_value": {"reading": {"values"}}})
+    payload["export_value"]["reading"]["values"] = codec.encode_array(sensor_data.export_value.reading.values)
+    return payload
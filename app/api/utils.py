@@ -6,18 +6,95 @@ from app.core.config import (
     MQTT_SENSOR_MICROSERVICE_URL,
     CLOUD_INFERENCE_LAYER,
     SENSOR_INFERENCE_LAYER,
+    GATEWAY_INFERENCE_LAYER,
     HEURISTIC_ERROR_CODE,
+    HEURISTIC_HYSTERESIS,
+    HEURISTIC_MIN_DWELL_MS,
+    MODEL_STORE_PATH,
+    MODEL_MAX_BYTES,
+    MODEL_STREAM_CHUNK_BYTES,
+    MODEL_DELIVERY_TTL_MS,
+    COMMAND_COALESCING,
+    COMMAND_COALESCE_WINDOW_MS,
+    COMMAND_COALESCE_BATCH_SIZE,
+    ADAPTIVE_POLICY,
+    ADAPTIVE_POLICY_INTERVAL_MS,
+    ADAPTIVE_POLICY_WINDOW,
+    ADAPTIVE_POLICY_LOAD_HIGH,
+    ADAPTIVE_POLICY_LATENCY_HIGH_MS,
+    ADAPTIVE_POLICY_MIN_CONFIDENCE,
+    ADAPTIVE_POLICY_STALE_MS,
+    REGISTRY_TTL_MS,
+    REGISTRY_NEGATIVE_TTL_MS,
+    POLLING_INTERVAL_MS,
+    PREDICTION_PUSH_ENABLED,
+    PREDICTION_PUSH_TIMEOUT_MS,
+    PREDICTION_TIMEOUT_MS,
+    PREDICTION_CALLBACK_URL,
+    POLLING_MIN_INTERVAL_MS,
+    POLLING_MAX_INTERVAL_MS,
+    PREDICTION_POLL_BATCH_SIZE,
+    PREDICTION_POLL_CONCURRENCY,
+    CLOUD_EXPORT_BATCHING,
+    CLOUD_EXPORT_BATCH_SIZE,
+    CLOUD_EXPORT_LINGER_MS,
+    CLOUD_BULK_RETRY_MS,
+    INFERENCE_BATCHING,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_BATCH_WAIT_MS,
+    CLOUD_SPOOL_ENABLED,
+    CLOUD_SPOOL_PATH,
+    CLOUD_SPOOL_MAX_ROWS,
+    CLOUD_SPOOL_DRAIN_BATCH_SIZE,
+    CLOUD_SPOOL_BACKOFF_MIN_MS,
+    CLOUD_SPOOL_BACKOFF_MAX_MS,
+    CLOUD_SPOOL_MAX_ATTEMPTS,
+    METADATA_WRITE_CONCURRENCY,
+    INFERENCE_BINARY_PAYLOADS,
+    CLOUD_BINARY_PAYLOADS,
+    HEDGED_REQUESTS,
+    GATEWAY_NAME,
+    LATENCY_BENCHMARK_WINDOW_S,
+    LATENCY_BENCHMARK_MAX_SAMPLES,
+    TRACE_PATH,
+    TRACE_MAX_BYTES,
+    TRACE_QUEUE_SIZE,
+    GATEWAY_WORKER_INDEX,
+    GATEWAY_STATE_PATH,
+    GATEWAY_STATE_POLL_MS,
+    PROPERTY_CACHE_MAX_SENSORS,
+    COMMAND_WAIT_MAX_MS,
 )
 
-from fastapi import status, HTTPException
-import httpx
+from fastapi import status, HTTPException, Request
 import asyncio
+import time
 
 from app.api.schemas.gateway import command as gw_cmd
 from app.api.schemas.sensor import command as s_cmd
 from app.api.schemas.sensor import response as s_resp
 from app.api.schemas.sensor import export as s_export
 from app.api.schemas import metadata
+from app.api.schemas import inference
+from app.core.clients import registry as clients, Upstream
+from app.core.resilience import time_left
+from app.core.sensor_registry import SensorRegistryCache
+from app.core.predictions import PredictionTracker, PredictionPoller
+from app.core.batching import ItemResult, MicroBatcher
+from app.core.spool import CloudSpool
+from app.core.latency import LatencyAggregator
+from app.core.heuristics import HeuristicStateTracker
+from app.core.commands import CommandDispatcher
+from app.core.artifacts import ArtifactStore, DeliveryLog
+from app.core.policy import POLICIES, PolicyEngine, SaturationPolicy
+from app.core.trace import TraceRecorder
+from app.core.property_cache import PropertyCache, CachedProperty
+from app.core import property_cache
+from app.core.command_responses import CommandResponseTracker
+from app.core.shared_state import (
+    SharedSensorState, REGISTRY_INVALIDATED, REGISTRY_ADDED, HEURISTIC_FORGOTTEN, COMMAND_RESPONDED, CLOUD_BULK_UNSUPPORTED,
+)
+from app.core import codec, serialization
 
 # --- Async Polling ---
 async def async_sleep(ms: int):
@@ -26,92 +103,608 @@ async def async_sleep(ms: int):
 
 # --- Primitive functions for microservice communication ---
 
-async def _post_json_to_microservice(url: str, json_data: dict):
-    async with httpx.AsyncClient() as client:
-        return await client.post(url, json=json_data, timeout=30)
+# json_data may be a pydantic model, a list of models or plain JSON data (see app/core/serialization.py)
+
+async def _post_json_to_microservice(upstream: Upstream, url: str, json_data: object):
+    return await clients.request(upstream, "POST", url, content=serialization.dumps(json_data), headers=serialization.JSON_HEADERS)
+
+async def _put_json_to_microservice(upstream: Upstream, url: str, json_data: object, headers: dict | None = None):
+    return await clients.request(
+        upstream, "PUT", url,
+        content=serialization.dumps(json_data),
+        headers={**(headers or {}), **serialization.JSON_HEADERS},
+    )
+
+async def _send_msgpack_to_microservice(upstream: Upstream, method: str, url: str, data: object, headers: dict | None = None):
+    return await clients.request(
+        upstream, method, url,
+        content=codec.packb(data),
+        headers={**(headers or {}), "Content-Type": codec.MSGPACK_CONTENT_TYPE},
+    )
 
-async def _put_json_to_microservice(url: str, json_data: dict):
-    async with httpx.AsyncClient() as client:
-        return await client.put(url, json=json_data, timeout=30)
+async def _get_from_microservice(upstream: Upstream, url: str):
+    return await clients.request(upstream, "GET", url)
 
-async def _get_from_microservice(url: str):
-    async with httpx.AsyncClient() as client:
-        return await client.get(url, timeout=30)
+async def _hedged_get_from_microservice(upstream: Upstream, url: str):
+    if HEDGED_REQUESTS:
+        return await clients.hedged_request(upstream, "GET", url)
+    return await clients.request(upstream, "GET", url)
 
-async def _delete_from_microservice(url: str):
-    async with httpx.AsyncClient() as client:
-        return await client.delete(url, timeout=30)
+async def _delete_from_microservice(upstream: Upstream, url: str):
+    return await clients.request(upstream, "DELETE", url)
 
 # --- Cloud API functions ---
+
+def _response_detail(response) -> object:
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+async def _post_to_cloud_api(url: str, payload: object):
+    if CLOUD_BINARY_PAYLOADS:
+        return await _send_msgpack_to_microservice(Upstream.CLOUD, "POST", url, payload)
+    return await _post_json_to_microservice(Upstream.CLOUD, url, payload)
+
+# Cloud endpoints which answered 404/405 to their /bulk variant, with the time (seconds since the
+# epoch) they did; /bulk is tried again CLOUD_BULK_RETRY_MS later.
+_cloud_bulk_unsupported: dict[str, float] = {}
+
+def _cloud_bulk_known_unsupported(path: str) -> bool:
+    found_at = _cloud_bulk_unsupported.get(path)
+    if found_at is None:
+        return False
+    if time.time() - found_at < CLOUD_BULK_RETRY_MS / 1000:
+        return True
+    del _cloud_bulk_unsupported[path]
+    return False
+
+def _on_cloud_bulk_unsupported(paths: list[str]):
+    _cloud_bulk_unsupported.update(dict.fromkeys(paths, time.time()))
+
+async def _mark_cloud_bulk_unsupported(path: str):
+    _on_cloud_bulk_unsupported([path])
+    if MULTI_WORKER:
+        await shared_state.put_cloud_bulk_unsupported(path)
+
+def cloud_bulk_unsupported_paths() -> list[str]:
+    """
+    The cloud paths currently exported item by item because their /bulk endpoint is missing.
+    """
+    return sorted(path for path in list(_cloud_bulk_unsupported) if _cloud_bulk_known_unsupported(path))
+
+async def load_cloud_bulk_unsupported():
+    """
+    Takes over the cloud paths other workers recently found without a /bulk endpoint.
+    """
+    _cloud_bulk_unsupported.update(await shared_state.get_cloud_bulk_unsupported(CLOUD_BULK_RETRY_MS))
+
+async def _post_to_cloud_one_by_one(path: str, payloads: list) -> list[ItemResult]:
+    responses = await asyncio.gather(
+        *[_post_to_cloud_api(f"{CLOUD_API_URL}{path}", payload) for payload in payloads],
+        return_exceptions=True,
+    )
+    return [
+        ItemResult(status.HTTP_502_BAD_GATEWAY, repr(response)) if isinstance(response, Exception)
+        else ItemResult(response.status_code, _response_detail(response))
+        for response in responses
+    ]
+
+async def _post_to_cloud_in_bulk(path: str, payloads: list) -> list[ItemResult]:
+    """
+    POSTs `payloads` as a list to `{path}/bulk`. The cloud answers with one
+    {"status_code", "detail"} entry per item, or with no body when every item was stored.
+    Falls back to single POSTs on `path` if the bulk endpoint does not exist.
+    """
+    if _cloud_bulk_known_unsupported(path) or len(payloads) == 1:
+        return await _post_to_cloud_one_by_one(path, payloads)
+
+    response = await _post_to_cloud_api(f"{CLOUD_API_URL}{path}/bulk", payloads)
+    if response.status_code in (status.HTTP_404_NOT_FOUND, status.HTTP_405_METHOD_NOT_ALLOWED):
+        await _mark_cloud_bulk_unsupported(path)
+        return await _post_to_cloud_one_by_one(path, payloads)
+
+    detail = _response_detail(response) if response.content else None
+    if response.status_code not in (status.HTTP_200_OK, status.HTTP_201_CREATED, status.HTTP_207_MULTI_STATUS):
+        return [ItemResult(response.status_code, detail) for _ in payloads]
+    if isinstance(detail, list) and len(detail) == len(payloads):
+        return [ItemResult(item.get("status_code", status.HTTP_201_CREATED), item.get("detail")) for item in detail]
+    return [ItemResult(status.HTTP_201_CREATED, None) for _ in payloads]
+
+def _cloud_batcher(path: str) -> MicroBatcher[object, ItemResult]:
+    async def flush(payloads: list) -> list[ItemResult]:
+        return await _post_to_cloud_in_bulk(path, payloads)
+    return MicroBatcher(flush, max_batch_size=CLOUD_EXPORT_BATCH_SIZE, max_linger_ms=CLOUD_EXPORT_LINGER_MS)
+
+cloud_batchers: dict[str, MicroBatcher[object, ItemResult]] = {
+    path: _cloud_batcher(path)
+    for path in (
+        "/store/sensor/response/get/sensor-state",
+        "/store/sensor/response/get/inference-layer",
+        "/store/sensor/response/get/sensor-config",
+        "/export/sensor-data",
+        "/export/inference-latency-benchmark",
+        "/export/inference-latency-benchmark/summary",
+    )
+}
+
+cloud_spool = CloudSpool(
+    path=CLOUD_SPOOL_PATH,
+    forward=_post_to_cloud_in_bulk,
+    max_rows=CLOUD_SPOOL_MAX_ROWS,
+    drain_batch_size=CLOUD_SPOOL_DRAIN_BATCH_SIZE,
+    backoff_min_ms=CLOUD_SPOOL_BACKOFF_MIN_MS,
+    backoff_max_ms=CLOUD_SPOOL_BACKOFF_MAX_MS,
+    max_attempts=CLOUD_SPOOL_MAX_ATTEMPTS,
+    dumps=codec.packb if CLOUD_BINARY_PAYLOADS else serialization.dumps,
+    loads=codec.unpackb if CLOUD_BINARY_PAYLOADS else serialization.loads,
+)
+
+async def _post_to_cloud(path: str, payload: object):
+    if CLOUD_SPOOL_ENABLED:
+        # Accepted once it is on disk; the spool drainer delivers it to the cloud.
+        await cloud_spool.append(path, payload)
+        return ItemResult(status.HTTP_201_CREATED, None)
+    if CLOUD_EXPORT_BATCHING:
+        return await cloud_batchers[path].submit(payload)
+    return await _post_to_cloud_api(f"{CLOUD_API_URL}{path}", payload)
+
+async def _apply_sensor_response(response: s_resp.BaseResponse, forget_model: bool = False):
+    """
+    Hands a sensor response to the gateway's own state (waiting GET routes, property cache,
+    model deliveries). A failure there is only logged: the response still goes to the cloud.
+    """
+    try:
+        if forget_model:
+            await forget_model_delivery([response.metadata.sender])
+        await resolve_sensor_response(response)
+        await remember_sensor_response(response)
+    except Exception as e:
+        print(f"Applying the response of {response.metadata.sender} failed: {e!r}")
+
 async def store_sensor_state_response(response: s_resp.SensorStateResponse):
-    return await _post_json_to_microservice(f"{CLOUD_API_URL}/store/sensor/response/get/sensor-state", response.model_dump())
+    # e.g. a failed OTA update: the model pushed last may not be running
+    await _apply_sensor_response(response, forget_model=response.property_value == s_cmd.SensorState.ERROR)
+    return await _post_to_cloud("/store/sensor/response/get/sensor-state", response)
 
 async def store_sensor_inference_layer_response(response: s_resp.InferenceLayerResponse):
-    return await _post_json_to_microservice(f"{CLOUD_API_URL}/store/sensor/response/get/inference-layer", response.model_dump())
+    await _apply_sensor_response(response)
+    return await _post_to_cloud("/store/sensor/response/get/inference-layer", response)
 
 async def store_sensor_config_response(response: s_resp.SensorConfigResponse):
-    return await _post_json_to_microservice(f"{CLOUD_API_URL}/store/sensor/response/get/sensor-config", response.model_dump())
-                                            
+    await _apply_sensor_response(response)
+    return await _post_to_cloud("/store/sensor/response/get/sensor-config", response)
+
 async def export_sensor_data(sensor_data: s_export.SensorDataExport):
-    return await _post_json_to_microservice(f"{CLOUD_API_URL}/export/sensor-data", sensor_data.model_dump())
+    payload = s_export.dump_binary(sensor_data) if CLOUD_BINARY_PAYLOADS else sensor_data
+    return await _post_to_cloud("/export/sensor-data", payload)
 
 async def export_inference_latency_benchmark(inference_latency_benchmark: s_export.InferenceLatencyBenchmarkExport):
-    return await _post_json_to_microservice(f"{CLOUD_API_URL}/export/inference-latency-benchmark", inference_latency_benchmark.model_dump())
+    return await _post_to_cloud("/export/inference-latency-benchmark", inference_latency_benchmark)
+
+async def _export_inference_latency_summaries(window_start: int, window_end: int, summaries: dict):
+    exports = [
+        s_export.InferenceLatencySummaryExport(
+            metadata=s_export.Metadata(gateway_name=GATEWAY_NAME, sensor_name=sensor_name),
+            export_value=s_export.InferenceLatencySummary(
+                inference_layer=inference_layer, window_start=window_start, window_end=window_end, **summary
+            ),
+        )
+        for (sensor_name, inference_layer), summary in summaries.items()
+    ]
+    responses = await asyncio.gather(
+        *[_post_to_cloud("/export/inference-latency-benchmark/summary", export) for export in exports]
+    )
+    failed = [response.status_code for response in responses if response.status_code != status.HTTP_201_CREATED]
+    if failed:
+        print(f"Cloud rejected {len(failed)}/{len(exports)} latency summaries: {failed}")
+
+latency_aggregator = LatencyAggregator(
+    export=_export_inference_latency_summaries,
+    window_s=LATENCY_BENCHMARK_WINDOW_S,
+    max_samples=LATENCY_BENCHMARK_MAX_SAMPLES,
+)
+
+
+# --- Traffic capture ---
+
+trace_recorder = TraceRecorder(TRACE_PATH, max_bytes=TRACE_MAX_BYTES, queue_size=TRACE_QUEUE_SIZE)
+
+async def record_trace(request: Request):
+    """
+    Router dependency appending the request to the trace (the body stays cached for the route).
+    """
+    trace_recorder.record(request.method, request.url.path, request.url.query, request.headers, await request.body())
+
+# --- Multi-worker shared state ---
 
+# Set for the workers started by app/front.py; caches are then kept coherent across workers.
+MULTI_WORKER = GATEWAY_WORKER_INDEX >= 0
 
+shared_state = SharedSensorState(GATEWAY_STATE_PATH, worker=GATEWAY_WORKER_INDEX, poll_ms=GATEWAY_STATE_POLL_MS)
+shared_state.subscribe(CLOUD_BULK_UNSUPPORTED, _on_cloud_bulk_unsupported)
+
+
+# --- Model artifacts ---
+
+model_store = ArtifactStore(MODEL_STORE_PATH, max_bytes=MODEL_MAX_BYTES, chunk_size=MODEL_STREAM_CHUNK_BYTES)
+
+# Stands in for tf_model_b64 in a serialized document until the model is streamed in its place.
+_MODEL_PLACEHOLDER = "@@tf_model_b64@@"
+
+# Digest of the model last accepted by the inference microservice / by each sensor; shared by the
+# workers in multi-worker mode, so that none of them skips a model another one has since replaced.
+GATEWAY_MODEL_TARGET = "@gateway"
+model_deliveries = DeliveryLog(ttl_ms=MODEL_DELIVERY_TTL_MS)
+
+async def delivered_models(targets: list[str]) -> dict[str, str]:
+    if MULTI_WORKER:
+        return await shared_state.get_model_deliveries(targets, MODEL_DELIVERY_TTL_MS)
+    return model_deliveries.delivered(targets)
+
+async def record_model_delivery(targets: list[str], digest: str):
+    model_deliveries.record(targets, digest)
+    if MULTI_WORKER:
+        await shared_state.put_model_deliveries(targets, digest)
+
+async def forget_model_delivery(targets: list[str]):
+    model_deliveries.forget(targets)
+    if MULTI_WORKER:
+        await shared_state.forget_model_deliveries(targets)
+
+def _require_model(digest: str):
+    if not model_store.has(digest):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown model {digest}, upload it to /gateway/models/{digest} first.",
+        )
+
+async def _post_model_document(upstream: Upstream, url: str, document: object, digest: str):
+    # POSTs `document` with its _MODEL_PLACEHOLDER streamed from the model store as base64
+    body = serialization.dumps(document)
+    return await clients.request(
+        upstream, "POST", url,
+        content=model_store.iter_json_with_base64(digest, body, _MODEL_PLACEHOLDER.encode()),
+        headers=serialization.JSON_HEADERS,
+    )
+
+def model_delivery_stats() -> dict:
+    deliveries = model_deliveries.stats()
+    return {
+        **model_store.stats(),
+        "gateway_model": deliveries.pop(GATEWAY_MODEL_TARGET, None),
+        "sensor_models": deliveries,
+    }
 
 # --- BLE Provisioning microservice functions ---
 
 async def ble_discover_sensors():
-    return await _get_from_microservice(f"{BLE_PROV_MICROSERVICE_URL}/discover")
+    return await _get_from_microservice(Upstream.BLE_PROV, f"{BLE_PROV_MICROSERVICE_URL}/discover")
 
 async def ble_provision_sensors(devices: list[gw_cmd.BLEDeviceWithPoP]):
-    json_payload = [device.model_dump() for device in devices]
-    return await _post_json_to_microservice(f"{BLE_PROV_MICROSERVICE_URL}/provision", json_data=json_payload)
+    return await _post_json_to_microservice(Upstream.BLE_PROV, f"{BLE_PROV_MICROSERVICE_URL}/provision", json_data=devices)
 
 # --- Inference microservice functions ---
 
-async def set_gateway_model(gateway_model: gw_cmd.GatewayModel):
-    return await _post_json_to_microservice(f"{INFERENCE_MICROSERVICE_URL}/model/upload", gateway_model.model_dump())
+async def set_gateway_model(gateway_model: gw_cmd.GatewayModel, force: bool = False):
+    url = f"{INFERENCE_MICROSERVICE_URL}/model/upload"
+    digest = gateway_model.tf_model_digest
+    if digest is None:
+        await forget_model_delivery([GATEWAY_MODEL_TARGET])
+        return await _post_json_to_microservice(Upstream.INFERENCE, url, gateway_model)
+
+    _require_model(digest)
+    if not force and (await delivered_models([GATEWAY_MODEL_TARGET])).get(GATEWAY_MODEL_TARGET) == digest:
+        return ItemResult(status.HTTP_202_ACCEPTED, {"message": "Gateway model already delivered"})
+    document = gw_cmd.GatewayModel(tf_model_bytesize=model_store.size(digest), tf_model_b64=_MODEL_PLACEHOLDER)
+    response = await _post_model_document(Upstream.INFERENCE, url, document, digest)
+    if response.status_code == status.HTTP_202_ACCEPTED:
+        await record_model_delivery([GATEWAY_MODEL_TARGET], digest)
+    else:
+        await forget_model_delivery([GATEWAY_MODEL_TARGET])
+    return response
 
 async def send_prediction_request(prediction_request: s_export.SensorDataExport):
-    return await _put_json_to_microservice(f"{INFERENCE_MICROSERVICE_URL}/model/prediction/request", prediction_request.model_dump())
+    # Ask the inference microservice to push the finished task back instead of being polled.
+    headers = {"X-Callback-URL": PREDICTION_CALLBACK_URL} if PREDICTION_PUSH_ENABLED else None
+    url = f"{INFERENCE_MICROSERVICE_URL}/model/prediction/request"
+    if INFERENCE_BINARY_PAYLOADS:
+        return await _send_msgpack_to_microservice(
+            Upstream.INFERENCE, "PUT", url, s_export.dump_binary(prediction_request), headers=headers
+        )
+    return await _put_json_to_microservice(Upstream.INFERENCE, url, prediction_request, headers=headers)
+
+async def send_batch_prediction_request(prediction_requests: list[s_export.SensorDataExport]):
+    headers = {"X-Callback-URL": PREDICTION_CALLBACK_URL} if PREDICTION_PUSH_ENABLED else None
+    url = f"{INFERENCE_MICROSERVICE_URL}/model/prediction/request/batch"
+    if INFERENCE_BINARY_PAYLOADS:
+        return await _send_msgpack_to_microservice(
+            Upstream.INFERENCE, "PUT", url, [s_export.dump_binary(request) for request in prediction_requests], headers=headers
+        )
+    return await _put_json_to_microservice(
+        Upstream.INFERENCE, url, prediction_requests, headers=headers
+    )
 
 async def get_prediction_result(task_id: str):
-    return await _get_from_microservice(f"{INFERENCE_MICROSERVICE_URL}/model/prediction/result/{task_id}")
+    return await _hedged_get_from_microservice(Upstream.INFERENCE, f"{INFERENCE_MICROSERVICE_URL}/model/prediction/result/{task_id}")
+
+async def get_prediction_results(task_ids: list[str]):
+    return await _post_json_to_microservice(
+        Upstream.INFERENCE, f"{INFERENCE_MICROSERVICE_URL}/model/prediction/results", {"task_ids": task_ids}
+    )
+
+# Set to False the first time the inference microservice rejects the bulk status endpoint.
+_bulk_prediction_results_supported = True
+
+async def _fetch_prediction_results_bulk(task_ids: list[str]) -> dict[str, dict | None | Exception] | None:
+    global _bulk_prediction_results_supported
+    response = await get_prediction_results(task_ids)
+    if response.status_code in (status.HTTP_404_NOT_FOUND, status.HTTP_405_METHOD_NOT_ALLOWED):
+        _bulk_prediction_results_supported = False
+        return None
+    if response.status_code != status.HTTP_200_OK:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+
+    results = {}
+    for task in response.json():
+        results[task["task_id"]] = None if task["status"] == inference.PredictionStatus.PENDING else task
+    return results
+
+async def _fetch_prediction_result(task_id: str) -> dict | None | Exception:
+    response = await get_prediction_result(task_id)
+    if response.status_code != status.HTTP_200_OK:
+        return HTTPException(status_code=response.status_code, detail=response.json())
+    json_response = response.json()
+    return None if json_response["status"] == inference.PredictionStatus.PENDING else json_response
+
+async def _fetch_prediction_results(task_ids: list[str]) -> dict[str, dict | None | Exception]:
+    if _bulk_prediction_results_supported:
+        results = await _fetch_prediction_results_bulk(task_ids)
+        if results is not None:
+            return results
+
+    semaphore = asyncio.Semaphore(PREDICTION_POLL_CONCURRENCY)
+    async def fetch(task_id: str):
+        async with semaphore:
+            return await _fetch_prediction_result(task_id)
+
+    return dict(zip(task_ids, await asyncio.gather(*[fetch(task_id) for task_id in task_ids])))
+
+prediction_tracker = PredictionTracker()
+prediction_poller = PredictionPoller(
+    tracker=prediction_tracker,
+    fetch=_fetch_prediction_results,
+    default_interval_ms=POLLING_INTERVAL_MS,
+    min_interval_ms=POLLING_MIN_INTERVAL_MS,
+    max_interval_ms=POLLING_MAX_INTERVAL_MS,
+    batch_size=PREDICTION_POLL_BATCH_SIZE,
+)
+
+# --- Prediction submission (optionally micro-batched across sensors) ---
+
+# Set to False the first time the inference microservice rejects the batched request endpoint.
+_batch_prediction_supported = True
+
+def batch_prediction_supported() -> bool:
+    return _batch_prediction_supported
+
+async def _submit_prediction(prediction_request: s_export.SensorDataExport) -> tuple[str, int | None]:
+    response = await send_prediction_request(prediction_request)
+    if response.status_code != status.HTTP_202_ACCEPTED:
+        raise HTTPException(status_code=response.status_code, detail=response.json())
+    return response.json()["task_id"], None
+
+async def _submit_prediction_batch(batch: list[s_export.SensorDataExport]) -> list[tuple[str, int | None] | Exception]:
+    global _batch_prediction_supported
+    if len(batch) > 1 and _batch_prediction_supported:
+        response = await send_batch_prediction_request(batch)
+        if response.status_code in (status.HTTP_404_NOT_FOUND, status.HTTP_405_METHOD_NOT_ALLOWED):
+            _batch_prediction_supported = False
+        elif response.status_code != status.HTTP_202_ACCEPTED:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        else:
+            task_id = response.json()["task_id"]
+            return [(task_id, index) for index in range(len(batch))]
+
+    return await asyncio.gather(*[_submit_prediction(item) for item in batch], return_exceptions=True)
+
+prediction_batcher: MicroBatcher[s_export.SensorDataExport, tuple[str, int | None]] = MicroBatcher(
+    _submit_prediction_batch,
+    max_batch_size=INFERENCE_BATCH_SIZE,
+    max_linger_ms=INFERENCE_BATCH_WAIT_MS,
+)
+
+async def submit_prediction(prediction_request: s_export.SensorDataExport) -> tuple[str, int | None]:
+    """
+    Submits a reading for gateway inference and returns (task_id, index); index is the
+    position of the reading inside a batched task, or None for a single-reading task.
+    """
+    if INFERENCE_BATCHING and _batch_prediction_supported:
+        return await prediction_batcher.submit(prediction_request)
+    return await _submit_prediction(prediction_request)
+
+def _unpack_prediction_task(task: dict, index: int | None = None) -> inference.PredictionResult:
+    prediction_task = inference.PredictionTask(**task)
+    if prediction_task.status == inference.PredictionStatus.FAILURE:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Prediction task failed.")
+    result = prediction_task.result or inference.PredictionResult()
+    if isinstance(result, list):
+        if index is None or index >= len(result):
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Malformed batched prediction result.")
+        result = result[index]
+    return result
+
+async def await_prediction_result(task_id: str, index: int | None = None) -> inference.PredictionResult:
+    """
+    Waits for a prediction task to finish and returns its result, taken from position
+    `index` of the result list for batched tasks.
+
+    The result is taken from a push to the prediction-result callback when the inference
+    microservice supports it; otherwise (or once PREDICTION_PUSH_TIMEOUT_MS elapses) the
+    shared prediction_poller picks the task up, still accepting a late push.
+    """
+    future = prediction_tracker.register(task_id)
+    expect_push = PREDICTION_PUSH_ENABLED and prediction_tracker.push_available
+    if not future.done():
+        prediction_poller.track(
+            task_id,
+            delay=PREDICTION_PUSH_TIMEOUT_MS / 1000 if expect_push else None,
+            expect_push=expect_push,
+        )
+    timeout = PREDICTION_TIMEOUT_MS / 1000
+    left = time_left()
+    if left is not None:
+        timeout = max(0, min(timeout, left))
+    try:
+        await asyncio.wait({future}, timeout=timeout)
+        if not future.done():
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Prediction task '{task_id}' timed out.")
+        return _unpack_prediction_task(future.result(), index)
+    finally:
+        if prediction_tracker.discard(task_id):
+            prediction_poller.untrack(task_id)
 
 # --- Metadata microservice functions ---
 async def get_registered_sensors():
-    return await _get_from_microservice(f"{METADATA_MICROSERVICE_URL}/sensors")
+    return await _hedged_get_from_microservice(Upstream.METADATA, f"{METADATA_MICROSERVICE_URL}/sensors")
 
-async def verify_target_sensors(target_names: list[str]):
+async def _fetch_registered_sensor_names() -> set[str]:
     response = await get_registered_sensors()
     if response.status_code != status.HTTP_200_OK:
         raise HTTPException(status_code=response.status_code, detail=response.json())
 
-    registered_names = [metadata.SensorDescriptor(**sensor).device_name for sensor in response.json()]
+    return {metadata.SensorDescriptor(**sensor).device_name for sensor in response.json()}
 
-    for name in target_names:
-        if name not in registered_names:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Sensor '{name}' is not registered")
+sensor_registry = SensorRegistryCache(
+    # the registry refreshes every TTL / 2; workers share one metadata fetch per refresh
+    fetch=shared_state.shared_fetch(_fetch_registered_sensor_names, REGISTRY_TTL_MS // 2) if MULTI_WORKER
+    else _fetch_registered_sensor_names,
+    ttl_ms=REGISTRY_TTL_MS,
+    negative_ttl_ms=REGISTRY_NEGATIVE_TTL_MS,
+)
+shared_state.subscribe(REGISTRY_INVALIDATED, lambda _: sensor_registry.invalidate())
+shared_state.subscribe(REGISTRY_ADDED, sensor_registry.add)
 
-async def metadata_create_sensors(sensors: list[metadata.SensorDescriptor]):
-    for sensor in sensors:
-        response = await _post_json_to_microservice(f"{METADATA_MICROSERVICE_URL}/sensor", sensor.model_dump())
-        if response.status_code != status.HTTP_201_CREATED:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
+async def invalidate_registered_sensors():
+    sensor_registry.invalidate()
+    if MULTI_WORKER:
+        await shared_state.publish(REGISTRY_INVALIDATED)
+
+async def add_registered_sensors(names: list[str]):
+    sensor_registry.add(names)
+    if MULTI_WORKER and names:
+        await shared_state.publish(REGISTRY_ADDED, names)
 
-async def metadata_update_sensors(sensors: list[metadata.SensorDescriptor], fields: dict):
-    for sensor in sensors:
-        response = await _put_json_to_microservice(
-            url=f"{METADATA_MICROSERVICE_URL}/sensor/{sensor.device_name}", 
-            json_data={**fields, **sensor.model_dump()}
+async def verify_target_sensors(target_names: list[str]):
+    unregistered = await sensor_registry.find_unregistered(target_names)
+    if unregistered:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Sensor '{unregistered[0]}' is not registered")
+
+# Metadata write paths ("POST /sensors", "PUT /sensors") which answered 404/405 to a bulk request.
+_metadata_bulk_unsupported: set[str] = set()
+
+def _sensor_write_result(device_name: str, response, expected_status: int) -> metadata.SensorWriteResult:
+    if isinstance(response, Exception):
+        return metadata.SensorWriteResult(
+            device_name=device_name, success=False, status_code=status.HTTP_502_BAD_GATEWAY, detail=repr(response)
         )
-        if response.status_code != status.HTTP_200_OK:
-            raise HTTPException(status_code=response.status_code, detail=response.json())
+    return metadata.SensorWriteResult(
+        device_name=device_name,
+        success=response.status_code == expected_status,
+        status_code=response.status_code,
+        detail=None if response.status_code == expected_status else _response_detail(response),
+    )
+
+async def _metadata_bulk_write(
+    method: str, payloads: list[dict], expected_status: int
+) -> list[metadata.SensorWriteResult] | None:
+    """
+    Sends all payloads in one request to the metadata bulk endpoint, which answers with one
+    {"status_code", "detail"} entry per sensor or with no body when every write succeeded.
+    Returns None if the metadata microservice has no bulk endpoint.
+    """
+    key = f"{method} /sensors"
+    if key in _metadata_bulk_unsupported or len(payloads) < 2:
+        return None
+
+    response = await clients.request(
+        Upstream.METADATA, method, f"{METADATA_MICROSERVICE_URL}/sensors",
+        content=serialization.dumps(payloads), headers=serialization.JSON_HEADERS,
+    )
+    if response.status_code in (status.HTTP_404_NOT_FOUND, status.HTTP_405_METHOD_NOT_ALLOWED):
+        _metadata_bulk_unsupported.add(key)
+        return None
+
+    names = [payload["device_name"] for payload in payloads]
+    detail = _response_detail(response) if response.content else None
+    if isinstance(detail, list) and len(detail) == len(payloads):
+        return [
+            metadata.SensorWriteResult(
+                device_name=name,
+                success=item.get("status_code", expected_status) == expected_status,
+                status_code=item.get("status_code", expected_status),
+                detail=item.get("detail"),
+            )
+            for name, item in zip(names, detail)
+        ]
+    success = response.status_code in (expected_status, status.HTTP_200_OK, status.HTTP_201_CREATED)
+    return [
+        metadata.SensorWriteResult(
+            device_name=name,
+            success=success,
+            status_code=expected_status if success else response.status_code,
+            detail=None if success else detail,
+        )
+        for name in names
+    ]
+
+async def _metadata_write_concurrently(
+    method: str, requests: list[tuple[str, str, dict]], expected_status: int
+) -> list[metadata.SensorWriteResult]:
+    semaphore = asyncio.Semaphore(METADATA_WRITE_CONCURRENCY)
+    async def write(url: str, payload: dict):
+        async with semaphore:
+            return await clients.request(
+                Upstream.METADATA, method, url, content=serialization.dumps(payload), headers=serialization.JSON_HEADERS
+            )
+
+    responses = await asyncio.gather(*[write(url, payload) for _, url, payload in requests], return_exceptions=True)
+    return [
+        _sensor_write_result(device_name, response, expected_status)
+        for (device_name, _, _), response in zip(requests, responses)
+    ]
+
+async def metadata_create_sensors(sensors: list[metadata.SensorDescriptor]) -> list[metadata.SensorWriteResult]:
+    payloads = [sensor.model_dump() for sensor in sensors]
+    results = await _metadata_bulk_write("POST", payloads, status.HTTP_201_CREATED)
+    if results is None:
+        results = await _metadata_write_concurrently(
+            "POST",
+            [(sensor.device_name, f"{METADATA_MICROSERVICE_URL}/sensor", payload) for sensor, payload in zip(sensors, payloads)],
+            status.HTTP_201_CREATED,
+        )
+
+    await add_registered_sensors([result.device_name for result in results if result.success])
+    if not all(result.success for result in results):
+        await invalidate_registered_sensors()
+    return results
+
+async def metadata_update_sensors(sensors: list[metadata.SensorDescriptor], fields: dict) -> list[metadata.SensorWriteResult]:
+    payloads = [{**fields, **sensor.model_dump()} for sensor in sensors]
+    results = await _metadata_bulk_write("PUT", payloads, status.HTTP_200_OK)
+    if results is None:
+        results = await _metadata_write_concurrently(
+            "PUT",
+            [
+                (sensor.device_name, f"{METADATA_MICROSERVICE_URL}/sensor/{sensor.device_name}", payload)
+                for sensor, payload in zip(sensors, payloads)
+            ],
+            status.HTTP_200_OK,
+        )
+    return results
         
 async def metadata_get_sensors():
-    return await _get_from_microservice(f"{METADATA_MICROSERVICE_URL}/sensors")
+    return await _get_from_microservice(Upstream.METADATA, f"{METADATA_MICROSERVICE_URL}/sensors")
 
 async def get_provisioned_sensors():
     response = await metadata_get_sensors()
@@ -119,67 +712,238 @@ async def get_provisioned_sensors():
         raise HTTPException(status_code=response.status_code, detail=response.json())
     return [sensor for sensor in response.json() if sensor["provisioned"]]
 
-async def add_provisioned_sensors(sensors: list[metadata.SensorDescriptor]):
-    await metadata_update_sensors(sensors, fields={"provisioned": True})
+async def add_provisioned_sensors(sensors: list[metadata.SensorDescriptor]) -> list[metadata.SensorWriteResult]:
+    try:
+        return await metadata_update_sensors(sensors, fields={"provisioned": True})
+    finally:
+        await invalidate_registered_sensors()
+
+
+# --- Sensor property cache ---
+
+sensor_properties = PropertyCache(max_sensors=PROPERTY_CACHE_MAX_SENSORS)
+
+# Properties whose last known value is kept; sensor-model and inf-latency-bench are write-only.
+CACHED_PROPERTIES = {"sensor-state", "inference-layer", "sensor-config"}
+
+def _property_value(command: s_cmd.BaseCommand | s_resp.BaseResponse) -> object:
+    return command.model_dump(mode="json", include={"property_value"})["property_value"]
+
+async def remember_sensor_property(sensor_names: list[str], property_name: str, value: object, source: str):
+    updated_at = time.time()
+    changed = [
+        sensor_name for sensor_name in sensor_names
+        if sensor_properties.put(sensor_name, property_name, value, source, updated_at)
+    ]
+    # readings arrive far more often than the value changes: an unchanged one is only refreshed
+    # locally, other workers then see an older value, which can only make them ask the sensor
+    shared = changed if source == property_cache.READING else sensor_names
+    if MULTI_WORKER and shared:
+        await shared_state.put_properties(property_name, {
+            sensor_name: CachedProperty(value, updated_at, source) for sensor_name in shared
+        })
+
+async def remember_sensor_response(response: s_resp.BaseResponse):
+    await remember_sensor_property([response.metadata.sender], response.property_name, _property_value(response), property_cache.RESPONSE)
+
+async def cached_sensor_properties(sensor_names: list[str], property_name: str, max_age_ms: int) -> dict[str, CachedProperty]:
+    """
+    Returns the values of `property_name` learnt at most `max_age_ms` ago, by sensor.
+    """
+    fresh = {}
+    for sensor_name in sensor_names:
+        cached = sensor_properties.get(sensor_name, property_name, max_age_ms)
+        if cached is not None:
+            fresh[sensor_name] = cached
+    missing = [sensor_name for sensor_name in sensor_names if sensor_name not in fresh]
+    if MULTI_WORKER and missing:
+        # another worker may have learnt them
+        for sensor_name, cached in (await shared_state.get_properties(missing, property_name)).items():
+            sensor_properties.put(sensor_name, property_name, cached.value, cached.source, cached.updated_at)
+            if cached.age_ms <= max_age_ms:
+                fresh[sensor_name] = cached
+    return fresh
+
+async def get_sensor_property(command: s_cmd.BaseCommand, send_get, max_age_ms: int | None) -> tuple[list[str], dict]:
+    """
+    Answers GET `command` from the property cache for the target sensors whose value is at
+    most `max_age_ms` old and sends it, with `send_get`, to the others only. Returns the
+    command_uuids of the sent command and the cached values by sensor.
+    """
+    target_sensors = command.target.target_sensors
+    cached = await cached_sensor_properties(target_sensors, command.property_name, max_age_ms) if max_age_ms is not None else {}
+
+    command_uuids = []
+    unanswered = [sensor_name for sensor_name in target_sensors if sensor_name not in cached]
+    if unanswered:
+        if cached:
+            command = command.model_copy(update={
+                "target": command.target.model_copy(update={"target_sensors": unanswered}),
+            })
+        response = await send_get(command)
+        if response.status_code != status.HTTP_202_ACCEPTED:
+            raise HTTPException(status_code=response.status_code, detail=response.json())
+        command_uuids = response.json().get("command_uuids")
+
+    return command_uuids, {
+        sensor_name: {"property_value": value.value, "age_ms": value.age_ms, "source": value.source}
+        for sensor_name, value in cached.items()
+    }
+
+
+# --- GET sensor commands awaiting their response ---
+
+command_responses = CommandResponseTracker()
+_shared_response_claims: set[asyncio.Task] = set()
+
+async def resolve_sensor_response(response: s_resp.BaseResponse):
+    """
+    Hands the response of a sensor to the GET command route waiting for it, if any.
+    """
+    command_uuid = response.metadata.command_uuid
+    value = {"sensor_name": response.metadata.sender, "property_value": _property_value(response)}
+    # the waiting route may be on another worker
+    if not command_responses.resolve(command_uuid, value) and MULTI_WORKER:
+        await shared_state.put_command_response(command_uuid, value)
+
+async def _claim_shared_responses(command_uuids: list[str]):
+    for command_uuid, value in (await shared_state.get_command_responses(command_uuids)).items():
+        command_responses.resolve(command_uuid, value)
+
+def _on_command_responded(command_uuids: list[str]):
+    waited = [command_uuid for command_uuid in command_uuids if command_responses.is_waiting(command_uuid)]
+    if waited:
+        claim = asyncio.create_task(_claim_shared_responses(waited))
+        _shared_response_claims.add(claim)
+        claim.add_done_callback(_shared_response_claims.discard)
+
+shared_state.subscribe(COMMAND_RESPONDED, _on_command_responded)
+
+async def wait_for_sensor_responses(command_uuids: list[str], wait_ms: int) -> tuple[dict, list[str]]:
+    """
+    Waits up to `wait_ms` (capped by COMMAND_WAIT_MAX_MS) for the sensors to respond to the GET
+    commands `command_uuids`. Returns the responses by sensor and the command_uuids still pending.
+    """
+    wait = asyncio.create_task(command_responses.wait(command_uuids, min(wait_ms, COMMAND_WAIT_MAX_MS) / 1000))
+    if MULTI_WORKER and command_uuids:
+        # responses which reached another worker before the futures were registered
+        await asyncio.sleep(0)
+        await _claim_shared_responses(command_uuids)
+    responses, pending = await wait
+    return {
+        value["sensor_name"]: {"property_value": value["property_value"], "command_uuid": command_uuid}
+        for command_uuid, value in responses.items()
+    }, pending
 
 
 # --- Sensor microservice functions ---
 
+async def _post_sensor_command(url: str, command: s_cmd.BaseCommand):
+    if isinstance(command, s_cmd.SetSensorModel) and command.property_value.tf_model_digest is not None:
+        digest = command.property_value.tf_model_digest
+        document = command.model_copy(update={
+            "property_value": s_cmd.SensorModel(tf_model_b64=_MODEL_PLACEHOLDER, tf_model_bytesize=model_store.size(digest)),
+        })
+        return await _post_model_document(Upstream.MQTT_SENSOR, url, document, digest)
+    return await _post_json_to_microservice(Upstream.MQTT_SENSOR, url, command)
+
+# SET commands for the same property sent within COMMAND_COALESCE_WINDOW_MS are merged
+# into one multi-sensor command (see app/core/commands.py)
+command_dispatcher = CommandDispatcher(
+    send=_post_sensor_command,
+    max_batch_size=COMMAND_COALESCE_BATCH_SIZE,
+    window_ms=COMMAND_COALESCE_WINDOW_MS,
+)
+
+# Property SETs which only leave the last value sent in effect, so that a later SET for the same
+# sensor may supersede an earlier one. inf-latency-bench commands are events and are never merged.
+COALESCED_PROPERTIES = {"sensor-state", "inference-layer", "sensor-config", "sensor-model"}
+
+async def _send_sensor_set_command(url: str, command: s_cmd.BaseCommand):
+    if COMMAND_COALESCING and command.property_name in COALESCED_PROPERTIES:
+        response = await command_dispatcher.submit(url, command)
+    else:
+        response = await _post_sensor_command(url, command)
+    if command.property_name in CACHED_PROPERTIES and response.status_code == status.HTTP_202_ACCEPTED:
+        await remember_sensor_property(command.target.target_sensors, command.property_name, _property_value(command), property_cache.SET)
+    return response
+
 async def set_sensor_state(
     command: s_cmd.SetSensorState,
 ):
-    return await _post_json_to_microservice(
+    return await _send_sensor_set_command(
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/set/sensor-state",
-        command.model_dump(),
+        command,
     )
 
 async def get_sensor_state(
     command: s_cmd.GetSensorState,
 ):
     return await _post_json_to_microservice(
+        Upstream.MQTT_SENSOR,
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/get/sensor-state",
-        command.model_dump(),
+        command,
     )
 
 async def set_inference_layer(
     command: s_cmd.SetInferenceLayer,
 ):
-    return await _post_json_to_microservice(
+    return await _send_sensor_set_command(
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/set/inference-layer",
-        command.model_dump(),
+        command,
     )
 
 async def get_inference_layer(
     command: s_cmd.GetInferenceLayer,
 ):
     return await _post_json_to_microservice(
+        Upstream.MQTT_SENSOR,
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/get/inference-layer",
-        command.model_dump(),
+        command,
     )
 
 async def set_sensor_config(
     command: s_cmd.SetSensorConfig,
 ):
-    return await _post_json_to_microservice(
+    return await _send_sensor_set_command(
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/set/sensor-config",
-        command.model_dump(),
+        command,
     )
 
 async def get_sensor_config(
     command: s_cmd.GetSensorConfig,
 ):
     return await _post_json_to_microservice(
+        Upstream.MQTT_SENSOR,
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/get/sensor-config",
-        command.model_dump(),
+        command,
     )
 
 async def set_sensor_model(
     command: s_cmd.SetSensorModel,
+    force: bool = False,
 ):
-    return await _post_json_to_microservice(
-        f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/set/sensor-model",
-        command.model_dump(),
-    )
+    url = f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/set/sensor-model"
+    digest = command.property_value.tf_model_digest
+    if digest is None:
+        await forget_model_delivery(command.target.target_sensors)
+        return await _send_sensor_set_command(url, command)
+
+    # sensors which already run this model are left out, unless forced
+    _require_model(digest)
+    delivered = {} if force else await delivered_models(command.target.target_sensors)
+    target_sensors = [name for name in command.target.target_sensors if delivered.get(name) != digest]
+    if not target_sensors:
+        return ItemResult(status.HTTP_202_ACCEPTED, {"message": "Sensor model already delivered"})
+    command = command.model_copy(update={
+        "target": command.target.model_copy(update={"target_sensors": target_sensors}),
+    })
+    response = await _send_sensor_set_command(url, command)
+    if response.status_code == status.HTTP_202_ACCEPTED:
+        await record_model_delivery(target_sensors, digest)
+    else:
+        await forget_model_delivery(target_sensors)
+    return response
 
 async def send_inference_latency_benchmark_command(
     gateway_name: str,
@@ -190,9 +954,9 @@ async def send_inference_latency_benchmark_command(
         target = await get_gateway_api_with_sensors(gateway_name, [sensor_name]),
         property_value=inf_latency_bench
     )
-    return await _post_json_to_microservice(
+    return await _send_sensor_set_command(
         f"{MQTT_SENSOR_MICROSERVICE_URL}/sensor/command/set/inf-latency-bench",
-        command.model_dump(),
+        command,
     )
 
 # --- Gateway Adaptive Heuristic ---
@@ -202,7 +966,7 @@ async def get_gateway_api_with_sensors(gateway_name: str, target_sensors: list[s
         target_sensors=target_sensors
     )
 
-async def handle_heuristic_result(gateway_name: str, sensor_name: str, heuristic_result: int):
+async def _send_heuristic_command(gateway_name: str, sensor_name: str, heuristic_result: int):
     gateway_api_with_sensors = await get_gateway_api_with_sensors(gateway_name, [sensor_name])
     if heuristic_result == HEURISTIC_ERROR_CODE:    # set sensor state to error
         command = s_cmd.SetSensorState(
@@ -228,3 +992,49 @@ async def handle_heuristic_result(gateway_name: str, sensor_name: str, heuristic
         response = await set_inference_layer(command)
         if response.status_code != status.HTTP_202_ACCEPTED:
             raise HTTPException(status_code=response.status_code, detail=response.json())
+
+async def _send_gateway_heuristic_command(sensor_name: str, heuristic_result: int):
+    await _send_heuristic_command(GATEWAY_NAME, sensor_name, heuristic_result)
+
+heuristic_tracker = HeuristicStateTracker(
+    send=_send_gateway_heuristic_command,
+    stay=GATEWAY_INFERENCE_LAYER,
+    immediate=(HEURISTIC_ERROR_CODE,),
+    hysteresis=HEURISTIC_HYSTERESIS,
+    min_dwell_ms=HEURISTIC_MIN_DWELL_MS,
+)
+shared_state.subscribe(HEURISTIC_FORGOTTEN, heuristic_tracker.forget)
+
+async def forget_heuristic_state(sensor_names: list[str]):
+    """
+    Forgets what the heuristic last commanded to `sensor_names`, on every worker.
+    """
+    heuristic_tracker.forget(sensor_names)
+    if MULTI_WORKER:
+        await shared_state.publish(HEURISTIC_FORGOTTEN, sensor_names)
+
+# With ADAPTIVE_POLICY="heuristic" the engine is never started (see app/main.py).
+GATEWAY_POLICY_ENABLED = ADAPTIVE_POLICY in POLICIES
+
+policy_engine = PolicyEngine(
+    policy=POLICIES.get(ADAPTIVE_POLICY, SaturationPolicy)(
+        load_high=ADAPTIVE_POLICY_LOAD_HIGH,
+        latency_high_ms=ADAPTIVE_POLICY_LATENCY_HIGH_MS,
+        min_confidence=ADAPTIVE_POLICY_MIN_CONFIDENCE,
+        stale_ms=ADAPTIVE_POLICY_STALE_MS,
+    ),
+    dispatch=heuristic_tracker.handle,
+    window=ADAPTIVE_POLICY_WINDOW,
+    interval_ms=ADAPTIVE_POLICY_INTERVAL_MS,
+)
+
+async def handle_heuristic_result(gateway_name: str, sensor_name: str, heuristic_result: int):
+    # the result is for a reading sent for gateway inference, so that is the sensor's layer for now
+    await remember_sensor_property([sensor_name], "inference-layer", GATEWAY_INFERENCE_LAYER, property_cache.READING)
+    # Commands only go out on transitions, see app/core/heuristics.py
+    if GATEWAY_POLICY_ENABLED and heuristic_result != HEURISTIC_ERROR_CODE:
+        return  # layers are decided by the gateway policy engine
+    if gateway_name != GATEWAY_NAME:
+        await _send_heuristic_command(gateway_name, sensor_name, heuristic_result)
+        return
+    await heuristic_tracker.handle(sensor_name, heuristic_result)
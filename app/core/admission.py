@@ -0,0 +1,146 @@
+"""
+Admission control for sensor data on the ingest path.
+
+Each sensor gets a token bucket refilled at `rate_per_s` up to `burst` tokens, and the
+gateway as a whole accepts new readings only while its load (readings queued or in
+progress) is below `max_load`. A decision takes one dict lookup and a few float operations
+and is made on the raw request, before the readings array is validated; the sensor name is
+taken from the X-Sensor-Name header or found by scanning the body (see peek_sensor_name).
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import orjson
+
+from app.core import codec
+from app.core.metrics import metrics
+
+ADMIT = "admit"
+SHED_RATE = "rate"      # the sensor exceeded its token bucket
+SHED_LOAD = "load"      # the gateway is at max_load
+
+SENSOR_NAME_HEADER = "X-Sensor-Name"
+
+_JSON_SENSOR_NAME = re.compile(rb'"sensor_name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_MSGPACK_SENSOR_NAME_KEY = b"\xabsensor_name"   # fixstr of length 11
+_PEEK_BYTES = 1024
+
+
+def _msgpack_str_at(body: bytes, offset: int) -> str | None:
+    if offset >= len(body):
+        return None
+    header = body[offset]
+    if 0xa0 <= header <= 0xbf:
+        start, length = offset + 1, header & 0x1f
+    elif header == 0xd9 and offset + 1 < len(body):
+        start, length = offset + 2, body[offset + 1]
+    else:
+        return None
+    return body[start:start + length].decode("utf-8", errors="replace")
+
+
+def peek_sensor_name(headers, body: bytes) -> str:
+    """
+    Returns the sensor name of a raw /export/sensor-data request without decoding it,
+    or "" if it cannot be found. The metadata usually comes first, so the start of the
+    body is scanned before the rest of it.
+    """
+    name = headers.get(SENSOR_NAME_HEADER)
+    if name:
+        return name
+    if codec.is_msgpack(headers.get("content-type")):
+        position = body.find(_MSGPACK_SENSOR_NAME_KEY)
+        if position < 0:
+            return ""
+        return _msgpack_str_at(body, position + len(_MSGPACK_SENSOR_NAME_KEY)) or ""
+    match = _JSON_SENSOR_NAME.search(body, 0, _PEEK_BYTES) or _JSON_SENSOR_NAME.search(body)
+    if match is None:
+        return ""
+    name = match.group(1)
+    return orjson.loads(b'"' + name + b'"') if b"\\" in name else name.decode("utf-8", errors="replace")
+
+
+class _SensorAdmission:
+    __slots__ = ("tokens", "updated_at", "admitted", "shed_rate", "shed_load")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+        self.admitted = 0
+        self.shed_rate = 0
+        self.shed_load = 0
+
+
+class AdmissionController:
+    """
+    Per-sensor token buckets plus a global load limit
+    """
+
+    def __init__(self, rate_per_s: float, burst: float, max_load: int, load: Callable[[], int], max_sensors: int = 10000):
+        self._rate = rate_per_s
+        self._burst = burst
+        self._max_load = max_load
+        self._load = load
+        self._max_sensors = max_sensors
+        # least recently seen sensors are forgotten first, bounding memory under bogus names
+        self._sensors: OrderedDict[str, _SensorAdmission] = OrderedDict()
+
+        self.admitted = 0
+        self.shed = {SHED_RATE: 0, SHED_LOAD: 0}
+
+    def admit(self, sensor_name: str) -> str:
+        """
+        Returns ADMIT, SHED_RATE or SHED_LOAD for a new reading of `sensor_name`.
+        """
+        now = time.monotonic()
+        sensor = self._sensors.get(sensor_name)
+        if sensor is None:
+            sensor = self._sensors[sensor_name] = _SensorAdmission(self._burst, now)
+            if len(self._sensors) > self._max_sensors:
+                self._sensors.popitem(last=False)
+        else:
+            self._sensors.move_to_end(sensor_name)
+            sensor.tokens = min(self._burst, sensor.tokens + (now - sensor.updated_at) * self._rate)
+            sensor.updated_at = now
+
+        if sensor.tokens < 1:
+            decision = SHED_RATE
+            sensor.shed_rate += 1
+        elif self._load() >= self._max_load:
+            decision = SHED_LOAD
+            sensor.shed_load += 1
+        else:
+            decision = ADMIT
+            sensor.tokens -= 1
+            sensor.admitted += 1
+
+        if decision == ADMIT:
+            self.admitted += 1
+        else:
+            self.shed[decision] += 1
+        metrics.inc("gateway_ingest_admission_total", "Ingest admission decisions", {"decision": decision})
+        return decision
+
+    def stats(self, top: int = 20) -> dict:
+        shedding = sorted(
+            (item for item in self._sensors.items() if item[1].shed_rate or item[1].shed_load),
+            key=lambda item: item[1].shed_rate + item[1].shed_load,
+            reverse=True,
+        )[:top]
+        return {
+            "rate_per_s": self._rate,
+            "burst": self._burst,
+            "max_load": self._max_load,
+            "load": self._load(),
+            "sensors": len(self._sensors),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "top_shed_sensors": {
+                name: {"admitted": sensor.admitted, "shed_rate": sensor.shed_rate, "shed_load": sensor.shed_load}
+                for name, sensor in shedding
+            },
+        }
+
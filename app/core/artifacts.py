@@ -0,0 +1,163 @@
+"""
+Content-addressed store for model artifacts (TFLite models).
+
+Models are uploaded once as raw bytes, streamed to disk while being hashed and stored under
+their SHA-256 hex digest. Commands then reference a model by digest, and the gateway streams
+it downstream as base64 straight from an mmap of the file, so neither uploads nor pushes
+hold the whole model (or its base64 encoding) in memory.
+"""
+
+import asyncio
+import base64
+import hashlib
+import mmap
+import os
+import re
+import time
+import uuid
+from typing import AsyncIterable, AsyncIterator
+
+DIGEST_PATTERN = r"^[0-9a-f]{64}$"
+_DIGEST_RE = re.compile(DIGEST_PATTERN)
+
+
+class ArtifactTooLarge(Exception):
+    pass
+
+
+class DigestMismatch(Exception):
+    pass
+
+
+class ArtifactStore:
+    """
+    Directory of artifacts named by their SHA-256 digest
+    """
+
+    def __init__(self, path: str, max_bytes: int, chunk_size: int):
+        self._path = path
+        self._max_bytes = max_bytes
+        # base64 chunks must encode a multiple of 3 bytes to be concatenable
+        self._chunk_size = max(3, chunk_size - chunk_size % 3)
+
+        self.uploads = 0
+        self.upload_bytes = 0
+        self.deduplicated = 0
+        self.streamed_bytes = 0
+
+    def _file(self, digest: str) -> str:
+        if not _DIGEST_RE.match(digest):
+            raise ValueError(f"invalid SHA-256 digest '{digest}'")
+        return os.path.join(self._path, digest)
+
+    def has(self, digest: str) -> bool:
+        return os.path.isfile(self._file(digest))
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self._file(digest))
+
+    async def put(self, chunks: AsyncIterable[bytes], expected_digest: str | None = None) -> tuple[str, int]:
+        """
+        Stores the bytes of `chunks` and returns (digest, size). Raises DigestMismatch if the
+        content does not hash to `expected_digest` and ArtifactTooLarge beyond max_bytes.
+        """
+        os.makedirs(self._path, exist_ok=True)
+        tmp_path = os.path.join(self._path, f".upload-{uuid.uuid4().hex}")
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self._max_bytes:
+                        raise ArtifactTooLarge(f"artifact exceeds {self._max_bytes} bytes")
+                    sha256.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            digest = sha256.hexdigest()
+            if expected_digest is not None and digest != expected_digest:
+                raise DigestMismatch(f"content hashes to {digest}, expected {expected_digest}")
+            if os.path.exists(self._file(digest)):
+                self.deduplicated += 1
+            else:
+                os.replace(tmp_path, self._file(digest))
+                self.uploads += 1
+                self.upload_bytes += size
+            return digest, size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def iter_base64(self, digest: str) -> AsyncIterator[bytes]:
+        """
+        Yields the base64 encoding of artifact `digest` chunk by chunk, read from an mmap.
+        """
+        with open(self._file(digest), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for offset in range(0, len(data), self._chunk_size):
+                    encoded = base64.b64encode(data[offset:offset + self._chunk_size])
+                    self.streamed_bytes += len(encoded)
+                    yield encoded
+                    await asyncio.sleep(0)
+
+    async def iter_json_with_base64(self, digest: str, body: bytes, placeholder: bytes) -> AsyncIterator[bytes]:
+        """
+        Streams the JSON document `body` with the string `placeholder` replaced by the base64
+        encoding of artifact `digest`.
+        """
+        prefix, suffix = body.split(placeholder, 1)
+        yield prefix
+        async for chunk in self.iter_base64(digest):
+            yield chunk
+        yield suffix
+
+    def stats(self) -> dict:
+        artifacts = [name for name in os.listdir(self._path) if _DIGEST_RE.match(name)] if os.path.isdir(self._path) else []
+        return {
+            "path": self._path,
+            "artifacts": len(artifacts),
+            "bytes": sum(os.path.getsize(os.path.join(self._path, name)) for name in artifacts),
+            "uploads": self.uploads,
+            "upload_bytes": self.upload_bytes,
+            "deduplicated": self.deduplicated,
+            "streamed_bytes": self.streamed_bytes,
+        }
+
+
+class DeliveryLog:
+    """
+    Digest of the model last accepted for each target (the inference microservice or a sensor).
+
+    An accepted push is only queued downstream and may still fail (an OTA update on the sensor,
+    a restart of the inference microservice), so a delivery is trusted for `ttl_ms` at most and
+    is forgotten as soon as the target reports a problem.
+    """
+
+    def __init__(self, ttl_ms: int):
+        self._ttl = ttl_ms / 1000
+        self._deliveries: dict[str, tuple[str, float]] = {}     # target -> (digest, time.time())
+
+    def delivered(self, targets: list[str]) -> dict[str, str]:
+        """
+        Returns the digest delivered to each of `targets` less than `ttl_ms` ago.
+        """
+        oldest = time.time() - self._ttl
+        delivered = {}
+        for target in targets:
+            delivery = self._deliveries.get(target)
+            if delivery is not None and delivery[1] >= oldest:
+                delivered[target] = delivery[0]
+        return delivered
+
+    def record(self, targets: list[str], digest: str):
+        now = time.time()
+        for target in targets:
+            self._deliveries[target] = (digest, now)
+
+    def forget(self, targets: list[str]):
+        for target in targets:
+            self._deliveries.pop(target, None)
+
+    def stats(self) -> dict[str, str]:
+        return self.delivered(list(self._deliveries))
@@ -0,0 +1,146 @@
+"""
+Size/time bounded micro-batching.
+
+Callers submit single items and await their own result; items submitted close together are
+flushed as one batch once max_batch_size items are pending or max_linger_ms has passed since
+the first one, whichever comes first.
+
+A batch is shared by requests with different deadlines (see app/core/resilience.py), so it
+does not run under the deadline of whichever caller happened to trigger the flush: items whose
+deadline passed while they lingered are failed and left out, the batch is bounded by the
+latest deadline of the others, and each caller stops waiting at its own deadline.
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from app.core.resilience import DeadlineExceeded, current_deadline, deadline, time_left
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class ItemResult:
+    """
+    Per-item outcome of a batched upstream request, shaped like the httpx.Response
+    fields the routes inspect (status_code and json()).
+    """
+
+    __slots__ = ("status_code", "detail")
+
+    def __init__(self, status_code: int, detail: object = None):
+        self.status_code = status_code
+        self.detail = detail
+
+    def json(self) -> object:
+        return self.detail
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Groups concurrently submitted items into batches handed to `flush`, which must return
+    one result (or Exception) per item, in order.
+    """
+
+    def __init__(self, flush: Callable[[list[T]], Awaitable[list[R]]], max_batch_size: int, max_linger_ms: int):
+        self._flush = flush
+        self._max_batch_size = max_batch_size
+        self._max_linger = max_linger_ms / 1000
+        self._items: list[T] = []
+        self._futures: list[asyncio.Future] = []
+        self._deadlines: list[float | None] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch = 0
+        self.expired = 0
+
+    async def submit(self, item: T) -> R:
+        left = time_left()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("deadline passed before the item was batched")
+        future = asyncio.get_running_loop().create_future()
+        self._items.append(item)
+        self._futures.append(future)
+        self._deadlines.append(current_deadline())
+        if len(self._items) >= self._max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self._max_linger, self.flush)
+        if left is None:
+            return await future
+        try:
+            # cancels the future on timeout, so the batch no longer resolves it
+            return await asyncio.wait_for(future, left)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("deadline passed while waiting for the batch")
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._items:
+            return
+        items, futures, deadlines = self._items, self._futures, self._deadlines
+        self._items, self._futures, self._deadlines = [], [], []
+
+        now = time.time()
+        live = []
+        for item, future, at in zip(items, futures, deadlines):
+            if future.done():
+                continue
+            if at is not None and at <= now:
+                self.expired += 1
+                future.set_exception(DeadlineExceeded("deadline passed while the item lingered"))
+                continue
+            live.append((item, future, at))
+        if not live:
+            return
+        items, futures, deadlines = (list(column) for column in zip(*live))
+        batch_deadline = None if None in deadlines else max(deadlines)
+
+        # in a fresh context: the caller that triggered the flush must not lend its deadline
+        task = contextvars.Context().run(asyncio.create_task, self._run(items, futures, batch_deadline))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, items: list[T], futures: list[asyncio.Future], batch_deadline: float | None):
+        self.batches += 1
+        self.items += len(items)
+        self.max_batch = max(self.max_batch, len(items))
+        try:
+            with deadline(batch_deadline):
+                results = await self._flush(items)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            # `flush` may fail individual items by returning the exception in their slot
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self):
+        self.flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._items),
+            "inflight_batches": len(self._inflight),
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch,
+            "expired": self.expired,
+        }
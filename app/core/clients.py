@@ -0,0 +1,291 @@
+"""
+Long-lived HTTP client pools for the upstream microservices.
+
+A single httpx.AsyncClient is kept per upstream for the lifetime of the app so that
+connections are reused (keep-alive) instead of being opened and closed on every call.
+The registry is started and closed by the FastAPI lifespan in app/main.py.
+
+Every request goes through the upstream's circuit breaker and is bounded by the deadline
+of the inbound request it serves (see app/core/resilience.py); the time left is passed on
+to the upstream in the X-Request-Deadline-Ms header.
+"""
+
+import asyncio
+import enum
+import time
+import httpx
+
+from app.core import serialization
+from app.core.metrics import Histogram, metrics
+from app.core.resilience import CircuitBreaker, DeadlineExceeded, UpstreamUnavailable, time_left
+
+from app.core.config import (
+    INFERENCE_POOL_SIZE,
+    INFERENCE_TIMEOUT_S,
+    BLE_PROV_POOL_SIZE,
+    BLE_PROV_TIMEOUT_S,
+    METADATA_POOL_SIZE,
+    METADATA_TIMEOUT_S,
+    MQTT_SENSOR_POOL_SIZE,
+    MQTT_SENSOR_TIMEOUT_S,
+    CLOUD_POOL_SIZE,
+    CLOUD_TIMEOUT_S,
+    POOL_KEEPALIVE_EXPIRY_S,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_TIMEOUT_MS,
+    HEDGE_AFTER_MS,
+)
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+# Hedging waits for the p95 latency of the upstream once this many samples were observed.
+_HEDGE_MIN_SAMPLES = 20
+
+
+class Upstream(str, enum.Enum):
+    INFERENCE = "inference"
+    BLE_PROV = "ble-prov"
+    METADATA = "metadata"
+    MQTT_SENSOR = "mqtt-sensor"
+    CLOUD = "cloud"
+
+
+# (pool size, timeout in seconds) per upstream
+POOL_SETTINGS: dict[Upstream, tuple[int, float]] = {
+    Upstream.INFERENCE: (INFERENCE_POOL_SIZE, INFERENCE_TIMEOUT_S),
+    Upstream.BLE_PROV: (BLE_PROV_POOL_SIZE, BLE_PROV_TIMEOUT_S),
+    Upstream.METADATA: (METADATA_POOL_SIZE, METADATA_TIMEOUT_S),
+    Upstream.MQTT_SENSOR: (MQTT_SENSOR_POOL_SIZE, MQTT_SENSOR_TIMEOUT_S),
+    Upstream.CLOUD: (CLOUD_POOL_SIZE, CLOUD_TIMEOUT_S),
+}
+
+
+class UpstreamResponse:
+    """
+    Read-only view of an upstream httpx.Response whose JSON body is parsed at most once
+    """
+
+    __slots__ = ("_response", "_json")
+
+    _UNPARSED = object()
+
+    def __init__(self, response: httpx.Response):
+        self._response = response
+        self._json = self._UNPARSED
+
+    @property
+    def status_code(self) -> int:
+        return self._response.status_code
+
+    @property
+    def headers(self) -> httpx.Headers:
+        return self._response.headers
+
+    @property
+    def content(self) -> bytes:
+        return self._response.content
+
+    @property
+    def text(self) -> str:
+        return self._response.text
+
+    def json(self) -> object:
+        if self._json is self._UNPARSED:
+            self._json = serialization.loads(self._response.content)
+        return self._json
+
+
+class PoolStats:
+    """
+    Request counters for a single upstream pool
+    """
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.requests = 0
+        self.errors = 0
+        self.deadline_exceeded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def as_dict(self, client: httpx.AsyncClient | None) -> dict:
+        connections = _pool_connections(client)
+        return {
+            "pool_size": self.pool_size,
+            "requests": self.requests,
+            "errors": self.errors,
+            "deadline_exceeded": self.deadline_exceeded,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "saturation": self.in_flight / self.pool_size if self.pool_size else 0.0,
+            **connections,
+        }
+
+
+def _pool_connections(client: httpx.AsyncClient | None) -> dict:
+    # httpcore does not expose pool stats publicly, so read them defensively.
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {"open_connections": 0, "idle_connections": 0}
+    return {
+        "open_connections": len(connections),
+        "idle_connections": sum(1 for conn in connections if conn.is_idle()),
+    }
+
+
+class ClientRegistry:
+    """
+    One keep-alive httpx.AsyncClient per upstream microservice
+    """
+
+    def __init__(self):
+        self._clients: dict[Upstream, httpx.AsyncClient] = {}
+        self._stats = {upstream: PoolStats(size) for upstream, (size, _) in POOL_SETTINGS.items()}
+        self._breakers = {
+            upstream: CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT_MS) for upstream in Upstream
+        }
+
+    def _create_client(self, upstream: Upstream) -> httpx.AsyncClient:
+        pool_size, timeout = POOL_SETTINGS[upstream]
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY_S,
+            ),
+        )
+
+    async def start(self):
+        for upstream in Upstream:
+            if upstream not in self._clients:
+                self._clients[upstream] = self._create_client(upstream)
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get(self, upstream: Upstream) -> httpx.AsyncClient:
+        # Lazily create the client if the lifespan has not started the registry (e.g. scripts).
+        client = self._clients.get(upstream)
+        if client is None or client.is_closed:
+            client = self._clients[upstream] = self._create_client(upstream)
+        return client
+
+    def _latency(self, upstream: Upstream, method: str) -> Histogram:
+        return metrics.histogram(
+            "gateway_upstream_request_duration_ms", "Upstream microservice request latency in milliseconds",
+            {"upstream": upstream.value, "method": method},
+        )
+
+    def is_open(self, upstream: Upstream) -> bool:
+        return self._breakers[upstream].is_open
+
+    async def request(self, upstream: Upstream, method: str, url: str, **kwargs) -> UpstreamResponse:
+        left = time_left()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(f"deadline passed before {method} {url}")
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), DEADLINE_HEADER: str(int(left * 1000))}
+        breaker = self._breakers[upstream]
+        if not breaker.allow():
+            raise UpstreamUnavailable(upstream.value)
+
+        stats = self._stats[upstream]
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        outcome = "error"
+        t0 = time.perf_counter()
+        try:
+            if left is None:
+                raw = await self.get(upstream).request(method, url, **kwargs)
+            else:
+                # httpx timeouts apply per network operation, the deadline to the whole request
+                raw = await asyncio.wait_for(self.get(upstream).request(method, url, **kwargs), left)
+            response = UpstreamResponse(raw)
+            outcome = f"{response.status_code // 100}xx"
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+        except httpx.HTTPError:
+            stats.errors += 1
+            breaker.record_failure()
+            raise
+        except asyncio.TimeoutError:
+            # the caller's budget ran out, which says nothing about the upstream (its own
+            # timeouts are httpx.TimeoutException, counted above)
+            stats.deadline_exceeded += 1
+            outcome = "deadline"
+            breaker.record_cancelled()
+            raise DeadlineExceeded(f"deadline passed during {method} {url}")
+        except BaseException:
+            breaker.record_cancelled()
+            raise
+        finally:
+            stats.in_flight -= 1
+            self._latency(upstream, method).observe((time.perf_counter() - t0) * 1000)
+            metrics.inc(
+                "gateway_upstream_requests_total", "Upstream microservice requests by outcome",
+                {"upstream": upstream.value, "method": method, "outcome": outcome},
+            )
+
+    async def hedged_request(self, upstream: Upstream, method: str, url: str, **kwargs) -> UpstreamResponse:
+        """
+        Sends a second, identical request if the first has not answered after the upstream's
+        p95 latency (or HEDGE_AFTER_MS when set) and returns whichever answers first.
+        Only for idempotent requests.
+        """
+        latency = self._latency(upstream, method)
+        if HEDGE_AFTER_MS:
+            hedge_after = HEDGE_AFTER_MS / 1000
+        elif latency.count >= _HEDGE_MIN_SAMPLES:
+            hedge_after = latency.quantile(0.95) / 1000
+        else:
+            return await self.request(upstream, method, url, **kwargs)
+
+        stats = self._stats[upstream]
+        first = asyncio.create_task(self.request(upstream, method, url, **kwargs))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and not self.is_open(upstream):
+                stats.hedged += 1
+                tasks.add(asyncio.create_task(self.request(upstream, method, url, **kwargs)))
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None or not pending:
+                    break
+                tasks = pending
+            if winner is None:
+                return done.pop().result()  # every attempt failed, raise the error
+            if winner is not first:
+                stats.hedge_wins += 1
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()    # retrieved, the losing attempt's error is not reported
+
+    def stats(self) -> dict:
+        return {
+            upstream.value: {
+                **self._stats[upstream].as_dict(self._clients.get(upstream)),
+                "breaker": self._breakers[upstream].stats(),
+            }
+            for upstream in Upstream
+        }
+
+
+registry = ClientRegistry()
@@ -0,0 +1,61 @@
+"""
+Compact binary (msgpack) encoding for sensor payloads.
+
+Reading values travel as a raw little-endian buffer plus its dtype and shape instead of
+nested JSON lists:
+
+    {"dtype": "<f4", "shape": [rows, cols], "data": <bin>}
+
+Decoding wraps the received buffer in a NumPy array without copying it.
+"""
+
+import msgpack
+import numpy as np
+
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+MSGPACK_CONTENT_TYPES = {MSGPACK_CONTENT_TYPE, "application/x-msgpack", "application/vnd.msgpack"}
+
+
+def is_msgpack(content_type: str | None) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in MSGPACK_CONTENT_TYPES
+
+
+def packb(obj: object) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpackb(data: bytes) -> object:
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except msgpack.UnpackException as e:
+        raise ValueError(f"invalid msgpack payload: {e}") from e
+
+
+def encode_array(array: np.ndarray) -> dict:
+    array = np.ascontiguousarray(array)
+    if array.dtype.byteorder == ">":
+        array = array.astype(array.dtype.newbyteorder("<"))
+    return {
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        # flattened first: a view with a zero in its shape (e.g. no samples) cannot be cast
+        "data": memoryview(array.reshape(-1)).cast("B"),
+    }
+
+
+def decode_array(encoded: dict) -> np.ndarray:
+    """
+    Raises ValueError for anything but a well-formed {"dtype", "shape", "data"} array.
+    """
+    if not {"dtype", "shape", "data"} <= encoded.keys():
+        raise ValueError("an encoded array needs dtype, shape and data")
+    if not isinstance(encoded["data"], (bytes, bytearray, memoryview)):
+        raise ValueError("the data of an encoded array must be bytes")
+    try:
+        dtype = np.dtype(encoded["dtype"])
+        if dtype.kind != "f":
+            raise ValueError(f"unsupported dtype '{encoded['dtype']}'")
+        array = np.frombuffer(encoded["data"], dtype=dtype)
+        return array.reshape(encoded["shape"])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"invalid encoded array: {e}") from e
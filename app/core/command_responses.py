@@ -0,0 +1,99 @@
+"""
+Futures for GET sensor commands awaiting their response, keyed by command_uuid.
+
+A GET sensor command route called with a wait parks on one future per command_uuid the MQTT
+sensor microservice returned; the response the sensor pushes back (its Metadata.command_uuid)
+resolves it. A response may arrive before the route registers its futures (the sensor can
+answer before the command response is read), so unclaimed responses are kept for a short while.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class CommandResponseTracker:
+    """
+    Registry of asyncio futures for GET sensor commands waiting for their response
+    """
+
+    def __init__(self, unclaimed_ttl_ms: int = 10000, max_unclaimed: int = 1024):
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._unclaimed: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._unclaimed_ttl = unclaimed_ttl_ms / 1000
+        self._max_unclaimed = max_unclaimed
+
+        self.resolved = 0
+        self.unmatched = 0
+        self.timeouts = 0
+
+    def register(self, command_uuid: str) -> asyncio.Future:
+        future = self._waiters.get(command_uuid)
+        if future is None:
+            future = self._waiters[command_uuid] = asyncio.get_running_loop().create_future()
+            unclaimed = self._unclaimed.pop(command_uuid, None)
+            if unclaimed is not None:
+                future.set_result(unclaimed[1])
+        return future
+
+    def is_waiting(self, command_uuid: str) -> bool:
+        future = self._waiters.get(command_uuid)
+        return future is not None and not future.done()
+
+    def discard(self, command_uuid: str):
+        future = self._waiters.pop(command_uuid, None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    def resolve(self, command_uuid: str, response: dict) -> bool:
+        """
+        Resolves the waiter for `command_uuid`. Returns False if nobody was waiting for it.
+        """
+        future = self._waiters.get(command_uuid)
+        if future is None:
+            self.unmatched += 1
+            self._store_unclaimed(command_uuid, response)
+            return False
+        if not future.done():
+            self.resolved += 1
+            future.set_result(response)
+        return True
+
+    async def wait(self, command_uuids: list[str], timeout_s: float) -> tuple[dict[str, dict], list[str]]:
+        """
+        Waits up to `timeout_s` for the responses to `command_uuids`. Returns the responses
+        received by command_uuid and the command_uuids still pending.
+        """
+        futures = {command_uuid: self.register(command_uuid) for command_uuid in command_uuids}
+        try:
+            if futures:
+                await asyncio.wait(futures.values(), timeout=timeout_s)
+            responses = {
+                command_uuid: future.result() for command_uuid, future in futures.items()
+                if future.done() and not future.cancelled()
+            }
+            pending = [command_uuid for command_uuid in command_uuids if command_uuid not in responses]
+            if pending:
+                self.timeouts += 1
+            return responses, pending
+        finally:
+            for command_uuid in futures:
+                self.discard(command_uuid)
+
+    def _store_unclaimed(self, command_uuid: str, response: dict):
+        now = time.monotonic()
+        while self._unclaimed:
+            oldest_uuid, (expiry, _) = next(iter(self._unclaimed.items()))
+            if expiry > now and len(self._unclaimed) < self._max_unclaimed:
+                break
+            del self._unclaimed[oldest_uuid]
+        self._unclaimed[command_uuid] = (now + self._unclaimed_ttl, response)
+
+    def stats(self) -> dict:
+        return {
+            "waiting": len(self._waiters),
+            "unclaimed": len(self._unclaimed),
+            "resolved": self.resolved,
+            "unmatched": self.unmatched,
+            "timeouts": self.timeouts,
+        }
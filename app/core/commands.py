@@ -0,0 +1,126 @@
+"""
+Coalescing of SET commands sent to the MQTT sensor microservice.
+
+SET commands for the same endpoint submitted within a short window are flushed together:
+
+- commands with the same gateway target and property value are merged into one command
+  whose target_sensors lists all of their sensors,
+- a sensor targeted by several commands in the window only keeps the last one; a command
+  left without sensors is dropped and its caller gets the result of the command that
+  superseded it.
+
+Every caller gets the result of the command its sensors were sent with. Windows of the same
+endpoint are sent in submission order so that a later SET never overtakes an earlier one.
+Supersession is only right for SETs of a property whose last value is all that matters; the
+caller must not submit event-like commands (e.g. inf-latency-bench) here.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from pydantic import BaseModel
+
+from app.core.batching import MicroBatcher
+
+R = TypeVar("R")
+
+# Sends one (possibly merged) command to `url`.
+Send = Callable[[str, BaseModel], Awaitable[R]]
+
+
+# Inline payloads (e.g. a base64 model) can be megabytes: they are keyed by identity instead of
+# being serialized for every key, so only commands sharing the very same payload merge.
+LARGE_FIELDS = {"tf_model_b64"}
+
+
+def _merge_key(command: BaseModel) -> str:
+    target = command.target
+    value = command.property_value
+    large = [id(field) for field in (getattr(value, name, None) for name in LARGE_FIELDS) if field is not None]
+    return f"{target.gateway_name}|{target.url}|" + command.model_dump_json(
+        include={"method", "property_name", "property_value"},
+        exclude={"property_value": LARGE_FIELDS} if large else None,
+    ) + "".join(f"|{field_id}" for field_id in large)
+
+
+class CommandDispatcher(Generic[R]):
+    """
+    Per-endpoint micro-batching of SET commands with merging and supersession
+    """
+
+    def __init__(self, send: Send, max_batch_size: int, window_ms: int):
+        self._send = send
+        self._max_batch_size = max_batch_size
+        self._window_ms = window_ms
+        self._batchers: dict[str, MicroBatcher[BaseModel, R]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+        self.submitted = 0
+        self.sent = 0
+        self.superseded = 0
+
+    def _batcher(self, url: str) -> MicroBatcher[BaseModel, R]:
+        batcher = self._batchers.get(url)
+        if batcher is None:
+            async def flush(commands: list[BaseModel]) -> list:
+                return await self._flush(url, commands)
+            batcher = self._batchers[url] = MicroBatcher(flush, self._max_batch_size, self._window_ms)
+            self._locks[url] = asyncio.Lock()
+        return batcher
+
+    async def submit(self, url: str, command: BaseModel) -> R:
+        self.submitted += 1
+        return await self._batcher(url).submit(command)
+
+    async def _flush(self, url: str, commands: list[BaseModel]) -> list:
+        # the last command of the window targeting a sensor wins
+        latest = {}
+        for i, command in enumerate(commands):
+            for sensor_name in command.target.target_sensors:
+                latest[sensor_name] = i
+
+        groups: dict[str, list[int]] = {}     # merge key -> indexes of the merged commands
+        superseded_by: dict[int, int] = {}    # index -> index of the command superseding it
+        sensors: dict[int, list[str]] = {}
+        for i, command in enumerate(commands):
+            targets = command.target.target_sensors
+            kept = [sensor_name for sensor_name in targets if latest[sensor_name] == i]
+            if targets and not kept:
+                superseded_by[i] = latest[targets[-1]]
+                continue
+            sensors[i] = kept
+            groups.setdefault(_merge_key(command), []).append(i)
+
+        merged = []
+        for indexes in groups.values():
+            target_sensors = list(dict.fromkeys(name for i in indexes for name in sensors[i]))
+            first = commands[indexes[0]]
+            merged.append(first.model_copy(update={
+                "target": first.target.model_copy(update={"target_sensors": target_sensors}),
+            }))
+
+        async with self._locks[url]:
+            responses = await asyncio.gather(*[self._send(url, command) for command in merged], return_exceptions=True)
+        self.sent += len(merged)
+        self.superseded += len(superseded_by)
+
+        results: list = [None] * len(commands)
+        for indexes, response in zip(groups.values(), responses):
+            for i in indexes:
+                results[i] = response
+        for i, j in superseded_by.items():
+            results[i] = results[j]
+        return results
+
+    async def aclose(self):
+        for batcher in self._batchers.values():
+            await batcher.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "superseded": self.superseded,
+            "commands_per_send": self.submitted / self.sent if self.sent else 0.0,
+            "endpoints": {url: batcher.stats() for url, batcher in self._batchers.items()},
+        }
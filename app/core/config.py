@@ -19,12 +19,210 @@ MQTT_SENSOR_MICROSERVICE_URL: str = os.environ.get("MQTT_SENSOR_MICROSERVICE_URL
 # --- Cloud API configuration ---
 CLOUD_API_URL: str = os.environ.get("CLOUD_API_URL", "http://192.168.0.196:8000/api/v1")
 
+# Cloud-bound exports are grouped into bulk requests of up to CLOUD_EXPORT_BATCH_SIZE items, waiting
+# at most CLOUD_EXPORT_LINGER_MS for a batch to fill. A path whose /bulk endpoint answered 404/405 is
+# posted item by item, and its /bulk endpoint is tried again after CLOUD_BULK_RETRY_MS.
+CLOUD_EXPORT_BATCHING: bool = bool(int(os.environ.get("CLOUD_EXPORT_BATCHING", "1")))
+CLOUD_EXPORT_BATCH_SIZE: int = int(os.environ.get("CLOUD_EXPORT_BATCH_SIZE", "50"))
+CLOUD_EXPORT_LINGER_MS: int = int(os.environ.get("CLOUD_EXPORT_LINGER_MS", "20"))
+CLOUD_BULK_RETRY_MS: int = int(os.environ.get("CLOUD_BULK_RETRY_MS", "600000"))
+
+# With the spool enabled, cloud-bound payloads are persisted to CLOUD_SPOOL_PATH (SQLite, WAL) and
+# acknowledged immediately; a background drainer forwards them in bulk with exponential backoff.
+# A payload the cloud keeps answering with a retryable status is moved to the spool's dead_letter
+# table after CLOUD_SPOOL_MAX_ATTEMPTS answers, so it no longer holds back the payloads behind it.
+CLOUD_SPOOL_ENABLED: bool = bool(int(os.environ.get("CLOUD_SPOOL_ENABLED", "0")))
+CLOUD_SPOOL_PATH: str = os.environ.get("CLOUD_SPOOL_PATH", "spool/cloud_spool.db")
+CLOUD_SPOOL_MAX_ROWS: int = int(os.environ.get("CLOUD_SPOOL_MAX_ROWS", "1000000"))
+CLOUD_SPOOL_DRAIN_BATCH_SIZE: int = int(os.environ.get("CLOUD_SPOOL_DRAIN_BATCH_SIZE", "200"))
+CLOUD_SPOOL_BACKOFF_MIN_MS: int = int(os.environ.get("CLOUD_SPOOL_BACKOFF_MIN_MS", "500"))
+CLOUD_SPOOL_BACKOFF_MAX_MS: int = int(os.environ.get("CLOUD_SPOOL_BACKOFF_MAX_MS", "30000"))
+CLOUD_SPOOL_MAX_ATTEMPTS: int = int(os.environ.get("CLOUD_SPOOL_MAX_ATTEMPTS", "20"))
+
+# --- Binary payloads ---
+# Forward sensor data to the inference microservice / cloud as msgpack with raw float buffers
+# (see app/core/codec.py) instead of JSON. Both must understand application/msgpack.
+INFERENCE_BINARY_PAYLOADS: bool = bool(int(os.environ.get("INFERENCE_BINARY_PAYLOADS", "0")))
+CLOUD_BINARY_PAYLOADS: bool = bool(int(os.environ.get("CLOUD_BINARY_PAYLOADS", "0")))
+
+# --- Upstream connection pools ---
+# One keep-alive pool per upstream; POOL_SIZE caps concurrent connections, TIMEOUT_S is per request.
+INFERENCE_POOL_SIZE: int = int(os.environ.get("INFERENCE_POOL_SIZE", "100"))
+INFERENCE_TIMEOUT_S: float = float(os.environ.get("INFERENCE_TIMEOUT_S", "30"))
+BLE_PROV_POOL_SIZE: int = int(os.environ.get("BLE_PROV_POOL_SIZE", "4"))
+BLE_PROV_TIMEOUT_S: float = float(os.environ.get("BLE_PROV_TIMEOUT_S", "60"))
+METADATA_POOL_SIZE: int = int(os.environ.get("METADATA_POOL_SIZE", "20"))
+METADATA_TIMEOUT_S: float = float(os.environ.get("METADATA_TIMEOUT_S", "10"))
+MQTT_SENSOR_POOL_SIZE: int = int(os.environ.get("MQTT_SENSOR_POOL_SIZE", "50"))
+MQTT_SENSOR_TIMEOUT_S: float = float(os.environ.get("MQTT_SENSOR_TIMEOUT_S", "10"))
+CLOUD_POOL_SIZE: int = int(os.environ.get("CLOUD_POOL_SIZE", "50"))
+CLOUD_TIMEOUT_S: float = float(os.environ.get("CLOUD_TIMEOUT_S", "30"))
+POOL_KEEPALIVE_EXPIRY_S: float = float(os.environ.get("POOL_KEEPALIVE_EXPIRY_S", "30"))
+
+# --- Upstream resilience ---
+# An upstream's circuit opens after BREAKER_FAILURE_THRESHOLD consecutive failures and is probed again
+# after BREAKER_RESET_TIMEOUT_MS. Sensor data is processed within INGEST_DEADLINE_MS of its arrival
+# (or the X-Request-Deadline-Ms budget of the request). Hedged GETs (HEDGED_REQUESTS) send a second
+# request after HEDGE_AFTER_MS, or after the upstream's p95 latency when 0.
+BREAKER_FAILURE_THRESHOLD: int = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT_MS: int = int(os.environ.get("BREAKER_RESET_TIMEOUT_MS", "5000"))
+INGEST_DEADLINE_MS: int = int(os.environ.get("INGEST_DEADLINE_MS", "10000"))
+HEDGED_REQUESTS: bool = bool(int(os.environ.get("HEDGED_REQUESTS", "0")))
+HEDGE_AFTER_MS: int = int(os.environ.get("HEDGE_AFTER_MS", "0"))
+
+
+# --- Registered sensor cache ---
+# Names known to the metadata microservice are cached for REGISTRY_TTL_MS and refreshed in the
+# background; unknown names are remembered for REGISTRY_NEGATIVE_TTL_MS before asking again.
+REGISTRY_TTL_MS: int = int(os.environ.get("REGISTRY_TTL_MS", "60000"))
+REGISTRY_NEGATIVE_TTL_MS: int = int(os.environ.get("REGISTRY_NEGATIVE_TTL_MS", "5000"))
+
+# --- Metadata writes ---
+# Sensor registration/provisioning writes run with at most METADATA_WRITE_CONCURRENCY requests in flight
+# when the metadata microservice has no bulk endpoint.
+METADATA_WRITE_CONCURRENCY: int = int(os.environ.get("METADATA_WRITE_CONCURRENCY", "16"))
+
+# --- Sensor property cache ---
+# Last known sensor-state/inference-layer/sensor-config of up to PROPERTY_CACHE_MAX_SENSORS sensors,
+# used to answer GET sensor commands sent with a max_age_ms without waking the sensors.
+PROPERTY_CACHE_MAX_SENSORS: int = int(os.environ.get("PROPERTY_CACHE_MAX_SENSORS", "10000"))
+
+# --- GET sensor commands awaiting their response ---
+# GET sensor command routes called with wait_ms hold the request until the sensors respond,
+# for at most COMMAND_WAIT_MAX_MS (a larger wait_ms is rejected).
+COMMAND_WAIT_MAX_MS: int = int(os.environ.get("COMMAND_WAIT_MAX_MS", "30000"))
 
 # --- Inference Approach & Benchmarking ---
 LATENCY_BENCHMARK: bool = bool(int(os.environ.get("LATENCY_BENCHMARK", "1")))
 ADAPTIVE_INFERENCE: bool = bool(int(os.environ.get("ADAPTIVE_INFERENCE", "0")))
 POLLING_INTERVAL_MS: int = int(os.environ.get("POLLING_INTERVAL_MS", "100"))
 
+# --- Model artifacts ---
+# Models uploaded to PUT /api/v1/gateway/models/{sha256} are stored under MODEL_STORE_PATH and
+# streamed downstream as base64 in MODEL_STREAM_CHUNK_BYTES chunks of the raw model.
+MODEL_STORE_PATH: str = os.environ.get("MODEL_STORE_PATH", "models")
+MODEL_MAX_BYTES: int = int(os.environ.get("MODEL_MAX_BYTES", str(64 * 1024 * 1024)))
+MODEL_STREAM_CHUNK_BYTES: int = int(os.environ.get("MODEL_STREAM_CHUNK_BYTES", str(192 * 1024)))
+# A model push accepted by the inference microservice or for a sensor is only queued there, so the
+# same model is skipped as already delivered for MODEL_DELIVERY_TTL_MS at most (force=true to resend).
+MODEL_DELIVERY_TTL_MS: int = int(os.environ.get("MODEL_DELIVERY_TTL_MS", str(60 * 60 * 1000)))
+
+# --- Sensor command coalescing ---
+# SET commands for the same property issued within COMMAND_COALESCE_WINDOW_MS are sent to the MQTT
+# sensor microservice as one command per distinct value (at most COMMAND_COALESCE_BATCH_SIZE per window).
+COMMAND_COALESCING: bool = bool(int(os.environ.get("COMMAND_COALESCING", "1")))
+COMMAND_COALESCE_WINDOW_MS: int = int(os.environ.get("COMMAND_COALESCE_WINDOW_MS", "10"))
+COMMAND_COALESCE_BATCH_SIZE: int = int(os.environ.get("COMMAND_COALESCE_BATCH_SIZE", "256"))
+
+# --- Adaptive inference commands ---
+# A heuristic layer change is commanded once the same result was returned HEURISTIC_HYSTERESIS times
+# in a row, and a sensor gets at most one heuristic command per HEURISTIC_MIN_DWELL_MS.
+HEURISTIC_HYSTERESIS: int = int(os.environ.get("HEURISTIC_HYSTERESIS", "3"))
+HEURISTIC_MIN_DWELL_MS: int = int(os.environ.get("HEURISTIC_MIN_DWELL_MS", "10000"))
+
+# --- Adaptive inference policy ---
+# "heuristic" acts on the heuristic results of the inference microservice; a policy name from
+# app/core/policy.py (e.g. "saturation") decides layers on the gateway instead, every
+# ADAPTIVE_POLICY_INTERVAL_MS, from the last ADAPTIVE_POLICY_WINDOW readings of each sensor.
+ADAPTIVE_POLICY: str = os.environ.get("ADAPTIVE_POLICY", "heuristic")
+ADAPTIVE_POLICY_INTERVAL_MS: int = int(os.environ.get("ADAPTIVE_POLICY_INTERVAL_MS", "1000"))
+ADAPTIVE_POLICY_WINDOW: int = int(os.environ.get("ADAPTIVE_POLICY_WINDOW", "64"))
+ADAPTIVE_POLICY_LOAD_HIGH: float = float(os.environ.get("ADAPTIVE_POLICY_LOAD_HIGH", "64"))
+ADAPTIVE_POLICY_LATENCY_HIGH_MS: float = float(os.environ.get("ADAPTIVE_POLICY_LATENCY_HIGH_MS", "500"))
+ADAPTIVE_POLICY_MIN_CONFIDENCE: float = float(os.environ.get("ADAPTIVE_POLICY_MIN_CONFIDENCE", "0.8"))
+ADAPTIVE_POLICY_STALE_MS: int = int(os.environ.get("ADAPTIVE_POLICY_STALE_MS", "10000"))
+
+# --- Inference latency benchmark export ---
+# "raw" forwards every benchmark to the cloud; "summary" aggregates benchmarks per sensor and
+# inference layer and exports one summary per LATENCY_BENCHMARK_WINDOW_S window (at most
+# LATENCY_BENCHMARK_MAX_SAMPLES samples kept per key) to /export/inference-latency-benchmark/summary.
+# Only switch to "summary" once the cloud serves that endpoint. Only a LATENCY_BENCHMARK_SAMPLE_RATE
+# fraction of gateway inferences request a benchmark from the sensor.
+LATENCY_BENCHMARK_MODE: str = os.environ.get("LATENCY_BENCHMARK_MODE", "raw")
+LATENCY_BENCHMARK_SAMPLE_RATE: float = float(os.environ.get("LATENCY_BENCHMARK_SAMPLE_RATE", "1.0"))
+LATENCY_BENCHMARK_WINDOW_S: float = float(os.environ.get("LATENCY_BENCHMARK_WINDOW_S", "60"))
+LATENCY_BENCHMARK_MAX_SAMPLES: int = int(os.environ.get("LATENCY_BENCHMARK_MAX_SAMPLES", "2048"))
+
+# --- Prediction result delivery ---
+# With push enabled the inference microservice POSTs finished tasks to PREDICTION_CALLBACK_URL;
+# requests fall back to polling when no push arrives within PREDICTION_PUSH_TIMEOUT_MS. Push is
+# off by default: only enable it for an inference microservice that supports it, with a
+# PREDICTION_CALLBACK_URL it can reach (the gateway's own address is not known here).
+PREDICTION_PUSH_ENABLED: bool = bool(int(os.environ.get("PREDICTION_PUSH_ENABLED", "0")))
+PREDICTION_PUSH_TIMEOUT_MS: int = int(os.environ.get("PREDICTION_PUSH_TIMEOUT_MS", "1000"))
+PREDICTION_TIMEOUT_MS: int = int(os.environ.get("PREDICTION_TIMEOUT_MS", "30000"))
+PREDICTION_CALLBACK_URL: str = os.environ.get("PREDICTION_CALLBACK_URL", "")
+
+# --- Gateway inference micro-batching ---
+# GATEWAY-layer readings arriving within INFERENCE_BATCH_WAIT_MS of each other are submitted to the
+# inference microservice as one batched prediction request of up to INFERENCE_BATCH_SIZE readings.
+INFERENCE_BATCHING: bool = bool(int(os.environ.get("INFERENCE_BATCHING", "1")))
+INFERENCE_BATCH_SIZE: int = int(os.environ.get("INFERENCE_BATCH_SIZE", "32"))
+INFERENCE_BATCH_WAIT_MS: int = int(os.environ.get("INFERENCE_BATCH_WAIT_MS", "5"))
+
+# --- Prediction result poller ---
+# A single poller checks all outstanding tasks in batches. The first check of a task happens around
+# the median completion time: starting from POLLING_INTERVAL_MS, the delay is adjusted so that about
+# half the tasks are finished at their first check. Later checks are spaced by the spread of the
+# completion times of tasks seen pending, clamped to [MIN, MAX].
+POLLING_MIN_INTERVAL_MS: int = int(os.environ.get("POLLING_MIN_INTERVAL_MS", "10"))
+POLLING_MAX_INTERVAL_MS: int = int(os.environ.get("POLLING_MAX_INTERVAL_MS", "1000"))
+PREDICTION_POLL_BATCH_SIZE: int = int(os.environ.get("PREDICTION_POLL_BATCH_SIZE", "100"))
+PREDICTION_POLL_CONCURRENCY: int = int(os.environ.get("PREDICTION_POLL_CONCURRENCY", "8"))
+
+# --- Ingest pipeline ---
+# "sync" processes /export/sensor-data before responding; "async" validates, enqueues and answers
+# 202, leaving the pipeline to INGEST_WORKERS workers. A full queue answers INGEST_BACKPRESSURE_STATUS.
+INGEST_MODE: str = os.environ.get("INGEST_MODE", "sync")
+INGEST_QUEUE_SIZE: int = int(os.environ.get("INGEST_QUEUE_SIZE", "1000"))
+INGEST_WORKERS: int = int(os.environ.get("INGEST_WORKERS", "16"))
+INGEST_BACKPRESSURE_STATUS: int = int(os.environ.get("INGEST_BACKPRESSURE_STATUS", "503"))
+
+# --- Ingest admission control ---
+# Each sensor may send INGEST_SENSOR_RATE readings/s (bursts of INGEST_SENSOR_BURST) and readings are
+# only accepted while fewer than INGEST_MAX_LOAD are queued or in progress (on the whole gateway: each of
+# the GATEWAY_WORKERS workers admits INGEST_MAX_LOAD / GATEWAY_WORKERS). Readings over a limit are
+# shed according to INGEST_SHED_POLICY: "reject" (429), "drop" (202, discarded) or "cloud" (cloud-layer
+# readings are exported as usual and gateway-layer ones for cloud-side inference, sensor-layer readings
+# are dropped). Off by default.
+INGEST_ADMISSION: bool = bool(int(os.environ.get("INGEST_ADMISSION", "0")))
+INGEST_SENSOR_RATE: float = float(os.environ.get("INGEST_SENSOR_RATE", "20"))
+INGEST_SENSOR_BURST: float = float(os.environ.get("INGEST_SENSOR_BURST", "40"))
+INGEST_MAX_LOAD: int = int(os.environ.get("INGEST_MAX_LOAD", "512"))
+INGEST_SHED_POLICY: str = os.environ.get("INGEST_SHED_POLICY", "reject")
+
+# --- Reading store ---
+# With READING_STORE_ENABLED the gateway keeps the last READING_STORE_CAPACITY samples (up to
+# READING_STORE_CHANNELS values each) of up to READING_STORE_MAX_SENSORS sensors in ring buffers,
+# queried at /api/v1/gateway/readings. The buffers are memory-mapped files in the READING_STORE_PATH
+# directory when it is set, so they survive restarts, and anonymous memory otherwise.
+READING_STORE_ENABLED: bool = bool(int(os.environ.get("READING_STORE_ENABLED", "0")))
+READING_STORE_MAX_SENSORS: int = int(os.environ.get("READING_STORE_MAX_SENSORS", "256"))
+READING_STORE_CAPACITY: int = int(os.environ.get("READING_STORE_CAPACITY", "4096"))
+READING_STORE_CHANNELS: int = int(os.environ.get("READING_STORE_CHANNELS", "8"))
+READING_STORE_PATH: str = os.environ.get("READING_STORE_PATH", "")
+
+# --- Traffic capture ---
+# With TRACE_ENABLED every request to the callback and command routes is appended to the gzip trace
+# TRACE_PATH for replay (benchmarks/replay.py). Requests are dropped when more than TRACE_QUEUE_SIZE
+# wait to be written, and recording stops once the file reaches TRACE_MAX_BYTES.
+TRACE_ENABLED: bool = bool(int(os.environ.get("TRACE_ENABLED", "0")))
+TRACE_PATH: str = os.environ.get("TRACE_PATH", "traces/gateway.trace.gz")
+TRACE_MAX_BYTES: int = int(os.environ.get("TRACE_MAX_BYTES", str(256 * 1024 * 1024)))
+TRACE_QUEUE_SIZE: int = int(os.environ.get("TRACE_QUEUE_SIZE", "10000"))
+
+# --- Multi-worker mode ---
+# With GATEWAY_WORKERS > 1, `python -m app.front` serves GATEWAY_API_PORT with a front router that runs
+# GATEWAY_WORKERS gateway processes on 127.0.0.1:GATEWAY_WORKER_BASE_PORT + i and sends all readings of
+# a sensor to the same worker. Workers share the registered sensor set and cache invalidations through
+# the SQLite database GATEWAY_STATE_PATH, polled every GATEWAY_STATE_POLL_MS. GATEWAY_WORKER_INDEX is
+# set by the front router for each worker (-1 in single-process mode).
+GATEWAY_WORKERS: int = int(os.environ.get("GATEWAY_WORKERS", "1"))
+GATEWAY_WORKER_BASE_PORT: int = int(os.environ.get("GATEWAY_WORKER_BASE_PORT", "9100"))
+GATEWAY_WORKER_INDEX: int = int(os.environ.get("GATEWAY_WORKER_INDEX", "-1"))
+GATEWAY_STATE_PATH: str = os.environ.get("GATEWAY_STATE_PATH", "state/gateway_state.db")
+GATEWAY_STATE_POLL_MS: int = int(os.environ.get("GATEWAY_STATE_POLL_MS", "100"))
+
 # --- Inference Layer Constants ---
 CLOUD_INFERENCE_LAYER = 2
 GATEWAY_INFERENCE_LAYER = 1
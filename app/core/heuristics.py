@@ -0,0 +1,144 @@
+"""
+Per-sensor state for the adaptive inference heuristic.
+
+The inference microservice returns a heuristic result with every gateway prediction. Acting
+on each of them would send one MQTT command per reading and let a sensor flap between
+layers, so the tracker remembers what it last commanded to each sensor and only sends a
+command on a real transition:
+
+- a result must repeat `hysteresis` times in a row before it is acted on,
+- a sensor gets at most one command per `min_dwell_ms`; repeating the same command after
+  the dwell time is allowed, since the sensor evidently still runs on the gateway,
+- concurrent results for a sensor with a command in flight join that command; other
+  results are dropped until it completes.
+
+Results listed in `immediate` (e.g. the error code) skip hysteresis and dwell time, and are
+queued behind a different command in flight instead of being dropped.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable
+
+from app.core.metrics import metrics
+
+# Sends the command for heuristic result `result` to sensor `sensor_name`; raises on failure.
+Send = Callable[[str, int], Awaitable[None]]
+
+
+class _SensorState:
+    __slots__ = ("commanded", "commanded_at", "candidate", "streak", "in_flight", "in_flight_result")
+
+    def __init__(self):
+        self.commanded: int | None = None
+        self.commanded_at = 0.0
+        self.candidate: int | None = None
+        self.streak = 0
+        self.in_flight: asyncio.Task | None = None
+        self.in_flight_result: int | None = None
+
+
+class HeuristicStateTracker:
+    """
+    Turns per-prediction heuristic results into commands on real state transitions
+    """
+
+    def __init__(
+        self,
+        send: Send,
+        stay: int,
+        immediate: Iterable[int] = (),
+        hysteresis: int = 1,
+        min_dwell_ms: int = 0,
+    ):
+        self._send = send
+        self._stay = stay
+        self._immediate = frozenset(immediate)
+        self._hysteresis = max(1, hysteresis)
+        self._min_dwell = min_dwell_ms / 1000
+        self._states: dict[str, _SensorState] = {}
+
+        self.sent = 0
+        self.failed = 0
+        self.suppressed: dict[str, int] = {"redundant": 0, "hysteresis": 0, "dwell": 0, "coalesced": 0, "in_flight": 0}
+
+    def _suppress(self, reason: str):
+        self.suppressed[reason] += 1
+        metrics.inc("gateway_heuristic_commands_total", "Adaptive inference heuristic commands", {"outcome": reason})
+
+    async def handle(self, sensor_name: str, result: int) -> bool:
+        """
+        Records `result` for `sensor_name` and sends the matching command if it is a transition.
+        Returns whether this call sent a command.
+        """
+        state = self._states.get(sensor_name)
+        if state is None:
+            state = self._states[sensor_name] = _SensorState()
+
+        if result == self._stay:
+            state.candidate, state.streak = None, 0
+            return False
+        if result != state.candidate:
+            state.candidate, state.streak = result, 0
+        state.streak += 1
+
+        immediate = result in self._immediate
+        while state.in_flight is not None and not state.in_flight.done():
+            if state.in_flight_result == result:
+                self._suppress("coalesced")
+                await asyncio.shield(state.in_flight)
+                return False
+            if not immediate:
+                self._suppress("in_flight")
+                return False
+            # queued: sent once the command in flight completes, whatever its outcome
+            await asyncio.wait({state.in_flight})
+
+        within_dwell = time.monotonic() - state.commanded_at < self._min_dwell
+        if state.commanded == result and within_dwell:
+            self._suppress("redundant")
+            return False
+        if state.streak < self._hysteresis and not immediate:
+            self._suppress("hysteresis")
+            return False
+        if within_dwell and not immediate:
+            self._suppress("dwell")
+            return False
+
+        previous = state.commanded, state.commanded_at
+        state.commanded, state.commanded_at = result, time.monotonic()
+        task = asyncio.create_task(self._send(sensor_name, result))
+        state.in_flight, state.in_flight_result = task, result
+        try:
+            await task
+        except BaseException:
+            if state.in_flight is task:     # not superseded by a queued command
+                state.commanded, state.commanded_at = previous
+            self.failed += 1
+            metrics.inc("gateway_heuristic_commands_total", "Adaptive inference heuristic commands", {"outcome": "failed"})
+            raise
+        finally:
+            if state.in_flight is task:
+                state.in_flight, state.in_flight_result = None, None
+        state.candidate, state.streak = None, 0
+        self.sent += 1
+        metrics.inc("gateway_heuristic_commands_total", "Adaptive inference heuristic commands", {"outcome": "sent"})
+        return True
+
+    def forget(self, sensor_names: Iterable[str]):
+        """
+        Drops the remembered state of `sensor_names`, e.g. after a command sent by the cloud.
+        """
+        for sensor_name in sensor_names:
+            self._states.pop(sensor_name, None)
+
+    def stats(self) -> dict:
+        return {
+            "sensors": len(self._states),
+            "hysteresis": self._hysteresis,
+            "min_dwell_ms": self._min_dwell * 1000,
+            "sent": self.sent,
+            "failed": self.failed,
+            "suppressed": sum(self.suppressed.values()),
+            "suppressed_by_reason": dict(self.suppressed),
+        }
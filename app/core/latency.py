@@ -0,0 +1,147 @@
+"""
+Windowed aggregation of inference latency benchmarks.
+
+Instead of forwarding every benchmark to the cloud, samples are collected per
+(sensor, inference layer) in fixed-size NumPy arrays and exported as one summary per key
+every window (count, min/max/mean, p50/p90/p99 and a bucket histogram). Each array is a
+reservoir sample once it is full, so memory stays bounded while count, min, max and mean
+remain exact over the whole window.
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from app.core.metrics import LATENCY_BUCKETS_MS
+
+Key = tuple[str, int]  # (sensor name, inference layer)
+
+
+class LatencySamples:
+    """
+    Reservoir of latency samples for one (sensor, inference layer) key
+    """
+
+    __slots__ = ("values", "count", "min", "max", "sum")
+
+    def __init__(self, capacity: int):
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.count = 0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.sum = 0.0
+
+    def add(self, value: float):
+        capacity = len(self.values)
+        if self.count < capacity:
+            self.values[self.count] = value
+        else:
+            slot = random.randrange(self.count + 1)
+            if slot < capacity:
+                self.values[slot] = value
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def summary(self) -> dict:
+        sampled = self.values[:min(self.count, len(self.values))]
+        p50, p90, p99 = np.percentile(sampled, (50, 90, 99))
+        counts = np.bincount(np.searchsorted(LATENCY_BUCKETS_MS, sampled, side="left"), minlength=len(LATENCY_BUCKETS_MS) + 1)
+        return {
+            "count": self.count,
+            "sampled": len(sampled),
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count,
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "histogram_bounds": list(LATENCY_BUCKETS_MS),
+            "histogram_counts": counts.tolist(),    # last bucket is +Inf
+        }
+
+
+# Exports the summaries of one window: (window_start_ms, window_end_ms, {key: summary}).
+Export = Callable[[int, int, dict[Key, dict]], Awaitable[None]]
+
+
+class LatencyAggregator:
+    """
+    Collects latency benchmarks and exports per-key summaries every window_s seconds
+    """
+
+    def __init__(self, export: Export, window_s: float, max_samples: int):
+        self._export = export
+        self._window = window_s
+        self._max_samples = max_samples
+        self._samples: dict[Key, LatencySamples] = {}
+        self._window_start = time.time()
+        self._task: asyncio.Task | None = None
+
+        self.recorded = 0
+        self.windows_exported = 0
+        self.summaries_exported = 0
+        self.export_errors = 0
+
+    def record(self, sensor_name: str, inference_layer: int, latency_ms: float):
+        key = (sensor_name, int(inference_layer))
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = LatencySamples(self._max_samples)
+        samples.add(latency_ms)
+        self.recorded += 1
+
+    async def flush(self):
+        """
+        Closes the current window and exports its summaries.
+        """
+        samples, self._samples = self._samples, {}
+        window_start, self._window_start = self._window_start, time.time()
+        if not samples:
+            return
+        summaries = {key: key_samples.summary() for key, key_samples in samples.items()}
+        try:
+            await self._export(int(window_start * 1000), int(self._window_start * 1000), summaries)
+            self.windows_exported += 1
+            self.summaries_exported += len(summaries)
+        except Exception as e:
+            self.export_errors += 1
+            print(f"Latency benchmark summary export failed: {e!r}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self._window)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._window_start = time.time()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "window_s": self._window,
+            "max_samples": self._max_samples,
+            "keys": len(self._samples),
+            "pending_samples": sum(samples.count for samples in self._samples.values()),
+            "recorded": self.recorded,
+            "windows_exported": self.windows_exported,
+            "summaries_exported": self.summaries_exported,
+            "export_errors": self.export_errors,
+        }
@@ -0,0 +1,193 @@
+"""
+In-process metrics served in the Prometheus text exposition format.
+
+Histograms use a fixed set of log-spaced buckets so that observing a value is a bisect and
+an increment; everything runs on the event loop thread, so no locking is needed.
+"""
+
+import bisect
+from typing import Callable, Iterable
+
+# Upper bounds (ms) of the latency buckets, roughly 1-2.5-5 per decade from 0.1 ms to 60 s.
+LATENCY_BUCKETS_MS: tuple[float, ...] = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, str] | None) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    Named, labelled counters and histograms plus collectors for gauges computed on scrape
+    """
+
+    def __init__(self):
+        self._help: dict[str, tuple[str, str]] = {}     # name -> (type, help)
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._collectors: list[tuple[str, Callable[[], Iterable[tuple[str, str, dict[str, str], float]]]]] = []
+
+    def _describe(self, name: str, kind: str, help: str):
+        if name not in self._help:
+            self._help[name] = (kind, help)
+
+    def histogram(self, name: str, help: str = "", labels: dict[str, str] | None = None) -> Histogram:
+        series = self._histograms.get(name)
+        if series is None:
+            self._describe(name, "histogram", help)
+            series = self._histograms[name] = {}
+        key = _labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        return histogram
+
+    def inc(self, name: str, help: str = "", labels: dict[str, str] | None = None, value: float = 1):
+        series = self._counters.get(name)
+        if series is None:
+            self._describe(name, "counter", help)
+            series = self._counters[name] = {}
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def register_collector(
+        self, collector: Callable[[], Iterable[tuple[str, str, dict[str, str], float]]], kind: str = "gauge",
+    ):
+        """
+        `collector` yields (name, help, labels, value) samples when /metrics is scraped. With
+        kind="counter" the samples are totals kept elsewhere (e.g. in a component's stats) and
+        their names end in _total.
+        """
+        self._collectors.append((kind, collector))
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self._counters.items():
+            _, help = self._help[name]
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in series.items()]
+
+        for name, series in self._histograms.items():
+            _, help = self._help[name]
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        collected: dict[str, tuple[str, str, list[str]]] = {}
+        for kind, collector in self._collectors:
+            for name, help, labels, value in collector():
+                collected.setdefault(name, (kind, help, []))[2].append(
+                    f"{name}{_format_labels(_labels(labels))} {_format_value(value)}"
+                )
+        for name, (kind, help, samples) in collected.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", *samples]
+
+        return "\n".join(lines) + "\n"
+
+
+def merge_expositions(expositions: list[str]) -> str:
+    """
+    Merges the expositions of several worker processes into one: counter and histogram samples
+    of the same series are summed, gauge samples get a `worker` label (the exposition's index).
+    """
+    headers: dict[str, list[str]] = {}              # family -> HELP/TYPE lines
+    samples: dict[str, dict[str, float]] = {}       # family -> series -> value
+    types: dict[str, str] = {}
+    for worker, exposition in enumerate(expositions):
+        family = None
+        for line in exposition.splitlines():
+            if not line:
+                continue
+            if line.startswith("# "):
+                _, kind, family, *rest = line.split(" ", 3)
+                if kind == "TYPE":
+                    types[family] = rest[0] if rest else ""
+                if line not in headers.setdefault(family, []):
+                    headers[family].append(line)
+                samples.setdefault(family, {})
+                continue
+            series, value = line.rsplit(" ", 1)
+            if types.get(family) == "gauge":
+                label = f'worker="{worker}"'
+                series = f"{series[:-1]},{label}}}" if series.endswith("}") else f"{series}{{{label}}}"
+            family_samples = samples.setdefault(family, {})
+            family_samples[series] = family_samples.get(series, 0) + float(value)
+
+    lines = []
+    for family, family_headers in headers.items():
+        lines += family_headers
+        lines += [f"{series} {_format_value(value)}" for series, value in samples[family].items()]
+    return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,125 @@
+"""
+Building blocks for the ingest pipeline: per-stage latency histograms and a bounded
+asyncio work queue drained by a fixed pool of workers.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from app.core.metrics import Histogram, metrics
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """
+    Records the latency of named pipeline stages into `gateway_stage_duration_ms` histograms
+    """
+
+    def __init__(self):
+        self._stages: dict[str, Histogram] = {}
+
+    def _histogram(self, name: str) -> Histogram:
+        histogram = self._stages.get(name)
+        if histogram is None:
+            histogram = self._stages[name] = metrics.histogram(
+                "gateway_stage_duration_ms", "Latency of ingest pipeline stages in milliseconds", {"stage": name}
+            )
+        return histogram
+
+    def record(self, name: str, elapsed_ms: float, error: bool = False):
+        self._histogram(name).observe(elapsed_ms)
+        if error:
+            metrics.inc("gateway_stage_errors_total", "Ingest pipeline stages that raised", {"stage": name})
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, (time.perf_counter() - t0) * 1000, error)
+
+    def stats(self) -> dict:
+        return {name: histogram.summary() for name, histogram in self._stages.items()}
+
+
+class WorkQueue(Generic[T]):
+    """
+    Bounded asyncio queue processed by a fixed number of worker tasks
+    """
+
+    def __init__(self, handler: Callable[[T], Awaitable[None]], maxsize: int, workers: int):
+        self._handler = handler
+        self._queue: asyncio.Queue[tuple[float, T]] = asyncio.Queue(maxsize=maxsize)
+        self._workers = workers
+        self._tasks: list[asyncio.Task] = []
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    def put_nowait(self, item: T) -> bool:
+        """
+        Enqueues `item`. Returns False if the queue is full.
+        """
+        try:
+            self._queue.put_nowait((time.perf_counter(), item))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    async def _worker(self, timer: StageTimer | None):
+        while True:
+            enqueued_at, item = await self._queue.get()
+            if timer is not None:
+                timer.record("queue", (time.perf_counter() - enqueued_at) * 1000)
+            try:
+                await self._handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"Ingest worker failed: {e!r}")
+            finally:
+                self._queue.task_done()
+
+    def start(self, timer: StageTimer | None = None):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(timer)) for _ in range(self._workers)]
+
+    async def stop(self, drain: bool = True):
+        if drain and self._tasks:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "capacity": self._queue.maxsize,
+            "max_depth": self.max_depth,
+            "workers": len(self._tasks),
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
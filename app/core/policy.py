@@ -0,0 +1,247 @@
+"""
+Gateway-side adaptive inference policies.
+
+For every gateway inference the pipeline records the gateway load (readings queued or in
+progress), the inference latency, the sensor's battery flag and the prediction confidence
+into per-sensor ring buffers. On a timer the PolicyEngine hands all windows to a Policy,
+which computes a target inference layer for every sensor in one vectorized pass; targets
+other than the gateway layer are dispatched like heuristic results from the inference
+microservice (through app/core/heuristics.py, so hysteresis and dwell time still apply).
+"""
+
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from app.core.config import CLOUD_INFERENCE_LAYER, GATEWAY_INFERENCE_LAYER, SENSOR_INFERENCE_LAYER
+
+
+class SensorWindows:
+    """
+    Rolling windows of the last `window` observations per sensor, one row per sensor
+    """
+
+    SIGNALS = ("time", "load", "latency", "low_battery", "confidence")
+
+    def __init__(self, window: int, capacity: int = 64):
+        self.window = window
+        self.names: list[str] = []
+        self._rows: dict[str, int] = {}
+        self.positions = np.zeros(capacity, dtype=np.int64)
+        self.last_seen = np.full(capacity, -np.inf)
+        for signal in self.SIGNALS:
+            setattr(self, signal, np.full((capacity, window), np.nan))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _grow(self):
+        capacity = len(self.positions) * 2
+        self.positions = np.resize(self.positions, capacity)
+        self.last_seen = np.concatenate([self.last_seen, np.full(capacity - len(self.last_seen), -np.inf)])
+        for signal in self.SIGNALS:
+            values = getattr(self, signal)
+            setattr(self, signal, np.concatenate([values, np.full_like(values, np.nan)]))
+
+    def _row(self, sensor_name: str) -> int:
+        row = self._rows.get(sensor_name)
+        if row is None:
+            if len(self.names) == len(self.positions):
+                self._grow()
+            row = self._rows[sensor_name] = len(self.names)
+            self.names.append(sensor_name)
+            self.positions[row] = 0
+        return row
+
+    def observe(self, sensor_name: str, load: float, latency_ms: float, low_battery: bool, confidence: float | None):
+        row = self._row(sensor_name)
+        column = self.positions[row] % self.window
+        now = time.monotonic()
+        self.time[row, column] = now
+        self.load[row, column] = load
+        self.latency[row, column] = latency_ms
+        self.low_battery[row, column] = float(low_battery)
+        self.confidence[row, column] = np.nan if confidence is None else confidence
+        self.positions[row] += 1
+        self.last_seen[row] = now
+
+    def reset(self, sensor_name: str):
+        row = self._rows.get(sensor_name)
+        if row is not None:
+            for signal in self.SIGNALS:
+                getattr(self, signal)[row] = np.nan
+            self.last_seen[row] = -np.inf
+
+
+def _row_nanmean(values: np.ndarray) -> np.ndarray:
+    # np.nanmean warns on all-NaN rows; rows without samples are NaN here as well.
+    counts = np.sum(~np.isnan(values), axis=1)
+    sums = np.nansum(values, axis=1)
+    return np.divide(sums, counts, out=np.full(len(values), np.nan), where=counts > 0)
+
+
+class Policy(ABC):
+    """
+    Computes a target inference layer for every sensor row of a SensorWindows
+    """
+
+    @abstractmethod
+    def decide(self, windows: SensorWindows, now: float) -> np.ndarray:
+        """
+        Returns the target inference layer of every row of `windows` at monotonic time `now`.
+        """
+
+    def stats(self) -> dict:
+        return {}
+
+
+class SaturationPolicy(Policy):
+    """
+    Keeps sensors on the gateway until it saturates, then offloads the busiest sensors.
+
+    The gateway is saturated when the mean load over the active sensors' windows exceeds
+    `load_high` or their p90 inference latency exceeds `latency_high_ms`. The overload
+    factor decides how many active sensors are offloaded (highest reading rate first);
+    a sensor goes to the SENSOR layer unless its battery is low or its predictions are not
+    confident enough, in which case it goes to the CLOUD layer.
+    """
+
+    def __init__(self, load_high: float, latency_high_ms: float, min_confidence: float, stale_ms: float):
+        self.load_high = load_high
+        self.latency_high_ms = latency_high_ms
+        self.min_confidence = min_confidence
+        self.stale = stale_ms / 1000
+        self.last_load = 0.0
+        self.last_offloaded = 0
+
+    def decide(self, windows: SensorWindows, now: float) -> np.ndarray:
+        n = len(windows)
+        targets = np.full(n, GATEWAY_INFERENCE_LAYER)
+        active = now - windows.last_seen[:n] < self.stale
+        if not active.any():
+            self.last_load, self.last_offloaded = 0.0, 0
+            return targets
+
+        load = _row_nanmean(windows.load[:n])
+        latency = _row_nanmean(windows.latency[:n])
+        low_battery = _row_nanmean(windows.low_battery[:n]) >= 0.5
+        confidence = _row_nanmean(windows.confidence[:n])
+        rate = np.sum(windows.time[:n] >= now - self.stale, axis=1)
+
+        active_latency = latency[active & ~np.isnan(latency)]
+        latency_p90 = np.percentile(active_latency, 90) if len(active_latency) else 0.0
+        overload = max(np.nanmean(load[active]) / self.load_high, latency_p90 / self.latency_high_ms)
+        self.last_load = float(overload)
+        if not overload > 1:
+            self.last_offloaded = 0
+            return targets
+
+        candidates = np.flatnonzero(active)
+        offload_count = math.ceil(len(candidates) * (1 - 1 / overload))
+        # busiest first, ties broken by the highest latency
+        order = np.lexsort((-np.nan_to_num(latency[candidates]), -rate[candidates]))
+        offloaded = candidates[order[:offload_count]]
+        sensor_capable = ~low_battery[offloaded] & ~(confidence[offloaded] < self.min_confidence)
+        targets[offloaded] = np.where(sensor_capable, SENSOR_INFERENCE_LAYER, CLOUD_INFERENCE_LAYER)
+        self.last_offloaded = len(offloaded)
+        return targets
+
+    def stats(self) -> dict:
+        return {
+            "load_high": self.load_high,
+            "latency_high_ms": self.latency_high_ms,
+            "min_confidence": self.min_confidence,
+            "last_overload": self.last_load,
+            "last_offloaded": self.last_offloaded,
+        }
+
+
+POLICIES: dict[str, type[Policy]] = {
+    "saturation": SaturationPolicy,
+}
+
+# Applies target layer `target` to sensor `sensor_name`; also called with the gateway layer for
+# the sensors an evaluation keeps there, which must not send anything.
+Dispatch = Callable[[str, int], Awaitable[object]]
+
+
+class PolicyEngine:
+    """
+    Evaluates a Policy over all sensor windows every `interval_ms` and dispatches the targets
+    """
+
+    def __init__(self, policy: Policy, dispatch: Dispatch, window: int, interval_ms: int):
+        self.policy = policy
+        self.windows = SensorWindows(window)
+        self._dispatch = dispatch
+        self._interval = interval_ms / 1000
+        self._task: asyncio.Task | None = None
+
+        self.evaluations = 0
+        self.dispatched = 0
+        self.dispatch_errors = 0
+
+    def observe(self, sensor_name: str, load: float, latency_ms: float, low_battery: bool, confidence: float | None):
+        self.windows.observe(sensor_name, load, latency_ms, low_battery, confidence)
+
+    async def evaluate(self):
+        targets = self.policy.decide(self.windows, time.monotonic())
+        self.evaluations += 1
+        # keeping a sensor on the gateway breaks its streak of offload targets (the heuristic
+        # tracker's hysteresis counts consecutive evaluations)
+        for row in np.flatnonzero(targets == GATEWAY_INFERENCE_LAYER):
+            await self._dispatch(self.windows.names[row], GATEWAY_INFERENCE_LAYER)
+        offloaded = [
+            (self.windows.names[row], int(targets[row]))
+            for row in np.flatnonzero(targets != GATEWAY_INFERENCE_LAYER)
+        ]
+        if not offloaded:
+            return
+        results = await asyncio.gather(
+            *[self._dispatch(sensor_name, target) for sensor_name, target in offloaded], return_exceptions=True
+        )
+        for (sensor_name, _), result in zip(offloaded, results):
+            if isinstance(result, Exception):
+                self.dispatch_errors += 1
+                print(f"Adaptive policy command for {sensor_name} failed: {result!r}")
+            elif result:
+                self.dispatched += 1
+                # the sensor leaves the gateway, its window no longer describes it
+                self.windows.reset(sensor_name)
+
+    async def _evaluate_loop(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.evaluate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Adaptive policy evaluation failed: {e!r}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._evaluate_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "policy": type(self.policy).__name__,
+            "sensors": len(self.windows),
+            "evaluations": self.evaluations,
+            "dispatched": self.dispatched,
+            "dispatch_errors": self.dispatch_errors,
+            **self.policy.stats(),
+        }
@@ -0,0 +1,309 @@
+"""
+Futures for in-flight prediction tasks, keyed by the inference microservice task_id.
+
+Requests waiting for a gateway-layer prediction park on a future which is resolved as soon
+as the finished task is pushed to the gateway or found by the shared PredictionPoller. A push
+may arrive before the waiter registers (the inference microservice can finish before its
+submit response is read), so unclaimed results are kept for a short while.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable
+
+
+class PredictionTracker:
+    """
+    Registry of asyncio futures for pending prediction tasks
+    """
+
+    def __init__(self, unclaimed_ttl_ms: int = 10000, max_unclaimed: int = 1024, push_miss_limit: int = 3):
+        self._waiters: dict[str, asyncio.Future] = {}
+        self._refs: dict[str, int] = {}     # waiters per task_id (a batched task has several)
+        self._submitted_at: dict[str, float] = {}
+        self._unclaimed: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._unclaimed_ttl = unclaimed_ttl_ms / 1000
+        self._max_unclaimed = max_unclaimed
+        self._push_miss_limit = push_miss_limit
+        self._push_misses = 0
+
+        # seconds from register() to (estimated) completion of recently finished tasks
+        self.completion_times: deque[float] = deque(maxlen=512)
+
+        self.pushed = 0
+        self.polled = 0
+        self.push_timeouts = 0
+
+    @property
+    def push_available(self) -> bool:
+        # After a few tasks that finished without being pushed, stop waiting for pushes;
+        # the next push that does arrive turns waiting back on.
+        return self._push_misses < self._push_miss_limit
+
+    def register(self, task_id: str) -> asyncio.Future:
+        self._refs[task_id] = self._refs.get(task_id, 0) + 1
+        future = self._waiters.get(task_id)
+        if future is None:
+            future = self._waiters[task_id] = asyncio.get_running_loop().create_future()
+            self._submitted_at[task_id] = time.monotonic()
+            unclaimed = self._unclaimed.pop(task_id, None)
+            if unclaimed is not None:
+                future.set_result(unclaimed[1])
+        return future
+
+    def is_waiting(self, task_id: str) -> bool:
+        future = self._waiters.get(task_id)
+        return future is not None and not future.done()
+
+    def discard(self, task_id: str) -> bool:
+        """
+        Releases one waiter of `task_id`. Returns True once the last waiter is gone.
+        """
+        refs = self._refs.get(task_id, 0) - 1
+        if refs > 0:
+            self._refs[task_id] = refs
+            return False
+        self._refs.pop(task_id, None)
+        self._submitted_at.pop(task_id, None)
+        future = self._waiters.pop(task_id, None)
+        if future is not None and not future.done():
+            future.cancel()
+        return True
+
+    def submitted_at(self, task_id: str) -> float | None:
+        return self._submitted_at.get(task_id)
+
+    def resolve(
+        self, task_id: str, task: dict, pushed: bool = False, completed_at: float | None = None, record: bool = True,
+    ) -> bool:
+        """
+        Resolves the waiter for `task_id`. Returns False if nobody was waiting for it.
+        `completed_at` is the estimated completion time when the result was found by polling;
+        without `record` the completion time is unknown and not sampled.
+        """
+        if pushed:
+            self.pushed += 1
+            self._push_misses = 0
+        else:
+            self.polled += 1
+
+        future = self._waiters.get(task_id)
+        if future is None:
+            self._store_unclaimed(task_id, task)
+            return False
+        if not future.done():
+            submitted_at = self._submitted_at.get(task_id)
+            if submitted_at is not None and record:
+                self.completion_times.append((completed_at or time.monotonic()) - submitted_at)
+            future.set_result(task)
+        return True
+
+    def fail(self, task_id: str, exc: Exception):
+        future = self._waiters.get(task_id)
+        if future is not None and not future.done():
+            future.set_exception(exc)
+
+    def record_push_miss(self):
+        self.push_timeouts += 1
+        self._push_misses += 1
+
+    def completion_quantiles(self, *quantiles: float) -> list[float] | None:
+        if len(self.completion_times) < 8:
+            return None
+        samples = sorted(self.completion_times)
+        return [samples[min(len(samples) - 1, int(q * len(samples)))] for q in quantiles]
+
+    def _store_unclaimed(self, task_id: str, task: dict):
+        now = time.monotonic()
+        while self._unclaimed:
+            oldest_id, (expiry, _) = next(iter(self._unclaimed.items()))
+            if expiry > now and len(self._unclaimed) < self._max_unclaimed:
+                break
+            del self._unclaimed[oldest_id]
+        self._unclaimed[task_id] = (now + self._unclaimed_ttl, task)
+
+    def stats(self) -> dict:
+        quantiles = self.completion_quantiles(0.5, 0.9, 0.99)
+        return {
+            "waiting": len(self._waiters),
+            "unclaimed": len(self._unclaimed),
+            "pushed": self.pushed,
+            "polled": self.polled,
+            "push_timeouts": self.push_timeouts,
+            "push_available": self.push_available,
+            "completion_ms": dict(zip(("p50", "p90", "p99"), (q * 1000 for q in quantiles))) if quantiles else None,
+        }
+
+
+# Fetches the status of several tasks: returns task_id -> finished task dict, None while pending,
+# or an Exception if that task could not be queried.
+FetchResults = Callable[[list[str]], Awaitable[dict[str, dict | None | Exception]]]
+
+
+class PredictionPoller:
+    """
+    Single background poller for every outstanding prediction task
+    """
+
+    # largest relative change of the first poll delay per poll
+    FIRST_DELAY_STEP = 0.1
+
+    def __init__(
+        self,
+        tracker: PredictionTracker,
+        fetch: FetchResults,
+        default_interval_ms: int,
+        min_interval_ms: int,
+        max_interval_ms: int,
+        batch_size: int,
+    ):
+        self._tracker = tracker
+        self._fetch = fetch
+        self._default_interval = default_interval_ms / 1000
+        self._min_interval = min_interval_ms / 1000
+        self._max_interval = max_interval_ms / 1000
+        self._batch_size = batch_size
+        self._due: dict[str, float] = {}    # task_id -> next poll (monotonic seconds)
+        self._last_pending: dict[str, float] = {}   # task_id -> last poll that saw it pending
+        self._first_poll: set[str] = set()          # tasks not polled yet, due after first_delay()
+        self._first_delay = self._clamp(self._default_interval)
+        self._expect_push: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.polls = 0
+        self.tasks_polled = 0
+
+    def _clamp(self, seconds: float) -> float:
+        return min(self._max_interval, max(self._min_interval, seconds))
+
+    def first_delay(self) -> float:
+        """
+        Delay of the first poll of a task, tracking the median completion time: after each poll
+        it grows with the share of first-polled tasks found pending and shrinks with the share
+        found done, so it settles where half the tasks are done. Tasks done at their first poll
+        give no completion time (only an upper bound), so the completion samples are not used.
+        """
+        return self._first_delay
+
+    def _adjust_first_delay(self, pending: int, done: int):
+        if pending + done:
+            factor = 1 + self.FIRST_DELAY_STEP * (pending - done) / (pending + done)
+            self._first_delay = self._clamp(self._first_delay * factor)
+
+    def next_interval(self) -> float:
+        quantiles = self._tracker.completion_quantiles(0.5, 0.9)
+        if quantiles is None:
+            return self._default_interval
+        p50, p90 = quantiles
+        return self._clamp((p90 - p50) / 2)
+
+    def track(self, task_id: str, delay: float | None = None, expect_push: bool = False):
+        if task_id in self._due:
+            return
+        self._due[task_id] = time.monotonic() + (self.first_delay() if delay is None else delay)
+        if delay is None:
+            self._first_poll.add(task_id)
+        if expect_push:
+            self._expect_push.add(task_id)
+        self._wakeup.set()
+        self.start()
+
+    def untrack(self, task_id: str):
+        self._due.pop(task_id, None)
+        self._last_pending.pop(task_id, None)
+        self._first_poll.discard(task_id)
+        self._expect_push.discard(task_id)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # drop tasks that were resolved by a push or abandoned by their waiter
+            for task_id in [task_id for task_id in self._due if not self._tracker.is_waiting(task_id)]:
+                self.untrack(task_id)
+
+            if not self._due:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            next_due = min(self._due.values())
+            if next_due > now:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Coalesce everything due within the minimum interval into a single batch.
+            horizon = now + self._min_interval
+            batch = [task_id for task_id, due in self._due.items() if due <= horizon][:self._batch_size]
+            try:
+                await self._poll(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Prediction poll failed: {e!r}")
+                retry_at = time.monotonic() + self.next_interval()
+                for task_id in batch:
+                    if task_id in self._due:
+                        self._due[task_id] = retry_at
+
+    async def _poll(self, batch: list[str]):
+        self.polls += 1
+        self.tasks_polled += len(batch)
+        polled_at = time.monotonic()
+        results = await self._fetch(batch)
+        next_poll = time.monotonic() + self.next_interval()
+        first_polled = [results.get(task_id) for task_id in batch if task_id in self._first_poll]
+        self._first_poll.difference_update(batch)
+        self._adjust_first_delay(
+            pending=sum(result is None for result in first_polled),
+            done=sum(isinstance(result, dict) for result in first_polled),
+        )
+        for task_id in batch:
+            result = results.get(task_id)
+            if result is None:
+                if task_id in self._due:
+                    self._due[task_id] = next_poll
+                    self._last_pending[task_id] = polled_at
+                continue
+            if isinstance(result, Exception):
+                self._tracker.fail(task_id, result)
+            else:
+                if task_id in self._expect_push:
+                    self._tracker.record_push_miss()
+                # The task finished somewhere between the last poll that saw it pending and this
+                # one; using the midpoint keeps the estimate from being anchored to our own delay.
+                # Found at its first poll, it finished at some unknown time before it: not sampled.
+                last_pending = self._last_pending.get(task_id)
+                if last_pending is not None:
+                    self._tracker.resolve(task_id, result, completed_at=(last_pending + polled_at) / 2)
+                else:
+                    self._tracker.resolve(task_id, result, record=False)
+            self.untrack(task_id)
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._due),
+            "polls": self.polls,
+            "tasks_polled": self.tasks_polled,
+            "tasks_per_poll": self.tasks_polled / self.polls if self.polls else 0.0,
+            "first_delay_ms": self.first_delay() * 1000,
+            "next_interval_ms": self.next_interval() * 1000,
+        }
@@ -0,0 +1,83 @@
+"""
+Last known value of sensor properties (sensor-state, inference-layer, sensor-config).
+
+Values are learnt from the responses sensors send to GET commands, from SET commands the MQTT
+sensor microservice accepted and from the readings sensors send, each tagged with its source
+and wall-clock time (time.time(), comparable across worker processes). A GET command with a
+max age is answered from here for the sensors whose value is fresh enough, so that sleeping,
+battery-powered sensors are only woken up when the gateway does not know the answer.
+"""
+
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Sources of a value, from most to least authoritative
+RESPONSE = "response"   # reported by the sensor
+SET = "set"             # SET command accepted by the MQTT sensor microservice
+READING = "reading"     # implied by a reading (e.g. its inference layer)
+
+
+class CachedProperty(NamedTuple):
+    value: object
+    updated_at: float   # time.time()
+    source: str
+
+    @property
+    def age_ms(self) -> float:
+        return max(0.0, time.time() - self.updated_at) * 1000
+
+
+class PropertyCache:
+    """
+    Per-sensor property values, bounded to the `max_sensors` most recently updated sensors
+    """
+
+    def __init__(self, max_sensors: int):
+        self._max_sensors = max_sensors
+        self._sensors: OrderedDict[str, dict[str, CachedProperty]] = OrderedDict()
+
+        self.updates = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, sensor_name: str, property_name: str, value: object, source: str, updated_at: float | None = None) -> bool:
+        """
+        Records `value`, unless a newer value is already known. Returns whether the known value changed.
+        """
+        updated_at = time.time() if updated_at is None else updated_at
+        properties = self._sensors.get(sensor_name)
+        if properties is None:
+            properties = self._sensors[sensor_name] = {}
+            if len(self._sensors) > self._max_sensors:
+                self._sensors.popitem(last=False)
+        else:
+            self._sensors.move_to_end(sensor_name)
+        previous = properties.get(property_name)
+        if previous is not None and previous.updated_at > updated_at:
+            return False
+        properties[property_name] = CachedProperty(value, updated_at, source)
+        self.updates += 1
+        return previous is None or previous.value != value
+
+    def get(self, sensor_name: str, property_name: str, max_age_ms: float) -> CachedProperty | None:
+        """
+        Returns the value of `property_name` if it was learnt at most `max_age_ms` ago.
+        """
+        cached = self._sensors.get(sensor_name, {}).get(property_name)
+        if cached is None or cached.age_ms > max_age_ms:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "sensors": len(self._sensors),
+            "max_sensors": self._max_sensors,
+            "updates": self.updates,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
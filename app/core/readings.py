@@ -0,0 +1,250 @@
+"""
+Ring buffers of the most recent sensor readings, for windowed analytics on the gateway.
+
+Every `SensorReading.values` block (samples x channels) is appended to its sensor's ring of
+`capacity` samples; the oldest samples are overwritten. The rings of all sensors live in
+three arrays preallocated for `max_sensors` sensors (values, receive times, sample counts),
+so memory is fixed at start, whatever the uptime; once every slot is taken the least recently
+updated sensor's slot is reused. Readings carry no per-sample time, so the samples of a
+block share the time the gateway received it.
+
+With `path` the arrays are memory-mapped files in that directory instead of anonymous memory,
+so a restarted gateway finds the readings where it left them.
+"""
+
+import os
+import warnings
+
+import numpy as np
+import orjson
+
+LAYOUT_FILE = "sensors.json"
+
+
+def used_channels(values: np.ndarray) -> int:
+    """
+    Number of leading channels of `values` (samples x channels) that hold a sample; the
+    trailing ones were never filled by the sensor's blocks.
+    """
+    used = np.flatnonzero((~np.isnan(values)).any(axis=0))
+    return int(used[-1]) + 1 if len(used) else 0
+
+
+class ReadingStore:
+    """
+    Fixed-memory per-sensor ring buffers of readings, with queries and vectorized aggregates
+    """
+
+    def __init__(self, max_sensors: int, capacity: int, channels: int, path: str = ""):
+        self.max_sensors = max_sensors
+        self.capacity = capacity
+        self.channels = channels
+        self._path = path
+        self._slots: dict[str, int] = {}
+        self._names: list[str | None] = [None] * max_sensors
+        self.values: np.ndarray | None = None   # (max_sensors, capacity, channels) float32
+        self.times: np.ndarray | None = None    # (max_sensors, capacity) receive time in ms
+        self.counts: np.ndarray | None = None   # (max_sensors,) samples ever appended
+        self._updated = np.full(max_sensors, -np.inf)
+
+        self.appended = 0
+        self.truncated = 0
+        self.evicted = 0
+
+    # --- Storage ---
+    def _layout(self) -> dict:
+        return {"max_sensors": self.max_sensors, "capacity": self.capacity, "channels": self.channels}
+
+    def open(self):
+        if self.values is not None:
+            return
+        shapes = {
+            "values": ((self.max_sensors, self.capacity, self.channels), np.float32),
+            "times": ((self.max_sensors, self.capacity), np.float64),
+            "counts": ((self.max_sensors,), np.int64),
+        }
+        if not self._path:
+            # np.zeros maps untouched pages lazily: only the slots in use take memory
+            for name, (shape, dtype) in shapes.items():
+                setattr(self, name, np.zeros(shape, dtype=dtype))
+            return
+
+        os.makedirs(self._path, exist_ok=True)
+        layout_path = os.path.join(self._path, LAYOUT_FILE)
+        names = None
+        if os.path.exists(layout_path):
+            with open(layout_path, "rb") as f:
+                layout = orjson.loads(f.read())
+            # files written with another layout cannot be reused
+            if {key: layout.get(key) for key in self._layout()} == self._layout():
+                names = layout["names"]
+        for name, (shape, dtype) in shapes.items():
+            setattr(self, name, np.memmap(os.path.join(self._path, f"{name}.bin"), dtype=dtype, shape=shape,
+                                          mode="r+" if names is not None else "w+"))
+        if names is not None:
+            for slot, sensor_name in enumerate(names):
+                if sensor_name is not None and self.counts[slot] > 0:
+                    self._names[slot] = sensor_name
+                    self._slots[sensor_name] = slot
+                    self._updated[slot] = self.times[slot, (self.counts[slot] - 1) % self.capacity]
+        self._write_layout()
+
+    def _write_layout(self):
+        if not self._path:
+            return
+        layout_path = os.path.join(self._path, LAYOUT_FILE)
+        with open(layout_path + ".tmp", "wb") as f:
+            f.write(orjson.dumps({**self._layout(), "names": self._names}))
+        os.replace(layout_path + ".tmp", layout_path)
+
+    def flush(self):
+        for array in (self.values, self.times, self.counts):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def close(self):
+        if self.values is None:
+            return
+        self.flush()
+        self._write_layout()
+        self.values = self.times = self.counts = None
+
+    def _slot(self, sensor_name: str) -> int:
+        slot = self._slots.get(sensor_name)
+        if slot is not None:
+            return slot
+        if len(self._slots) < self.max_sensors:
+            slot = self._names.index(None)
+        else:
+            slot = int(np.argmin(self._updated))
+            del self._slots[self._names[slot]]
+            self.evicted += 1
+        self._names[slot] = sensor_name
+        self._slots[sensor_name] = slot
+        self.counts[slot] = 0
+        self._write_layout()
+        return slot
+
+    # --- Writes ---
+    def append(self, sensor_name: str, block: np.ndarray, received_at_ms: float):
+        rows, columns = block.shape
+        if rows == 0:
+            return
+        if columns > self.channels:
+            self.truncated += 1
+            block, columns = block[:, :self.channels], self.channels
+        slot = self._slot(sensor_name)
+        count = int(self.counts[slot])
+        # a block longer than the ring only keeps its last samples
+        kept = block[-self.capacity:]
+        positions = (count + rows - len(kept) + np.arange(len(kept))) % self.capacity
+        self.values[slot, positions, :columns] = kept
+        self.values[slot, positions, columns:] = np.nan
+        self.times[slot, positions] = received_at_ms
+        self.counts[slot] = count + rows
+        self._updated[slot] = received_at_ms
+        self.appended += rows
+
+    # --- Queries ---
+    def sensors(self) -> list[str]:
+        return sorted(self._slots)
+
+    def samples(
+        self, sensor_name: str, last: int | None = None, start_ms: float | None = None, end_ms: float | None = None,
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Returns the receive times (ms) and values of the samples of `sensor_name`, oldest first:
+        the last `last` samples received in [`start_ms`, `end_ms`]. None for an unknown sensor.
+        """
+        slot = self._slots.get(sensor_name)
+        if slot is None:
+            return None
+        count = int(self.counts[slot])
+        stored = min(count, self.capacity)
+        positions = (count - stored + np.arange(stored)) % self.capacity
+        times, values = self.times[slot, positions], self.values[slot, positions]
+        if start_ms is not None or end_ms is not None:
+            selected = np.ones(stored, dtype=bool)
+            if start_ms is not None:
+                selected &= times >= start_ms
+            if end_ms is not None:
+                selected &= times <= end_ms
+            times, values = times[selected], values[selected]
+        if last is not None:
+            times, values = times[len(times) - min(last, len(times)):], values[len(values) - min(last, len(values)):]
+        return times, values
+
+    def aggregate(
+        self,
+        sensor_name: str,
+        last: int | None = None,
+        start_ms: float | None = None,
+        end_ms: float | None = None,
+        window_ms: float | None = None,
+        percentiles: tuple[float, ...] = (50, 90, 99),
+    ) -> list[dict] | None:
+        """
+        Per-channel count, mean, RMS, min, max and `percentiles` of the samples selected as in
+        samples(), over consecutive windows of `window_ms` (or all of them at once). Channels
+        without samples are NaN. None for an unknown sensor.
+        """
+        selected = self.samples(sensor_name, last, start_ms, end_ms)
+        if selected is None:
+            return None
+        times, values = selected
+        if not len(times):
+            return []
+        columns = used_channels(values)
+        values = values[:, :columns].astype(np.float64)
+        filled = ~np.isnan(values)
+
+        windows = np.floor(times / window_ms).astype(np.int64) if window_ms else np.zeros(len(times), dtype=np.int64)
+        order = np.argsort(windows, kind="stable")
+        windows, times, values, filled = windows[order], times[order], values[order], filled[order]
+        starts = np.flatnonzero(np.r_[True, windows[1:] != windows[:-1]])
+
+        counts = np.add.reduceat(filled, starts, axis=0)
+        zeroed = np.where(filled, values, 0.0)
+        sums = np.add.reduceat(zeroed, starts, axis=0)
+        squares = np.add.reduceat(zeroed * zeroed, starts, axis=0)
+        means = np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+        rms = np.sqrt(np.divide(squares, counts, out=np.full(squares.shape, np.nan), where=counts > 0))
+        minimums = np.fmin.reduceat(values, starts, axis=0)
+        maximums = np.fmax.reduceat(values, starts, axis=0)
+        with warnings.catch_warnings():
+            # all-NaN channels of a window are NaN, as above
+            warnings.simplefilter("ignore", RuntimeWarning)
+            quantiles = [
+                np.nanpercentile(segment, percentiles, axis=0) if columns else np.empty((len(percentiles), 0))
+                for segment in np.split(values, starts[1:])
+            ]
+        ends = np.r_[starts[1:], len(times)]
+
+        return [
+            {
+                "start_ms": float(windows[first] * window_ms) if window_ms else float(times[first]),
+                "end_ms": float((windows[first] + 1) * window_ms) if window_ms else float(times[end - 1]),
+                "samples": int(end - first),
+                "count": counts[i].tolist(),
+                "mean": means[i].tolist(),
+                "rms": rms[i].tolist(),
+                "min": minimums[i].tolist(),
+                "max": maximums[i].tolist(),
+                "percentiles": {f"p{q:g}": row.tolist() for q, row in zip(percentiles, quantiles[i])},
+            }
+            for i, (first, end) in enumerate(zip(starts, ends))
+        ]
+
+    def stats(self) -> dict:
+        itemsize = np.dtype(np.float32).itemsize * self.channels + np.dtype(np.float64).itemsize
+        return {
+            "path": self._path or None,
+            "sensors": len(self._slots),
+            "max_sensors": self.max_sensors,
+            "capacity": self.capacity,
+            "channels": self.channels,
+            "max_bytes": self.max_sensors * (self.capacity * itemsize + np.dtype(np.int64).itemsize),
+            "appended": self.appended,
+            "truncated": self.truncated,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,133 @@
+"""
+Resilience primitives for upstream calls: circuit breakers and request deadlines.
+
+A CircuitBreaker opens after `failure_threshold` consecutive failures (transport errors,
+upstream timeouts or 5xx answers; a caller's deadline running out does not count) and fails
+calls fast for `reset_timeout_ms`; it then lets a single probe through and closes again if
+the probe succeeds.
+
+A deadline is the wall-clock time (time.time()) by which the inbound request that caused a
+call must be answered. It is kept in a context variable so every upstream call made on
+behalf of that request, however deep, is bounded by the time left.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised instead of calling an upstream whose circuit breaker is open
+    """
+
+    def __init__(self, upstream: str):
+        super().__init__(f"{upstream} is unavailable (circuit open)")
+        self.upstream = upstream
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of calling an upstream once the request deadline has passed
+    """
+
+
+# --- Circuit breaker ---
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a single half-open probe
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_ms: int):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout_ms / 1000
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and time.monotonic() - self._opened_at < self._reset_timeout
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_cancelled(self):
+        # a cancelled call tells nothing about the upstream, but must not hold the probe slot
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self._failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": OPEN if self.is_open else (HALF_OPEN if self.state == OPEN else self.state),
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+# --- Deadlines ---
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(at: float | None):
+    """
+    Bounds the upstream calls made inside the block by wall-clock time `at` (or by an
+    earlier deadline already in effect).
+    """
+    current = _deadline.get()
+    if at is None or (current is not None and current < at):
+        at = current
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline() -> float | None:
+    """
+    Wall-clock deadline of the current request, None when no deadline is set.
+    """
+    return _deadline.get()
+
+
+def time_left() -> float | None:
+    """
+    Seconds left until the current deadline, None when no deadline is set.
+    """
+    at = _deadline.get()
+    return None if at is None else at - time.time()
@@ -0,0 +1,130 @@
+"""
+In-memory index of the sensors registered in the metadata microservice.
+
+verify_target_sensors runs on every telemetry message and sensor command, while the set of
+registered sensors rarely changes. The index answers membership checks from a set, refreshes
+itself in the background every TTL and is invalidated explicitly when sensors are added.
+Unknown names are remembered for a shorter negative TTL so that a sender which is not
+registered cannot force a metadata round trip per message.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable
+
+
+class SensorRegistryCache:
+    """
+    TTL cache of registered sensor names with a negative-lookup cache
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[set[str]]], ttl_ms: int, negative_ttl_ms: int):
+        self._fetch = fetch
+        self._ttl = ttl_ms / 1000
+        self._negative_ttl = negative_ttl_ms / 1000
+        self._names: set[str] = set()
+        self._unknown: dict[str, float] = {}    # name -> expiry (monotonic seconds)
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    # --- Refresh ---
+    async def refresh(self):
+        # Single-flight: concurrent callers wait for the refresh already in progress.
+        generation = self._generation
+        async with self._lock:
+            if generation != self._generation:
+                return
+            names = await self._fetch()
+            self._names = names
+            self._unknown.clear()
+            self._expires_at = time.monotonic() + self._ttl
+            self._generation += 1
+            self.refreshes += 1
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"Registered sensor refresh failed: {e!r}")
+            await asyncio.sleep(self._ttl / 2)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- Invalidation ---
+    def invalidate(self):
+        self._expires_at = 0.0
+        self._unknown.clear()
+
+    def add(self, names: Iterable[str]):
+        for name in names:
+            self._names.add(name)
+            self._unknown.pop(name, None)
+
+    # --- Lookup ---
+    def _classify(self, names: Iterable[str], now: float) -> list[str]:
+        missing = []
+        for name in names:
+            if name in self._names:
+                self.hits += 1
+            elif self._unknown.get(name, 0.0) > now:
+                self.negative_hits += 1
+            else:
+                self.misses += 1
+                missing.append(name)
+        return missing
+
+    async def find_unregistered(self, names: list[str]) -> list[str]:
+        """
+        Returns the names in `names` that are not registered.
+        """
+        refreshed = time.monotonic() >= self._expires_at
+        if refreshed:
+            await self.refresh()
+
+        missing = self._classify(names, time.monotonic())
+        if missing and not refreshed:
+            await self.refresh()
+        if missing:
+            missing = [name for name in missing if name not in self._names]
+            expiry = time.monotonic() + self._negative_ttl
+            for name in missing:
+                self._unknown[name] = expiry
+
+        return [name for name in names if name not in self._names]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "registered_sensors": len(self._names),
+            "negative_entries": len(self._unknown),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "ttl_remaining_ms": max(0.0, self._expires_at - time.monotonic()) * 1000,
+        }
@@ -0,0 +1,31 @@
+"""
+JSON encoding for outbound request bodies.
+
+Pydantic models are encoded straight to bytes by pydantic-core instead of going through
+model_dump() and the stdlib json module; plain containers are encoded with orjson. Lists
+are encoded element by element so that a bulk body may mix models and spooled dicts.
+"""
+
+import orjson
+from pydantic import BaseModel
+
+JSON_CONTENT_TYPE = "application/json"
+JSON_HEADERS = {"Content-Type": JSON_CONTENT_TYPE}
+
+
+def _default(obj: object) -> object:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: object) -> bytes:
+    if isinstance(obj, BaseModel):
+        return obj.__pydantic_serializer__.to_json(obj)
+    if isinstance(obj, list) and any(isinstance(item, BaseModel) for item in obj):
+        return b"[" + b",".join(dumps(item) for item in obj) + b"]"
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def loads(data: bytes | str) -> object:
+    return orjson.loads(data)
@@ -0,0 +1,374 @@
+"""
+Sensor state shared by the worker processes of a multi-worker gateway (see app/front.py).
+
+Readings of a sensor always reach the same worker, so per-sensor ingest state (heuristic
+tracking, policy windows, latency samples) stays local to that worker. What every worker
+must agree on lives in an SQLite database in WAL mode next to them:
+
+- the registered sensor set: whichever worker refreshes it from the metadata microservice
+  stores it, and the others read it from the database while it is younger than `max_age_ms`,
+- sensor events: invalidations a worker makes after a command or a metadata write are appended
+  to an event table that every worker polls every `poll_ms` and applies to its own caches,
+- last known sensor properties (see app.core.property_cache): a worker stores the values it
+  learns and reads the others' when its own are missing or too old,
+- model deliveries (see app.core.artifacts.DeliveryLog): the model last accepted for the
+  inference microservice and for each sensor, whichever worker pushed it,
+- sensor responses to GET commands (see app.core.command_responses): the worker receiving a
+  response nobody waits for locally stores it with a COMMAND_RESPONDED event, so that the
+  worker waiting for it picks it up,
+- the cloud paths found without a /bulk endpoint, so that only one worker probes each of them
+  until the finding expires.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Iterable
+
+import orjson
+
+from app.core.property_cache import CachedProperty
+
+# Event kinds
+REGISTRY_INVALIDATED = "registry-invalidated"
+REGISTRY_ADDED = "registry-added"
+HEURISTIC_FORGOTTEN = "heuristic-forgotten"
+COMMAND_RESPONDED = "command-responded"     # names the command_uuids instead of sensors
+CLOUD_BULK_UNSUPPORTED = "cloud-bulk-unsupported"   # names cloud paths instead of sensors
+
+# Applies an event published by another worker; receives the sensor names of the event.
+Handler = Callable[[list[str]], None]
+
+
+class SharedSensorState:
+    """
+    SQLite-backed registered sensors, sensor events, sensor properties, model deliveries,
+    command responses and cloud capabilities shared across processes
+    """
+
+    def __init__(self, path: str, worker: int, poll_ms: int, event_ttl_s: float = 300):
+        self._path = path
+        self._worker = worker
+        self._poll_interval = poll_ms / 1000
+        self._event_ttl = event_ttl_s
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._last_event_id = 0
+        self._handlers: dict[str, list[Handler]] = {}
+        self._task: asyncio.Task | None = None
+
+        self.shared_reads = 0
+        self.fetches = 0
+        self.published = 0
+        self.applied = 0
+        self.poll_errors = 0
+
+    # --- SQLite (called from worker threads) ---
+    def _open(self):
+        if self._db is not None:
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS registered_sensors (name TEXT PRIMARY KEY)")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sensor_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, sensor_name TEXT, "
+            "origin INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sensor_properties ("
+            "sensor_name TEXT NOT NULL, property_name TEXT NOT NULL, value BLOB NOT NULL, "
+            "updated_at REAL NOT NULL, source TEXT NOT NULL, PRIMARY KEY (sensor_name, property_name))"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS model_deliveries ("
+            "target TEXT PRIMARY KEY, digest TEXT NOT NULL, delivered_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS command_responses ("
+            "command_uuid TEXT PRIMARY KEY, response BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        db.execute("CREATE TABLE IF NOT EXISTS cloud_bulk_unsupported (path TEXT PRIMARY KEY, created REAL NOT NULL)")
+        # events published before this worker started are already reflected in the shared tables
+        self._last_event_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM sensor_events").fetchone()[0]
+        self._db = db
+
+    def _read_registered(self, max_age_s: float) -> set[str] | None:
+        with self._db_lock:
+            self._open()
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'registered_sensors_at'").fetchone()
+            if row is None or row[0] < time.time() - max_age_s:
+                return None
+            return {name for name, in self._db.execute("SELECT name FROM registered_sensors")}
+
+    def _write_registered(self, names: set[str]):
+        with self._db_lock:
+            self._open()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM registered_sensors")
+                self._db.executemany("INSERT INTO registered_sensors (name) VALUES (?)", [(name,) for name in names])
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('registered_sensors_at', ?)", (time.time(),))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _insert_events(self, kind: str, names: list[str | None]):
+        now = time.time()
+        with self._db_lock:
+            self._open()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT INTO sensor_events (kind, sensor_name, origin, created) VALUES (?, ?, ?, ?)",
+                    [(kind, name, self._worker, now) for name in names],
+                )
+                if kind == REGISTRY_ADDED:
+                    self._db.executemany("INSERT OR IGNORE INTO registered_sensors (name) VALUES (?)", [(name,) for name in names])
+                elif kind == REGISTRY_INVALIDATED:
+                    self._db.execute("DELETE FROM meta WHERE key = 'registered_sensors_at'")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _read_events(self) -> list[tuple[int, str, str | None, int]]:
+        with self._db_lock:
+            self._open()
+            events = self._db.execute(
+                "SELECT id, kind, sensor_name, origin FROM sensor_events WHERE id > ? ORDER BY id", (self._last_event_id,)
+            ).fetchall()
+            if events:
+                self._last_event_id = events[-1][0]
+            return events
+
+    def _prune_events(self):
+        with self._db_lock:
+            self._open()
+            self._db.execute("DELETE FROM sensor_events WHERE created < ?", (time.time() - self._event_ttl,))
+            self._db.execute("DELETE FROM command_responses WHERE created < ?", (time.time() - self._event_ttl,))
+
+    def _write_properties(self, rows: list[tuple[str, str, bytes, float, str]]):
+        with self._db_lock:
+            self._open()
+            self._db.executemany(
+                "INSERT INTO sensor_properties (sensor_name, property_name, value, updated_at, source) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (sensor_name, property_name) DO UPDATE SET "
+                "value = excluded.value, updated_at = excluded.updated_at, source = excluded.source "
+                "WHERE excluded.updated_at >= sensor_properties.updated_at",
+                rows,
+            )
+
+    def _read_properties(self, sensor_names: list[str], property_name: str) -> list[tuple[str, bytes, float, str]]:
+        with self._db_lock:
+            self._open()
+            placeholders = ",".join("?" * len(sensor_names))
+            return self._db.execute(
+                "SELECT sensor_name, value, updated_at, source FROM sensor_properties "
+                f"WHERE property_name = ? AND sensor_name IN ({placeholders})",
+                (property_name, *sensor_names),
+            ).fetchall()
+
+    def _write_model_deliveries(self, targets: list[str], digest: str | None):
+        with self._db_lock:
+            self._open()
+            if digest is None:
+                self._db.executemany("DELETE FROM model_deliveries WHERE target = ?", [(target,) for target in targets])
+            else:
+                now = time.time()
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO model_deliveries (target, digest, delivered_at) VALUES (?, ?, ?)",
+                    [(target, digest, now) for target in targets],
+                )
+
+    def _read_model_deliveries(self, targets: list[str], max_age_s: float) -> list[tuple[str, str]]:
+        with self._db_lock:
+            self._open()
+            placeholders = ",".join("?" * len(targets))
+            return self._db.execute(
+                f"SELECT target, digest FROM model_deliveries WHERE target IN ({placeholders}) AND delivered_at >= ?",
+                (*targets, time.time() - max_age_s),
+            ).fetchall()
+
+    def _write_cloud_bulk_unsupported(self, path: str):
+        with self._db_lock:
+            self._open()
+            self._db.execute("INSERT OR REPLACE INTO cloud_bulk_unsupported (path, created) VALUES (?, ?)", (path, time.time()))
+
+    def _read_cloud_bulk_unsupported(self, max_age_s: float) -> list[tuple[str, float]]:
+        with self._db_lock:
+            self._open()
+            expired = time.time() - max_age_s
+            self._db.execute("DELETE FROM cloud_bulk_unsupported WHERE created < ?", (expired,))
+            return self._db.execute("SELECT path, created FROM cloud_bulk_unsupported").fetchall()
+
+    def _write_command_response(self, command_uuid: str, response: bytes):
+        now = time.time()
+        with self._db_lock:
+            self._open()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO command_responses (command_uuid, response, created) VALUES (?, ?, ?)",
+                    (command_uuid, response, now),
+                )
+                self._db.execute(
+                    "INSERT INTO sensor_events (kind, sensor_name, origin, created) VALUES (?, ?, ?, ?)",
+                    (COMMAND_RESPONDED, command_uuid, self._worker, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _read_command_responses(self, command_uuids: list[str]) -> list[tuple[str, bytes]]:
+        with self._db_lock:
+            self._open()
+            placeholders = ",".join("?" * len(command_uuids))
+            return self._db.execute(
+                f"SELECT command_uuid, response FROM command_responses WHERE command_uuid IN ({placeholders})",
+                command_uuids,
+            ).fetchall()
+
+    def _close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- Registered sensors ---
+    def shared_fetch(self, fetch: Callable[[], Awaitable[set[str]]], max_age_ms: int) -> Callable[[], Awaitable[set[str]]]:
+        """
+        Wraps the metadata fetch of a SensorRegistryCache so that the workers share its result.
+        """
+        async def shared():
+            names = await asyncio.to_thread(self._read_registered, max_age_ms / 1000)
+            if names is not None:
+                self.shared_reads += 1
+                return names
+            names = await fetch()
+            self.fetches += 1
+            await asyncio.to_thread(self._write_registered, names)
+            return names
+        return shared
+
+    # --- Sensor properties ---
+    async def put_properties(self, property_name: str, values: dict[str, CachedProperty]):
+        rows = [
+            (sensor_name, property_name, orjson.dumps(cached.value), cached.updated_at, cached.source)
+            for sensor_name, cached in values.items()
+        ]
+        await asyncio.to_thread(self._write_properties, rows)
+
+    async def get_properties(self, sensor_names: list[str], property_name: str) -> dict[str, CachedProperty]:
+        rows = await asyncio.to_thread(self._read_properties, sensor_names, property_name)
+        return {
+            sensor_name: CachedProperty(orjson.loads(value), updated_at, source)
+            for sensor_name, value, updated_at, source in rows
+        }
+
+    # --- Model deliveries ---
+    async def put_model_deliveries(self, targets: list[str], digest: str):
+        await asyncio.to_thread(self._write_model_deliveries, targets, digest)
+
+    async def forget_model_deliveries(self, targets: list[str]):
+        await asyncio.to_thread(self._write_model_deliveries, targets, None)
+
+    async def get_model_deliveries(self, targets: list[str], max_age_ms: int) -> dict[str, str]:
+        return dict(await asyncio.to_thread(self._read_model_deliveries, targets, max_age_ms / 1000))
+
+    # --- Cloud capabilities ---
+    async def put_cloud_bulk_unsupported(self, path: str):
+        await asyncio.to_thread(self._write_cloud_bulk_unsupported, path)
+        await self.publish(CLOUD_BULK_UNSUPPORTED, [path])
+
+    async def get_cloud_bulk_unsupported(self, max_age_ms: int) -> dict[str, float]:
+        """
+        Returns the cloud paths found without a /bulk endpoint in the last `max_age_ms`, with
+        the time (seconds since the epoch) they were found.
+        """
+        return dict(await asyncio.to_thread(self._read_cloud_bulk_unsupported, max_age_ms / 1000))
+
+    # --- Command responses ---
+    async def put_command_response(self, command_uuid: str, response: dict):
+        await asyncio.to_thread(self._write_command_response, command_uuid, orjson.dumps(response))
+        self.published += 1
+
+    async def get_command_responses(self, command_uuids: list[str]) -> dict[str, dict]:
+        rows = await asyncio.to_thread(self._read_command_responses, command_uuids)
+        return {command_uuid: orjson.loads(response) for command_uuid, response in rows}
+
+    # --- Events ---
+    def subscribe(self, kind: str, handler: Handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    async def publish(self, kind: str, sensor_names: Iterable[str] = ()):
+        """
+        Records event `kind` for the other workers; an event without sensors applies to all of them.
+        """
+        names = list(sensor_names) or [None]
+        await asyncio.to_thread(self._insert_events, kind, names)
+        self.published += 1
+
+    def _apply(self, events: list[tuple[int, str, str | None, int]]):
+        by_kind: dict[str, list[str]] = {}
+        for _, kind, sensor_name, origin in events:
+            if origin == self._worker:
+                continue
+            names = by_kind.setdefault(kind, [])
+            if sensor_name is not None:
+                names.append(sensor_name)
+        for kind, names in by_kind.items():
+            for handler in self._handlers.get(kind, ()):
+                handler(names)
+            self.applied += 1
+
+    async def _poll_loop(self):
+        polls = 0
+        while True:
+            try:
+                self._apply(await asyncio.to_thread(self._read_events))
+                polls += 1
+                if polls % 1000 == 0:
+                    await asyncio.to_thread(self._prune_events)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.poll_errors += 1
+                print(f"Shared sensor state poll failed: {e!r}")
+            await asyncio.sleep(self._poll_interval)
+
+    async def start(self):
+        if self._task is None:
+            await asyncio.to_thread(self._open)
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self._close)
+
+    def stats(self) -> dict:
+        return {
+            "path": self._path,
+            "worker": self._worker,
+            "last_event_id": self._last_event_id,
+            "shared_reads": self.shared_reads,
+            "fetches": self.fetches,
+            "published": self.published,
+            "applied": self.applied,
+            "poll_errors": self.poll_errors,
+        }
@@ -0,0 +1,267 @@
+"""
+Durable store-and-forward spool for cloud-bound traffic.
+
+Payloads are appended to an SQLite database in WAL mode and acknowledged right away; a
+background drainer forwards them to the cloud in bulk, oldest first, and deletes them once
+the cloud has answered. Rows that could not be delivered stay in the database, so after a
+restart the drainer resumes from the oldest undelivered payload. Only one drain batch is held
+in memory at a time and the spool is capped at max_rows (oldest rows are dropped).
+
+Payloads of a cloud path are delivered in order: a payload answered with a retryable status
+holds back the ones behind it. After max_attempts such answers it is moved to the dead_letter
+table (capped at max_rows as well) and the drainer moves on.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable
+
+from app.core.batching import ItemResult
+
+# Forwards the payloads spooled for one cloud path, returning one result per payload.
+Forward = Callable[[str, list], Awaitable[list[ItemResult]]]
+
+# (id, path, payload, attempts)
+Row = tuple[int, str, bytes, int]
+
+# Status codes worth retrying; any other answer from the cloud is final for that payload.
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CloudSpool:
+    """
+    Append-only SQLite spool drained to the cloud by a background task
+    """
+
+    def __init__(
+        self,
+        path: str,
+        forward: Forward,
+        max_rows: int,
+        drain_batch_size: int,
+        backoff_min_ms: int,
+        backoff_max_ms: int,
+        max_attempts: int = 20,
+        dumps: Callable[[object], bytes] = lambda payload: json.dumps(payload).encode(),
+        loads: Callable[[bytes], object] = json.loads,
+    ):
+        self._path = path
+        self._dumps = dumps
+        self._loads = loads
+        self._forward = forward
+        self._max_rows = max_rows
+        self._drain_batch_size = drain_batch_size
+        self._backoff_min = backoff_min_ms / 1000
+        self._backoff_max = backoff_max_ms / 1000
+        self._max_attempts = max(1, max_attempts)
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._appended = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.rows = 0
+        self.bytes = 0
+        self.appended = 0
+        self.delivered = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self.dead_letter_rows = 0
+        self.drain_errors = 0
+        self.failed_attempts = 0
+        self.drain_rate = 0.0   # payloads/s, exponentially weighted
+        self.backoff = 0.0
+
+    # --- SQLite (called from worker threads) ---
+    def _open(self):
+        if self._db is not None:
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, payload BLOB NOT NULL, created REAL NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "attempts" not in [column[1] for column in db.execute("PRAGMA table_info(spool)")]:
+            # spools written before attempts were counted
+            db.execute("ALTER TABLE spool ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            "id INTEGER PRIMARY KEY, path TEXT NOT NULL, payload BLOB NOT NULL, created REAL NOT NULL, "
+            "attempts INTEGER NOT NULL, status_code INTEGER NOT NULL, failed REAL NOT NULL)"
+        )
+        self.rows, self.bytes = db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM spool").fetchone()
+        self.dead_letter_rows = db.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        self._db = db
+
+    def _insert(self, path: str, payload: bytes):
+        with self._db_lock:
+            self._open()
+            self._db.execute("INSERT INTO spool (path, payload, created) VALUES (?, ?, ?)", (path, payload, time.time()))
+            self.rows += 1
+            self.bytes += len(payload)
+            if self.rows > self._max_rows:
+                overflow = self.rows - self._max_rows
+                dropped_bytes = self._db.execute(
+                    "SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM "
+                    "(SELECT payload FROM spool ORDER BY id LIMIT ?)", (overflow,)
+                ).fetchone()[0]
+                self._db.execute("DELETE FROM spool WHERE id IN (SELECT id FROM spool ORDER BY id LIMIT ?)", (overflow,))
+                self.rows -= overflow
+                self.bytes -= dropped_bytes
+                self.dropped += overflow
+
+    def _read_batch(self) -> list[Row]:
+        with self._db_lock:
+            self._open()
+            return self._db.execute(
+                "SELECT id, path, payload, attempts FROM spool ORDER BY id LIMIT ?", (self._drain_batch_size,)
+            ).fetchall()
+
+    def _settle(self, done: list[Row], dead: list[tuple[Row, int]], retried: list[Row]):
+        """
+        Deletes the `done` rows, moves the `dead` rows (with the status code of their last answer)
+        to the dead_letter table and counts an attempt for the `retried` rows, in one transaction.
+        """
+        with self._db_lock:
+            self._open()
+            with self._db:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO dead_letter (id, path, payload, created, attempts, status_code, failed) "
+                    "SELECT id, path, payload, created, attempts + 1, ?, ? FROM spool WHERE id = ?",
+                    [(status_code, time.time(), row[0]) for row, status_code in dead],
+                )
+                if dead:
+                    self._db.execute(
+                        "DELETE FROM dead_letter WHERE id NOT IN (SELECT id FROM dead_letter ORDER BY id DESC LIMIT ?)",
+                        (self._max_rows,),
+                    )
+                settled = done + [row for row, _ in dead]
+                self._db.executemany("DELETE FROM spool WHERE id = ?", [(row[0],) for row in settled])
+                self._db.executemany("UPDATE spool SET attempts = attempts + 1 WHERE id = ?", [(row[0],) for row in retried])
+                self.dead_letter_rows = self._db.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+            self.rows -= len(settled)
+            self.bytes -= sum(len(row[2]) for row in settled)
+
+    def _close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- Public API ---
+    async def append(self, path: str, payload: object):
+        await asyncio.to_thread(self._insert, path, self._dumps(payload))
+        self.appended += 1
+        self._appended.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self._close)
+
+    # --- Drainer ---
+    async def _drain_loop(self):
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._read_batch)
+                if not rows:
+                    self._appended.clear()
+                    try:
+                        await asyncio.wait_for(self._appended.wait(), timeout=1)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                t0 = time.perf_counter()
+                done, dead, retried = await self._forward_rows(rows)
+                if done or dead or retried:
+                    await asyncio.to_thread(self._settle, done, dead, retried)
+                if done:
+                    elapsed = max(time.perf_counter() - t0, 1e-6)
+                    self.drain_rate = 0.8 * self.drain_rate + 0.2 * (len(done) / elapsed)
+                settled = len(done) + len(dead) == len(rows)
+            except Exception as e:
+                # e.g. a locked or full database; the rows stay spooled for the next round
+                self.drain_errors += 1
+                print(f"Cloud spool drain failed: {e!r}")
+                settled = False
+
+            if not settled:
+                self.failed_attempts += 1
+                self.backoff = min(self._backoff_max, max(self._backoff_min, self.backoff * 2))
+                await asyncio.sleep(self.backoff)
+            else:
+                self.backoff = 0.0
+
+    async def _forward_rows(self, rows: list[Row]) -> tuple[list[Row], list[tuple[Row, int]], list[Row]]:
+        """
+        Forwards `rows` grouped by cloud path. Returns the rows which need no retry, the rows to
+        dead-letter with their status code and the row to retry, if any. Within a path nothing
+        after the row to retry is settled, and the paths after it are not sent, so that later
+        payloads are never delivered ahead of it.
+        """
+        by_path: dict[str, list[Row]] = {}
+        for row in rows:
+            by_path.setdefault(row[1], []).append(row)
+
+        done, dead = [], []
+        for path, path_rows in by_path.items():
+            try:
+                results = await self._forward(path, [self._loads(row[2]) for row in path_rows])
+            except Exception as e:
+                print(f"Cloud spool drain to {path} failed: {e!r}")
+                break
+            for row, result in zip(path_rows, results):
+                if result.status_code in RETRYABLE_STATUS_CODES:
+                    if row[3] + 1 < self._max_attempts:
+                        # the rows behind it were sent too; they are sent again with it
+                        return done, dead, [row]
+                    print(f"Cloud spool payload {row[0]} to {path} dead-lettered after {row[3] + 1} attempts "
+                          f"(last status {result.status_code})")
+                    self.dead_lettered += 1
+                    dead.append((row, result.status_code))
+                    continue
+                if result.status_code >= 300:
+                    self.rejected += 1
+                else:
+                    self.delivered += 1
+                done.append(row)
+        return done, dead, []
+
+    def stats(self) -> dict:
+        return {
+            "path": self._path,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "appended": self.appended,
+            "delivered": self.delivered,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "dead_lettered": self.dead_lettered,
+            "dead_letter_rows": self.dead_letter_rows,
+            "max_attempts": self._max_attempts,
+            "drain_errors": self.drain_errors,
+            "failed_attempts": self.failed_attempts,
+            "drain_rate": self.drain_rate,
+            "backoff_ms": self.backoff * 1000,
+        }
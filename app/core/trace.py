@@ -0,0 +1,136 @@
+"""
+Capture of inbound requests into a compressed trace file, for replay (benchmarks/replay.py).
+
+Each request is one msgpack record
+
+    [arrival (time.time()), method, path, query, headers, body]
+
+appended to a gzip file; a restarted recorder appends a new gzip member, which readers see as
+one stream. Recording only appends the raw request to a bounded in-memory queue; encoding,
+compression and writes happen in a background task (the file I/O in a thread). When the queue
+is full requests are dropped, and recording stops once the file reaches `max_bytes`, so the
+recorder never slows down or grows without bound on a busy gateway.
+"""
+
+import asyncio
+import gzip
+import os
+import time
+from collections import deque
+from typing import Iterator
+
+import msgpack
+
+# Headers that change how a request is handled and must be replayed.
+RECORDED_HEADERS = ("content-type", "x-sensor-name", "x-request-deadline-ms")
+
+
+def read_trace(path: str) -> Iterator[list]:
+    """
+    Yields the [arrival, method, path, query, headers, body] records of a trace file, in order.
+    """
+    with gzip.open(path, "rb") as f:
+        try:
+            yield from msgpack.Unpacker(f, raw=False)
+        except EOFError:
+            pass    # last member truncated by a crash
+
+
+class TraceRecorder:
+    """
+    Bounded, asynchronous request recorder
+    """
+
+    def __init__(self, path: str, max_bytes: int, queue_size: int, compress_level: int = 6):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._compress_level = compress_level
+        self._queue: deque[list] = deque()
+        self._queue_size = queue_size
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._file: gzip.GzipFile | None = None
+        self.full = False
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, method: str, path: str, query: str, headers, body: bytes):
+        if self._task is None or self.full or self._stopping:
+            return
+        if len(self._queue) >= self._queue_size:
+            self.dropped += 1
+            return
+        self._queue.append([
+            time.time(), method, path, query,
+            {name: headers[name] for name in RECORDED_HEADERS if name in headers}, body,
+        ])
+        self.recorded += 1
+        self._wakeup.set()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        self.full = os.path.exists(self._path) and os.path.getsize(self._path) >= self._max_bytes
+        if not self.full:
+            self._file = gzip.open(self._path, "ab", compresslevel=self._compress_level)
+
+    def _write(self, records: list[list]):
+        packer = msgpack.Packer(use_bin_type=True)
+        self._file.write(b"".join(packer.pack(record) for record in records))
+        # sync flush so that the trace is readable up to here if the gateway dies
+        self._file.flush()
+        self.written += len(records)
+        if self._file.fileobj.tell() >= self._max_bytes:
+            self.full = True
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def _write_loop(self):
+        try:
+            while not self.full:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._queue and not self.full:
+                    records = list(self._queue)
+                    self._queue.clear()
+                    await asyncio.to_thread(self._write, records)
+                if self._stopping:
+                    break
+        finally:
+            self.dropped += len(self._queue)
+            self._queue.clear()
+            await asyncio.to_thread(self._close)
+
+    async def start(self):
+        if self._task is None:
+            await asyncio.to_thread(self._open)
+            if not self.full:
+                self._stopping = False
+                self._task = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        """
+        Writes the queued requests and closes the trace file.
+        """
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "path": self._path,
+            "bytes": os.path.getsize(self._path) if os.path.exists(self._path) else 0,
+            "max_bytes": self._max_bytes,
+            "full": self.full,
+            "queued": len(self._queue),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
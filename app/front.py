@@ -0,0 +1,269 @@
+"""
+Front router of the multi-worker mode (GATEWAY_WORKERS > 1).
+
+A single event loop caps the gateway at one core, so the front router runs GATEWAY_WORKERS
+gateway processes (uvicorn app.main:app) on 127.0.0.1:GATEWAY_WORKER_BASE_PORT + i and
+forwards the requests it receives on GATEWAY_API_PORT to them:
+
+- sensor data and latency benchmarks go to the worker chosen by a hash of the sensor name, so
+  all readings of a sensor are processed, in order, by the worker holding its ingest state,
+- queries of a sensor's stored readings go to that same worker,
+- pushed prediction results go back to the worker which submitted the task (each worker
+  registers a callback URL naming itself),
+- /metrics, /api/v1/gateway/stats/* and the list of sensors with stored readings are gathered
+  from every worker and merged,
+- any other request goes to the next worker in turn.
+
+The front router only peeks at request bodies to find sensor names (see
+app.core.admission.peek_sensor_name), so one process keeps many workers busy. Workers keep
+their caches coherent through the shared state database (see app.core.shared_state), and
+a worker that exits is restarted.
+
+Usage: python -m app.front [--host 0.0.0.0] [--port 8004]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import zlib
+from contextlib import asynccontextmanager
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, status
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.core.admission import peek_sensor_name
+from app.core.config import (
+    GATEWAY_API_HOST, GATEWAY_API_PORT, GATEWAY_WORKERS, GATEWAY_WORKER_BASE_PORT,
+    PREDICTION_CALLBACK_URL, CLOUD_SPOOL_PATH, TRACE_PATH, READING_STORE_PATH,
+)
+from app.core.metrics import merge_expositions
+
+SENSOR_ROUTES = {"/api/v1/export/sensor-data", "/api/v1/export/inference-latency-benchmark"}
+PREDICTION_RESULT_ROUTE = "/api/v1/store/inference/prediction-result"
+STATS_PREFIX = "/api/v1/gateway/stats"
+READINGS_PREFIX = "/api/v1/gateway/readings/"
+WORKER_PARAM = "worker"
+
+# not forwarded in either direction
+_HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade", "host"}
+
+
+def worker_for(sensor_name: str, workers: int) -> int:
+    # crc32 rather than hash(): the choice must not change across processes and restarts
+    return zlib.crc32(sensor_name.encode()) % workers
+
+
+def _per_worker(path: str, worker: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker{worker}{ext}"
+
+
+class WorkerPool:
+    """
+    Gateway worker processes, supervised, with a connection pool to each
+    """
+
+    def __init__(self, workers: int, base_port: int):
+        self._ports = [base_port + worker for worker in range(workers)]
+        self._processes: list[asyncio.subprocess.Process | None] = [None] * workers
+        self._clients: list[httpx.AsyncClient] = []
+        self._round_robin = itertools.cycle(range(workers))
+        self._task: asyncio.Task | None = None
+
+        self.forwarded = [0] * workers
+        self.unavailable = [0] * workers
+        self.restarts = [0] * workers
+
+    def __len__(self) -> int:
+        return len(self._ports)
+
+    def _env(self, worker: int) -> dict[str, str]:
+        separator = "&" if "?" in PREDICTION_CALLBACK_URL else "?"
+        return {
+            **os.environ,
+            "GATEWAY_WORKER_INDEX": str(worker),
+            **({"PREDICTION_CALLBACK_URL": f"{PREDICTION_CALLBACK_URL}{separator}{WORKER_PARAM}={worker}"}
+               if PREDICTION_CALLBACK_URL else {}),
+            # files a single process writes to
+            "CLOUD_SPOOL_PATH": _per_worker(CLOUD_SPOOL_PATH, worker),
+            "TRACE_PATH": _per_worker(TRACE_PATH, worker),
+            **({"READING_STORE_PATH": _per_worker(READING_STORE_PATH, worker)} if READING_STORE_PATH else {}),
+        }
+
+    async def _spawn(self, worker: int):
+        self._processes[worker] = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self._ports[worker]),
+            env=self._env(worker),
+        )
+
+    async def _wait_ready(self, worker: int, timeout_s: float = 60):
+        deadline = asyncio.get_running_loop().time() + timeout_s
+        while asyncio.get_running_loop().time() < deadline:
+            try:
+                if (await self._clients[worker].get("/metrics")).status_code == status.HTTP_200_OK:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+        print(f"Gateway worker {worker} not ready after {timeout_s}s")
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(1)
+            for worker, process in enumerate(self._processes):
+                if process is not None and process.returncode is not None:
+                    print(f"Gateway worker {worker} exited with {process.returncode}, restarting it")
+                    self.restarts[worker] += 1
+                    await self._spawn(worker)
+
+    async def start(self):
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+        self._clients = [
+            httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=httpx.Timeout(None, connect=5))
+            for port in self._ports
+        ]
+        for worker in range(len(self)):
+            await self._spawn(worker)
+        await asyncio.gather(*[self._wait_ready(worker) for worker in range(len(self))])
+        self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        processes = [process for process in self._processes if process is not None and process.returncode is None]
+        for process in processes:
+            process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.gather(*[process.wait() for process in processes]), timeout=15)
+        except asyncio.TimeoutError:
+            for process in processes:
+                if process.returncode is None:
+                    process.kill()
+        for client in self._clients:
+            await client.aclose()
+
+    def next_worker(self) -> int:
+        return next(self._round_robin)
+
+    async def forward(self, worker: int, request: Request, content) -> StreamingResponse | ORJSONResponse:
+        headers = [
+            (name, value) for name, value in request.headers.items()
+            if name not in _HOP_BY_HOP_HEADERS and not (name == "content-length" and isinstance(content, bytes))
+        ]
+        url = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        client = self._clients[worker]
+        try:
+            response = await client.send(client.build_request(request.method, url, headers=headers, content=content), stream=True)
+        except httpx.HTTPError as e:
+            self.unavailable[worker] += 1
+            return ORJSONResponse(
+                {"detail": f"gateway worker {worker} is unavailable: {e!r}"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"},
+            )
+        self.forwarded[worker] += 1
+        return StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={name: value for name, value in response.headers.items() if name not in _HOP_BY_HOP_HEADERS},
+            background=BackgroundTask(response.aclose),
+        )
+
+    async def gather(self, path: str) -> list[httpx.Response | None]:
+        """
+        GETs `path` from every worker; None for the workers which did not answer 200.
+        """
+        async def get(client: httpx.AsyncClient):
+            try:
+                response = await client.get(path)
+            except httpx.HTTPError:
+                return None
+            return response if response.status_code == status.HTTP_200_OK else None
+        return await asyncio.gather(*[get(client) for client in self._clients])
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "port": port,
+                "pid": process.pid if process is not None else None,
+                "running": process is not None and process.returncode is None,
+                "forwarded": self.forwarded[worker],
+                "unavailable": self.unavailable[worker],
+                "restarts": self.restarts[worker],
+            }
+            for worker, (port, process) in enumerate(zip(self._ports, self._processes))
+        ]
+
+
+workers = WorkerPool(max(1, GATEWAY_WORKERS), GATEWAY_WORKER_BASE_PORT)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await workers.start()
+    yield
+    await workers.stop()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    expositions = [response.text for response in await workers.gather("/metrics") if response is not None]
+    return PlainTextResponse(merge_expositions(expositions), media_type="text/plain; version=0.0.4")
+
+@app.get(STATS_PREFIX + "/workers")
+async def get_worker_stats():
+    return workers.stats()
+
+@app.get(READINGS_PREFIX.rstrip("/"))
+async def get_reading_sensors():
+    responses = await workers.gather(READINGS_PREFIX.rstrip("/"))
+    return sorted(name for response in responses if response is not None for name in response.json())
+
+@app.get(STATS_PREFIX + "/{name:path}")
+async def get_stats(request: Request):
+    responses = await workers.gather(request.url.path)
+    return {"workers": [response.json() if response is not None else None for response in responses]}
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"])
+async def forward(request: Request):
+    path = request.url.path
+    if path in SENSOR_ROUTES:
+        body = await request.body()
+        sensor_name = peek_sensor_name(request.headers, body)
+        worker = worker_for(sensor_name, len(workers)) if sensor_name else workers.next_worker()
+        return await workers.forward(worker, request, body)
+    if path.startswith(READINGS_PREFIX):
+        sensor_name = path[len(READINGS_PREFIX):].split("/", 1)[0]
+        return await workers.forward(worker_for(sensor_name, len(workers)), request, None)
+
+    # bodies are streamed through (e.g. model uploads)
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    content = request.stream() if has_body else None
+    worker = request.query_params.get(WORKER_PARAM, "")
+    if path == PREDICTION_RESULT_ROUTE and worker.isdigit() and int(worker) < len(workers):
+        return await workers.forward(int(worker), request, content)
+    return await workers.forward(workers.next_worker(), request, content)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=GATEWAY_API_HOST)
+    parser.add_argument("--port", type=int, default=int(GATEWAY_API_PORT))
+    args = parser.parse_args()
+    if GATEWAY_WORKERS <= 1:
+        # single-process mode, no front router
+        os.execvp(sys.executable, [sys.executable, "-m", "uvicorn", "app.main:app", "--host", args.host, "--port", str(args.port)])
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
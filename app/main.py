@@ -1,13 +1,69 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
+from fastapi.responses import ORJSONResponse
 
 from app.api.routes.callback import callback_router
 from app.api.routes.command import command_router
+from app.api.routes.models import models_router
+from app.api.routes.readings import readings_router
+from app.api.routes.stats import stats_router, metrics_router
 
-from app.core.config import SECRET_KEY, ORIGINS
+from app.core.config import (
+    SECRET_KEY, ORIGINS, INGEST_MODE, CLOUD_SPOOL_ENABLED, LATENCY_BENCHMARK, LATENCY_BENCHMARK_MODE, ADAPTIVE_INFERENCE,
+    TRACE_ENABLED, READING_STORE_ENABLED, PREDICTION_PUSH_ENABLED, PREDICTION_CALLBACK_URL,
+)
+from app.core.clients import registry as clients
+from app.core.resilience import UpstreamUnavailable, DeadlineExceeded
+from app.api import utils, ingest
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PREDICTION_PUSH_ENABLED and not PREDICTION_CALLBACK_URL:
+        raise RuntimeError("PREDICTION_PUSH_ENABLED needs a PREDICTION_CALLBACK_URL the inference microservice can reach")
+    await clients.start()
+    if utils.MULTI_WORKER:
+        await utils.shared_state.start()
+        await utils.load_cloud_bulk_unsupported()
+    utils.sensor_registry.start()
+    utils.prediction_poller.start()
+    if READING_STORE_ENABLED:
+        ingest.reading_store.open()
+    if INGEST_MODE == "async":
+        ingest.start()
+    if CLOUD_SPOOL_ENABLED:
+        utils.cloud_spool.start()
+    if LATENCY_BENCHMARK and LATENCY_BENCHMARK_MODE == "summary":
+        utils.latency_aggregator.start()
+    if ADAPTIVE_INFERENCE and utils.GATEWAY_POLICY_ENABLED:
+        utils.policy_engine.start()
+    if TRACE_ENABLED:
+        await utils.trace_recorder.start()
+    yield
+    await utils.trace_recorder.stop()
+    await utils.policy_engine.stop()
+    await ingest.stop()
+    await utils.latency_aggregator.stop()   # exports the last window
+    await utils.prediction_batcher.aclose()
+    await utils.command_dispatcher.aclose()
+    for batcher in utils.cloud_batchers.values():
+        await batcher.aclose()
+    await utils.cloud_spool.stop()
+    await utils.prediction_poller.stop()
+    await utils.sensor_registry.stop()
+    await utils.shared_state.stop()
+    await clients.aclose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    return ORJSONResponse({"detail": str(exc)}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return ORJSONResponse({"detail": str(exc)}, status_code=status.HTTP_504_GATEWAY_TIMEOUT)
 
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 
@@ -23,3 +79,7 @@ app.add_middleware(
 # Routes
 app.include_router(callback_router, prefix="/api/v1")
 app.include_router(command_router, prefix="/api/v1")
+app.include_router(models_router, prefix="/api/v1")
+app.include_router(readings_router, prefix="/api/v1")
+app.include_router(stats_router, prefix="/api/v1")
+app.include_router(metrics_router)
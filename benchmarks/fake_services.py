@@ -0,0 +1,268 @@
+"""
+Lightweight stand-ins for the microservices the gateway talks to, for load tests.
+
+Each service is a small FastAPI app answering the routes the gateway calls, with the shape
+of answers the gateway expects. Every request is delayed by `latency_ms` (+/- `jitter_ms`)
+and fails with 503 with probability `failure_rate`. GET /_stats on any service returns its
+request counts per route; POST /_stats/reset clears them.
+
+The inference service completes a prediction task `latency_ms` after it was submitted and
+pushes it to the X-Callback-URL of the request when one is given.
+
+Usage: python -m benchmarks.fake_services [--base-port 18000] [--sensors 100]
+                                          [--latency-ms 5] [--jitter-ms 2] [--failure-rate 0]
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+import uuid
+from collections import Counter
+
+import httpx
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, Response
+
+from app.core import codec
+
+# service name -> port offset from --base-port
+SERVICES = {
+    "cloud": 0,
+    "inference": 5,
+    "ble-prov": 6,
+    "metadata": 7,
+    "mqtt-sensor": 8,
+}
+
+API_PREFIX = "/api/v1"
+
+
+def _fault_injection(app: FastAPI, counts: Counter, latency_ms: float, jitter_ms: float, failure_rate: float):
+    @app.middleware("http")
+    async def inject(request: Request, call_next):
+        route = request.url.path
+        if route.startswith("/_stats"):
+            return await call_next(request)
+        counts[f"{request.method} {_template(route)}"] += 1
+        delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms))
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if random.random() < failure_rate:
+            counts["injected_failures"] += 1
+            return ORJSONResponse({"detail": "injected failure"}, status_code=503)
+        return await call_next(request)
+
+    @app.get("/_stats")
+    async def stats():
+        return dict(counts)
+
+    @app.post("/_stats/reset")
+    async def reset():
+        counts.clear()
+        return {}
+
+
+def _template(path: str) -> str:
+    # collapse ids so that counts are per route
+    parts = path.split("/")
+    if len(parts) > 2 and parts[-2] in ("result", "sensor"):
+        parts[-1] = "{id}"
+    return "/".join(parts)
+
+
+async def _body(request: Request) -> object:
+    body = await request.body()
+    if not body:
+        return None
+    if codec.is_msgpack(request.headers.get("content-type")):
+        return codec.unpackb(body)
+    return orjson.loads(body)
+
+
+def build_cloud() -> FastAPI:
+    app = FastAPI()
+
+    @app.post(API_PREFIX + "/{path:path}", status_code=201)
+    async def store(path: str, request: Request):
+        body = await _body(request)
+        if path.endswith("/bulk") and isinstance(body, list):
+            return [{"status_code": 201, "detail": None} for _ in body]
+        return None
+
+    return app
+
+
+def build_inference(latency_ms: float) -> FastAPI:
+    app = FastAPI()
+    tasks: dict[str, tuple[float, object]] = {}    # task_id -> (ready at, result)
+    client = httpx.AsyncClient(timeout=10)
+    pushes: set[asyncio.Task] = set()
+
+    def _result() -> dict:
+        return {"prediction_result": random.randint(0, 3), "heuristic_result": random.choice([1, 1, 1, 0, 2]),
+                "confidence": random.random()}
+
+    def _task(task_id: str) -> dict:
+        ready_at, result = tasks.get(task_id, (None, None))
+        if ready_at is None:
+            return {"task_id": task_id, "status": "FAILURE", "result": None}
+        if time.monotonic() < ready_at:
+            return {"task_id": task_id, "status": "PENDING", "result": None}
+        return {"task_id": task_id, "status": "SUCCESS", "result": result}
+
+    async def _push(callback_url: str, task_id: str):
+        await asyncio.sleep(latency_ms / 1000)
+        try:
+            await client.post(callback_url, json=_task(task_id))
+        except httpx.HTTPError:
+            pass
+
+    def _submit(request: Request, result: object) -> dict:
+        task_id = uuid.uuid4().hex
+        tasks[task_id] = (time.monotonic() + latency_ms / 1000, result)
+        callback_url = request.headers.get("x-callback-url")
+        if callback_url:
+            push = asyncio.create_task(_push(callback_url, task_id))
+            pushes.add(push)
+            push.add_done_callback(pushes.discard)
+        return {"task_id": task_id}
+
+    @app.put(API_PREFIX + "/model/prediction/request", status_code=202)
+    async def request_prediction(request: Request):
+        await _body(request)
+        return _submit(request, _result())
+
+    @app.put(API_PREFIX + "/model/prediction/request/batch", status_code=202)
+    async def request_batch_prediction(request: Request):
+        readings = await _body(request)
+        return _submit(request, [_result() for _ in readings])
+
+    @app.get(API_PREFIX + "/model/prediction/result/{task_id}")
+    async def get_result(task_id: str):
+        return _task(task_id)
+
+    @app.post(API_PREFIX + "/model/prediction/results")
+    async def get_results(request: Request):
+        body = await _body(request)
+        return [_task(task_id) for task_id in body["task_ids"]]
+
+    @app.post(API_PREFIX + "/model/upload", status_code=202)
+    async def upload_model(request: Request):
+        async for _ in request.stream():
+            pass
+        return {"message": "Model uploaded"}
+
+    return app
+
+
+def build_metadata(sensors: int) -> FastAPI:
+    app = FastAPI()
+    names = [f"sensor_{i}" for i in range(sensors)]
+
+    @app.get(API_PREFIX + "/sensors")
+    async def get_sensors():
+        return [{"device_name": name, "device_address": f"00:00:00:00:{i // 256:02x}:{i % 256:02x}"}
+                for i, name in enumerate(names)]
+
+    @app.post(API_PREFIX + "/sensors", status_code=201)
+    async def create_sensors(request: Request):
+        body = await _body(request)
+        for sensor in body if isinstance(body, list) else [body]:
+            names.append(sensor["device_name"])
+        return None
+
+    @app.put(API_PREFIX + "/sensors")
+    async def update_sensors(request: Request):
+        await _body(request)
+        return None
+
+    @app.post(API_PREFIX + "/sensor", status_code=201)
+    async def create_sensor(request: Request):
+        names.append((await _body(request))["device_name"])
+        return None
+
+    @app.put(API_PREFIX + "/sensor/{device_name}")
+    async def update_sensor(device_name: str, request: Request):
+        await _body(request)
+        return None
+
+    return app
+
+
+def build_ble_prov() -> FastAPI:
+    app = FastAPI()
+
+    @app.get(API_PREFIX + "/discover")
+    async def discover():
+        return [{"device_name": "ble_sensor", "device_address": "00:00:00:00:ff:ff"}]
+
+    @app.post(API_PREFIX + "/provision")
+    async def provision(request: Request):
+        devices = await _body(request)
+        return [{"device_name": device["device_name"], "device_address": device["device_address"]} for device in devices]
+
+    return app
+
+
+def build_mqtt_sensor() -> FastAPI:
+    app = FastAPI()
+    command_ids = itertools.count()
+
+    @app.post(API_PREFIX + "/sensor/command/{method}/{property_name}", status_code=202)
+    async def command(method: str, property_name: str, request: Request):
+        body = await _body(request)
+        sensors = body["target"]["target_sensors"]
+        if method == "get":
+            return {"command_uuids": [f"cmd-{next(command_ids)}" for _ in sensors]}
+        return Response(status_code=202)
+
+    return app
+
+
+def build_services(sensors: int, latency_ms: float, jitter_ms: float, failure_rate: float) -> dict[str, tuple[FastAPI, Counter]]:
+    apps = {
+        "cloud": build_cloud(),
+        "inference": build_inference(latency_ms),
+        "ble-prov": build_ble_prov(),
+        "metadata": build_metadata(sensors),
+        "mqtt-sensor": build_mqtt_sensor(),
+    }
+    services = {}
+    for name, app in apps.items():
+        counts = Counter()
+        _fault_injection(app, counts, latency_ms, jitter_ms, failure_rate)
+        services[name] = (app, counts)
+    return services
+
+
+async def serve(base_port: int, sensors: int, latency_ms: float, jitter_ms: float, failure_rate: float):
+    services = build_services(sensors, latency_ms, jitter_ms, failure_rate)
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=base_port + SERVICES[name], log_level="warning"))
+        for name, (app, _) in services.items()
+    ]
+    # only the last server installed uvicorn's signal handlers: stop them all once one exits
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for server in servers:
+        server.should_exit = True
+    await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-port", type=int, default=18000)
+    parser.add_argument("--sensors", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(serve(args.base_port, args.sensors, args.latency_ms, args.jitter_ms, args.failure_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Load test of the gateway against local stand-in microservices (see benchmarks.fake_services).
+
+For every scenario the fake services and a gateway (python -m app.front: one uvicorn process,
+or the front router and `--workers` worker processes) are started as subprocesses, then
+`--sensors` sensors each POST /export/sensor-data at `--rate` readings per second and the
+cloud sends sensor commands at `--command-rate` commands per second, for `--duration`
+seconds. Load is open-loop: requests are sent on schedule whether or not earlier
+ones were answered, and latency is measured from the scheduled send time.
+
+Scenarios:
+    cloud-layer       readings for the CLOUD inference layer
+    gateway-layer     readings for the GATEWAY inference layer, adaptive inference off
+    gateway-adaptive  readings for the GATEWAY inference layer, adaptive inference on
+
+The report is JSON: per scenario and route the request count, status codes, throughput and
+p50/p90/p99 latency, plus upstream request counts as seen by the fake services and by the
+gateway's /metrics.
+
+Usage: python -m benchmarks.load_test [--scenarios cloud-layer gateway-layer gateway-adaptive]
+                                      [--sensors 50] [--rate 2] [--command-rate 5] [--duration 30]
+                                      [--latency-ms 5] [--jitter-ms 2] [--failure-rate 0] [--workers 1]
+                                      [--gateway-env KEY=VALUE ...] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import httpx
+import numpy as np
+import orjson
+
+from benchmarks.fake_services import API_PREFIX, SERVICES
+
+CLOUD_INFERENCE_LAYER = 2
+GATEWAY_INFERENCE_LAYER = 1
+
+SCENARIOS = {
+    "cloud-layer": {"inference_layer": CLOUD_INFERENCE_LAYER, "env": {"ADAPTIVE_INFERENCE": "0"}},
+    "gateway-layer": {"inference_layer": GATEWAY_INFERENCE_LAYER, "env": {"ADAPTIVE_INFERENCE": "0"}},
+    "gateway-adaptive": {"inference_layer": GATEWAY_INFERENCE_LAYER, "env": {"ADAPTIVE_INFERENCE": "1"}},
+}
+
+_UPSTREAM_COUNTER = re.compile(r'^gateway_upstream_requests_total\{(.*)\} (\S+)$', re.MULTILINE)
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def _sensor_data(sensor_name: str, inference_layer: int, rows: int) -> bytes:
+    return orjson.dumps({
+        "metadata": {"gateway_name": "gateway_1", "sensor_name": sensor_name},
+        "export_value": {
+            "reading": {"values": [[random.random() for _ in range(3)] for _ in range(rows)]},
+            "low_battery": False,
+            "inference_descriptor": {"inference_layer": inference_layer},
+        },
+    })
+
+
+def _command(sensor_name: str, i: int) -> tuple[str, bytes]:
+    target = {"gateway_name": "gateway_1", "target_sensors": [sensor_name]}
+    kind = i % 3
+    if kind == 0:
+        return "/sensor/command/set/sensor-state", orjson.dumps({"target": target, "property_value": "working"})
+    if kind == 1:
+        return "/sensor/command/get/sensor-state", orjson.dumps({"target": target})
+    return "/sensor/command/set/inference-layer", orjson.dumps({"target": target, "property_value": GATEWAY_INFERENCE_LAYER})
+
+
+class RouteResults:
+    def __init__(self):
+        self.latencies_ms: list[float] = []
+        self.statuses = Counter()
+
+    def record(self, status: str, latency_ms: float):
+        self.statuses[status] += 1
+        self.latencies_ms.append(latency_ms)
+
+    def summary(self, duration_s: float) -> dict:
+        latencies = np.asarray(self.latencies_ms)
+        ok = sum(count for status, count in self.statuses.items() if status.startswith("2"))
+        percentiles = np.percentile(latencies, [50, 90, 99]) if latencies.size else [0.0, 0.0, 0.0]
+        return {
+            "requests": int(latencies.size),
+            "statuses": dict(self.statuses),
+            "throughput_rps": ok / duration_s,
+            "latency_ms": {
+                "p50": float(percentiles[0]),
+                "p90": float(percentiles[1]),
+                "p99": float(percentiles[2]),
+                "max": float(latencies.max()) if latencies.size else 0.0,
+            },
+        }
+
+
+async def _timed(client: httpx.AsyncClient, results: RouteResults, url: str, body: bytes, scheduled: float):
+    try:
+        response = await client.post(url, content=body, headers={"Content-Type": "application/json"})
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.record(status, (time.perf_counter() - scheduled) * 1000)
+
+
+async def _drive(gateway_url: str, sensor_names: list[str], inference_layer: int, rate: float, command_rate: float,
+                 rows: int, duration_s: float) -> dict:
+    results: dict[str, RouteResults] = defaultdict(RouteResults)
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=gateway_url, limits=limits, timeout=60) as client:
+        requests: set[asyncio.Task] = set()
+        start = time.perf_counter()
+        end = start + duration_s
+
+        def send(route: str, body: bytes, scheduled: float):
+            task = asyncio.create_task(_timed(client, results[route], route, body, scheduled))
+            requests.add(task)
+            task.add_done_callback(requests.discard)
+
+        async def sensor(sensor_name: str):
+            # spread the sensors over the first interval
+            scheduled = start + random.uniform(0, 1 / rate)
+            while scheduled < end:
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                send("/export/sensor-data", _sensor_data(sensor_name, inference_layer, rows), scheduled)
+                scheduled += 1 / rate
+
+        async def cloud():
+            scheduled, i = start, 0
+            while command_rate and scheduled < end:
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                route, body = _command(random.choice(sensor_names), i)
+                send(route, body, scheduled)
+                scheduled, i = scheduled + 1 / command_rate, i + 1
+
+        await asyncio.gather(cloud(), *[sensor(name) for name in sensor_names])
+        if requests:
+            await asyncio.wait(requests)
+        elapsed = time.perf_counter() - start
+    return {route: route_results.summary(elapsed) for route, route_results in sorted(results.items())}
+
+
+def upstream_counts(metrics: str) -> dict[str, float]:
+    counts = {}
+    for labels, value in _UPSTREAM_COUNTER.findall(metrics):
+        labels = dict(_LABEL.findall(labels))
+        counts[f'{labels["upstream"]} {labels["method"]} {labels["outcome"]}'] = float(value)
+    return counts
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout_s: float = 30):
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient(timeout=1) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{process.args} exited with {process.returncode}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout_s}s")
+
+
+def _start(args: list[str], env: dict[str, str], quiet: bool) -> subprocess.Popen:
+    output = subprocess.DEVNULL if quiet else None
+    return subprocess.Popen([sys.executable, *args], env={**os.environ, **env}, stdout=output, stderr=output)
+
+
+def _stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def run_scenario(name: str, args: argparse.Namespace) -> dict:
+    scenario = SCENARIOS[name]
+    fake_url = {service: f"http://127.0.0.1:{args.base_port + offset}" for service, offset in SERVICES.items()}
+    gateway_url = f"http://127.0.0.1:{args.gateway_port}"
+    env = {
+        "GATEWAY_API_PORT": str(args.gateway_port),
+        "CLOUD_API_URL": fake_url["cloud"] + API_PREFIX,
+        "INFERENCE_MICROSERVICE_URL": fake_url["inference"] + API_PREFIX,
+        "BLE_PROV_MICROSERVICE_URL": fake_url["ble-prov"] + API_PREFIX,
+        "METADATA_MICROSERVICE_URL": fake_url["metadata"] + API_PREFIX,
+        "MQTT_SENSOR_MICROSERVICE_URL": fake_url["mqtt-sensor"] + API_PREFIX,
+        # the fake inference microservice pushes finished tasks
+        "PREDICTION_PUSH_ENABLED": "1",
+        "PREDICTION_CALLBACK_URL": f"{gateway_url}/api/v1/store/inference/prediction-result",
+        "GATEWAY_WORKERS": str(args.workers),
+        "GATEWAY_WORKER_BASE_PORT": str(args.gateway_port + 100),
+        **scenario["env"],
+        **dict(item.split("=", 1) for item in args.gateway_env),
+    }
+
+    fakes = _start([
+        "-m", "benchmarks.fake_services", "--base-port", str(args.base_port), "--sensors", str(args.sensors),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms), "--failure-rate", str(args.failure_rate),
+    ], {}, args.quiet)
+    gateway = None
+    try:
+        for url in fake_url.values():
+            await _wait_ready(f"{url}/_stats", fakes)
+        gateway = _start(["-m", "app.front", "--host", "127.0.0.1", "--port", str(args.gateway_port)], env, args.quiet)
+        await _wait_ready(f"{gateway_url}/metrics", gateway, timeout_s=60)
+
+        async with httpx.AsyncClient(timeout=10) as client:
+            await asyncio.gather(*[client.post(f"{url}/_stats/reset") for url in fake_url.values()])
+            metrics_before = upstream_counts((await client.get(f"{gateway_url}/metrics")).text)
+
+            sensor_names = [f"sensor_{i}" for i in range(args.sensors)]
+            routes = await _drive(gateway_url + "/api/v1", sensor_names, scenario["inference_layer"], args.rate,
+                                  args.command_rate, args.rows, args.duration)
+            # let in-flight exports and pushes settle before counting
+            await asyncio.sleep(args.settle)
+
+            fake_counts = {service: (await client.get(f"{url}/_stats")).json() for service, url in fake_url.items()}
+            metrics_after = upstream_counts((await client.get(f"{gateway_url}/metrics")).text)
+    finally:
+        if gateway is not None:
+            _stop(gateway)
+        _stop(fakes)
+
+    readings = routes.get("/export/sensor-data", {}).get("requests", 0)
+    upstream_total = sum(sum(v for k, v in counts.items() if k != "injected_failures") for counts in fake_counts.values())
+    return {
+        "routes": routes,
+        "upstream_requests": fake_counts,
+        "upstream_requests_total": upstream_total,
+        "upstream_requests_per_reading": upstream_total / readings if readings else 0.0,
+        "gateway_upstream_requests": {
+            key: value - metrics_before.get(key, 0.0) for key, value in sorted(metrics_after.items())
+            if value != metrics_before.get(key, 0.0)
+        },
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "quiet")},
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        report["scenarios"][name] = await run_scenario(name, args)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--sensors", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=2, help="readings per second per sensor")
+    parser.add_argument("--command-rate", type=float, default=5, help="sensor commands per second")
+    parser.add_argument("--rows", type=int, default=10, help="rows per reading")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per scenario")
+    parser.add_argument("--settle", type=float, default=1, help="seconds to wait after the load before counting")
+    parser.add_argument("--latency-ms", type=float, default=5, help="latency of the fake services")
+    parser.add_argument("--jitter-ms", type=float, default=2)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of fake service requests answered 503")
+    parser.add_argument("--base-port", type=int, default=18000)
+    parser.add_argument("--gateway-port", type=int, default=18004)
+    parser.add_argument("--workers", type=int, default=1, help="gateway worker processes (GATEWAY_WORKERS)")
+    parser.add_argument("--gateway-env", nargs="*", default=[], metavar="KEY=VALUE", help="extra gateway settings")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--quiet", action="store_true", help="silence the subprocesses")
+    args = parser.parse_args()
+
+    report = orjson.dumps(asyncio.run(run(args)), option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(report)
+    else:
+        sys.stdout.buffer.write(report + b"\n")
+
+
+if __name__ == "__main__":
+    main()
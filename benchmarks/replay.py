@@ -0,0 +1,148 @@
+"""
+Replay of a captured gateway trace (TRACE_ENABLED, see app/core/trace.py) against one or two
+running gateways.
+
+Requests are re-sent with their recorded method, path, query, headers and body, keeping their
+original spacing divided by `--speed` (so bursts of sensors waking on the same interval are
+reproduced), or as fast as `--concurrency` allows with `--speed 0`. Pushed prediction results
+are skipped by default since their tasks only exist on the recording gateway's upstream.
+
+For each target the report holds the latency distribution and status codes per route and the
+upstream requests it made during the replay (from its /metrics). With two targets, e.g. the
+current release and a candidate both pointed at the same stand-in services
+(python -m benchmarks.fake_services), it also reports the divergence of upstream request counts.
+
+Usage: python -m benchmarks.replay TRACE --target http://127.0.0.1:8004 [http://127.0.0.1:8104]
+                                   [--speed 1] [--concurrency 100] [--limit N] [--output report.json]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+import orjson
+
+from app.core.trace import read_trace
+from benchmarks.load_test import RouteResults, upstream_counts
+
+SKIPPED_PATHS = ("/api/v1/store/inference/prediction-result",)
+
+
+def load_trace(path: str, skip: tuple[str, ...], limit: int | None) -> list[list]:
+    records = [record for record in read_trace(path) if record[2] not in skip]
+    records.sort(key=lambda record: record[0])
+    return records[:limit] if limit else records
+
+
+async def _send(client: httpx.AsyncClient, results: RouteResults, record: list, started: float):
+    _, method, path, query, headers, body = record
+    try:
+        response = await client.request(method, path, params=query or None, headers=headers, content=body)
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.record(status, (time.perf_counter() - started) * 1000)
+
+
+async def replay(target: str, records: list[list], speed: float, concurrency: int, settle: float) -> dict:
+    results: dict[str, RouteResults] = defaultdict(RouteResults)
+    limits = httpx.Limits(max_connections=max(concurrency, 1000), max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=target, limits=limits, timeout=60) as client:
+        metrics_before = upstream_counts((await client.get("/metrics")).text)
+        start = time.perf_counter()
+
+        if speed > 0:
+            # open loop on the recorded schedule, latency measured from the scheduled time
+            requests = []
+            t0 = records[0][0] if records else 0.0
+            for record in records:
+                scheduled = start + (record[0] - t0) / speed
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                requests.append(asyncio.create_task(_send(client, results[record[2]], record, scheduled)))
+            if requests:
+                await asyncio.wait(requests)
+        else:
+            pending = iter(records)
+
+            async def worker():
+                for record in pending:
+                    await _send(client, results[record[2]], record, time.perf_counter())
+
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+        elapsed = time.perf_counter() - start
+        # let in-flight exports settle before counting
+        await asyncio.sleep(settle)
+        metrics_after = upstream_counts((await client.get("/metrics")).text)
+
+    return {
+        "duration_s": elapsed,
+        "routes": {path: route_results.summary(elapsed) for path, route_results in sorted(results.items())},
+        "upstream_requests": {
+            key: value - metrics_before.get(key, 0.0) for key, value in sorted(metrics_after.items())
+            if value != metrics_before.get(key, 0.0)
+        },
+    }
+
+
+def divergence(baseline: dict[str, float], candidate: dict[str, float]) -> dict:
+    keys = sorted(set(baseline) | set(candidate))
+    per_key = {}
+    for key in keys:
+        a, b = baseline.get(key, 0.0), candidate.get(key, 0.0)
+        if a != b:
+            per_key[key] = {"baseline": a, "candidate": b, "difference": b - a, "ratio": b / a if a else None}
+    total_a, total_b = sum(baseline.values()), sum(candidate.values())
+    return {
+        "total": {"baseline": total_a, "candidate": total_b, "difference": total_b - total_a,
+                  "ratio": total_b / total_a if total_a else None},
+        "diverging": per_key,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    records = load_trace(args.trace, () if args.no_skip else SKIPPED_PATHS, args.limit)
+    report = {
+        "trace": {
+            "path": args.trace,
+            "requests": len(records),
+            "recorded_duration_s": records[-1][0] - records[0][0] if records else 0.0,
+        },
+        "speed": args.speed,
+        "targets": {},
+    }
+    for target in args.target:
+        report["targets"][target] = await replay(target, records, args.speed, args.concurrency, args.settle)
+    if len(args.target) == 2:
+        baseline, candidate = (report["targets"][target]["upstream_requests"] for target in args.target)
+        report["upstream_divergence"] = divergence(baseline, candidate)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace")
+    parser.add_argument("--target", nargs="+", required=True, help="gateway base URLs, baseline first")
+    parser.add_argument("--speed", type=float, default=1, help="replay speed factor, 0 for as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=100, help="requests in flight with --speed 0")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--settle", type=float, default=1, help="seconds to wait after the replay before counting")
+    parser.add_argument("--no-skip", action="store_true", help="also replay pushed prediction results")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+    if len(args.target) > 2:
+        parser.error("at most two targets can be compared")
+
+    report = orjson.dumps(asyncio.run(run(args)), option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(report)
+    else:
+        sys.stdout.buffer.write(report + b"\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of the per-message serialization work on the export_sensor_data path.
+
+"before" reproduces the original path: the body is parsed with the stdlib json module and
+validated element by element into list[list[float]], every outbound body is model_dump()ed
+and re-encoded with json.dumps, and the submit response is parsed twice. "after" is the
+current path: model_validate_json on the raw body, pydantic-core/orjson encoding straight
+to bytes and a single orjson parse per upstream response.
+
+Usage: python -m benchmarks.serialization_bench [--rows 50 200 1000] [--number 2000]
+"""
+
+import argparse
+import json
+import random
+import timeit
+from typing import Optional
+
+import orjson
+from pydantic import BaseModel
+
+from app.api.schemas.sensor import export as s_export
+from app.core import serialization
+
+
+# --- Original schemas (before SensorReading.values became a NumPy array) ---
+class LegacySensorReading(BaseModel):
+    uuid: str = ""
+    values: list[list[float]]
+
+class LegacyInferenceDescriptor(BaseModel):
+    inference_layer: s_export.InferenceLayer
+    send_timestamp: Optional[int] = None
+    recv_timestamp: Optional[int] = None
+    prediction: Optional[int] = None
+
+class LegacySensorData(BaseModel):
+    reading: LegacySensorReading
+    low_battery: bool
+    inference_descriptor: LegacyInferenceDescriptor
+
+class LegacySensorDataExport(BaseModel):
+    metadata: s_export.Metadata
+    export_value: LegacySensorData
+
+
+SUBMIT_RESPONSE = json.dumps({"task_id": "6f1c2a9e-4f4e-4a7b-9d35-2b8e2f8e8c11"}).encode()
+
+
+def make_body(rows: int, cols: int = 3) -> bytes:
+    return json.dumps({
+        "metadata": {"gateway_name": "gateway_1", "sensor_name": "sensor_1"},
+        "export_value": {
+            "reading": {"uuid": "0", "values": [[random.uniform(-2, 2) for _ in range(cols)] for _ in range(rows)]},
+            "low_battery": False,
+            "inference_descriptor": {"inference_layer": 1, "send_timestamp": 1700000000000},
+        },
+    }).encode()
+
+
+def before(body: bytes):
+    sensor_data = LegacySensorDataExport(**json.loads(body))    # FastAPI body parsing
+    json.dumps(sensor_data.model_dump()).encode()               # prediction request
+    json.loads(SUBMIT_RESPONSE)["task_id"]                      # response.json()["task_id"]
+    json.loads(SUBMIT_RESPONSE)                                 # error-path response.json()
+    json.dumps(sensor_data.model_dump()).encode()               # cloud export
+
+
+def after(body: bytes):
+    sensor_data = s_export.SensorDataExport.model_validate_json(body)
+    serialization.dumps(sensor_data)
+    orjson.loads(SUBMIT_RESPONSE)["task_id"]                    # parsed once, then cached
+    serialization.dumps(sensor_data)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'before us/msg':>14} {'after us/msg':>13} {'saved us/msg':>13} {'speedup':>8}")
+    for rows in args.rows:
+        body = make_body(rows)
+        number = max(10, args.number * 50 // rows)
+        t_before = min(timeit.repeat(lambda: before(body), number=number, repeat=5)) / number * 1e6
+        t_after = min(timeit.repeat(lambda: after(body), number=number, repeat=5)) / number * 1e6
+        print(f"{rows:>6} {t_before:>14.1f} {t_after:>13.1f} {t_before - t_after:>13.1f} {t_before / t_after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Malformed reading values must be answered with 422, whatever the payload encoding.
+"""
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.schemas.sensor import export as s_export
+from app.core import codec
+from app.main import app
+
+# no lifespan: the requests are rejected before any upstream is involved
+client = TestClient(app)
+
+MALFORMED_VALUES = [
+    {"a": 1},
+    {"dtype": "<f8", "shape": [1, 1], "data": "not bytes"},
+    {"dtype": "foo", "shape": [0, 0], "data": b""},
+    {"dtype": "<f8", "shape": "x", "data": b""},
+    {"dtype": "<f8", "shape": [2, 2], "data": b"\0" * 8},
+    {"dtype": "<i8", "shape": [1, 1], "data": b"\0" * 8},
+]
+
+
+def _sensor_data(values) -> dict:
+    return {
+        "metadata": {"gateway_name": "gateway", "sensor_name": "sensor"},
+        "export_value": {
+            "reading": {"values": values},
+            "low_battery": False,
+            "inference_descriptor": {"inference_layer": 2},
+        },
+    }
+
+
+@pytest.mark.parametrize("values", [v for v in MALFORMED_VALUES if not isinstance(v.get("data"), bytes)])
+def test_malformed_json_values_dict(values):
+    response = client.post("/api/v1/export/sensor-data", json=_sensor_data(values))
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("values", MALFORMED_VALUES)
+def test_malformed_msgpack_values(values):
+    response = client.post(
+        "/api/v1/export/sensor-data",
+        content=codec.packb(_sensor_data(values)),
+        headers={"content-type": codec.MSGPACK_CONTENT_TYPE},
+    )
+    assert response.status_code == 422
+
+
+def test_empty_values():
+    sensor_data = s_export.SensorDataExport.model_validate(_sensor_data([]))
+    assert sensor_data.export_value.reading.values.shape == (0, 0)
+    assert codec.decode_array(codec.encode_array(np.zeros((0, 0)))).shape == (0, 0)